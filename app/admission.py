@@ -0,0 +1,142 @@
+# Admission control and load shedding: per-client token buckets and per-route-class concurrency.
+# Tor hides client IPs, so clients are keyed by session (user id) or a signed anonymous token.
+# A client without either is given a new anonymous token; minting those has its own rate limit,
+# so dropping the cookie does not buy a fresh bucket faster than that.
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi.responses import PlainTextResponse
+
+from app.config import get_settings
+
+
+@dataclass
+class RouteClass:
+    """Requests sharing a cost weight and a global concurrency limit."""
+
+    name: str
+    cost: float
+    max_concurrent: int
+    in_flight: int = 0
+    admitted: int = 0
+    throttled: int = 0  # 429: client bucket empty
+    shed: int = 0  # 503: class at its concurrency limit
+
+
+# Cost is in bucket tokens; auth pays for bcrypt, checkout for its write transaction.
+ROUTE_CLASSES: dict[str, RouteClass] = {
+    "read": RouteClass("read", cost=1, max_concurrent=64),
+    "write": RouteClass("write", cost=2, max_concurrent=16),
+    "checkout": RouteClass("checkout", cost=5, max_concurrent=8),
+    "auth": RouteClass("auth", cost=10, max_concurrent=4),
+}
+
+
+
+def classify(method: str, path: str) -> RouteClass | None:
+    """Route class for a request; None means exempt (static files)."""
+    if path.startswith("/static/"):
+        return None
+    if method not in ("GET", "HEAD"):
+        if path in ("/login", "/register"):
+            return ROUTE_CLASSES["auth"]
+        if path == "/checkout":
+            return ROUTE_CLASSES["checkout"]
+        return ROUTE_CLASSES["write"]
+    return ROUTE_CLASSES["read"]
+
+
+class AdmissionController:
+    """Token buckets per client key (bounded LRU) plus in-flight counters per route class."""
+
+    def __init__(self, capacity: float, refill_per_second: float, max_buckets: int) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_buckets = max_buckets
+        # key -> [tokens, last refill (monotonic)]
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def try_acquire(self, key: str, rc: RouteClass) -> PlainTextResponse | None:
+        """Admit the request (returns None) or return a cheap 429/503 response."""
+        if rc.in_flight >= rc.max_concurrent:
+            rc.shed += 1
+            return PlainTextResponse("Server busy, try again shortly.", status_code=503, headers={"Retry-After": "1"})
+        retry = self.take(key, rc.cost)
+        if retry is not None:
+            rc.throttled += 1
+            return too_many(retry)
+        rc.in_flight += 1
+        rc.admitted += 1
+        return None
+
+    def take(self, key: str, cost: float) -> int | None:
+        """Take cost tokens from key's bucket; None if taken, else seconds until there are enough."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+            bucket[1] = now
+        if bucket[0] < cost:
+            return math.ceil((cost - bucket[0]) / self.refill_per_second) if self.refill_per_second else 60
+        bucket[0] -= cost
+        return None
+
+    def release(self, rc: RouteClass) -> None:
+        rc.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "minted": minter.minted,
+            "mint_throttled": minter.throttled,
+            "mint_per_minute": minter.refill_per_second * 60,
+            "buckets": len(self._buckets),
+            "max_buckets": self.max_buckets,
+            "capacity": self.capacity,
+            "refill_per_second": self.refill_per_second,
+            "classes": list(ROUTE_CLASSES.values()),
+        }
+
+
+_settings = get_settings()
+controller = AdmissionController(
+    capacity=_settings.admission_bucket_size,
+    refill_per_second=_settings.admission_refill_per_minute / 60,
+    max_buckets=_settings.admission_max_buckets,
+)
+
+
+class Minter(AdmissionController):
+    """One shared bucket for issuing anonymous tokens (one token each)."""
+
+    minted = 0
+    throttled = 0
+
+    def try_mint(self) -> int | None:
+        """None if a new anonymous token may be issued, else seconds to wait."""
+        retry = self.take("mint", 1)
+        if retry is None:
+            self.minted += 1
+        else:
+            self.throttled += 1
+        return retry
+
+
+def too_many(retry: int) -> PlainTextResponse:
+    return PlainTextResponse("Too many requests, slow down.", status_code=429, headers={"Retry-After": str(retry)})
+
+
+minter = Minter(
+    capacity=max(1, _settings.admission_mint_per_minute),
+    refill_per_second=_settings.admission_mint_per_minute / 60,
+    max_buckets=1,
+)
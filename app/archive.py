@@ -0,0 +1,120 @@
+# Hot/cold order archival: settled orders older than STORE_ARCHIVE_AFTER_DAYS move from
+# orders/order_items/seller_orders to the archived_* tables in small batches, so the working
+# tables and their indexes stay the size of recent activity. The leader worker runs it hourly;
+# run once by hand with:  cd store && python -m app.archive
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.config import get_settings
+from app.database import engine
+from app.leader import on_leader
+from app.models.archive import ArchivedOrder, ArchivedOrderItem, ArchivedSellerOrder
+from app.models.order import EscrowStatus, Order, OrderItem, OrderStatus, SellerOrder
+from app.models.user import User
+
+logger = logging.getLogger("darkstore.archive")
+
+# Escrow outcomes after which no money is held and no action remains.
+_SETTLED_ESCROW = (
+    EscrowStatus.RELEASED_TO_SELLER.value,
+    EscrowStatus.RELEASED_TO_BUYER.value,
+    EscrowStatus.CANCELLED.value,
+)
+_OPEN_ESCROW = (EscrowStatus.IN_ESCROW.value, EscrowStatus.DISPUTED.value)
+_FINAL_STATUS = (OrderStatus.COMPLETED.value, OrderStatus.CANCELLED.value)
+
+
+def _archivable(cutoff: str):
+    return and_(
+        Order.created_at < cutoff,  # range on ix_orders_created
+        Order.updated_at < cutoff,
+        or_(
+            Order.escrow_status.in_(_SETTLED_ESCROW),
+            and_(Order.status.in_(_FINAL_STATUS), Order.escrow_status.not_in(_OPEN_ESCROW)),
+        ),
+    )
+
+
+def _copy(src, dst, where):
+    """INSERT INTO dst (cols) SELECT cols FROM src WHERE ... over dst's columns."""
+    names = [c.name for c in dst.__table__.columns]
+    return insert(dst).from_select(names, select(*(src.__table__.c[n] for n in names)).where(where))
+
+
+async def archive_batch(cutoff: str, limit: int) -> int:
+    """Move up to limit archivable orders (with items and seller rows) in one short transaction."""
+    async with engine.connect() as conn:
+        ids = list(
+            (await conn.execute(select(Order.id).where(_archivable(cutoff)).order_by(Order.created_at).limit(limit))).scalars()
+        )
+    if not ids:
+        return 0
+    async with engine.begin() as conn:
+        # Writing first takes the write lock straight away; the condition is re-checked under it.
+        await conn.execute(_copy(Order, ArchivedOrder, and_(Order.id.in_(ids), _archivable(cutoff))))
+        moved = list((await conn.execute(select(ArchivedOrder.id).where(ArchivedOrder.id.in_(ids)))).scalars())
+        await conn.execute(_copy(OrderItem, ArchivedOrderItem, OrderItem.order_id.in_(moved)))
+        await conn.execute(_copy(SellerOrder, ArchivedSellerOrder, SellerOrder.order_id.in_(moved)))
+        await conn.execute(delete(SellerOrder).where(SellerOrder.order_id.in_(moved)))
+        await conn.execute(delete(OrderItem).where(OrderItem.order_id.in_(moved)))
+        await conn.execute(delete(Order).where(Order.id.in_(moved)))
+    return len(moved)
+
+
+async def archive_orders(pause: float = 0.05) -> int:
+    """Archive everything currently eligible, batch by batch; returns the number of orders moved."""
+    settings = get_settings()
+    if settings.archive_after_days <= 0:
+        return 0
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=settings.archive_after_days)).isoformat()
+    total = 0
+    while True:
+        n = await archive_batch(cutoff, settings.archive_batch_size)
+        total += n
+        if n < settings.archive_batch_size:
+            return total
+        await asyncio.sleep(pause)  # let request writes take the lock between batches
+
+
+@on_leader
+async def _archive_periodically() -> None:
+    interval = get_settings().archive_interval_minutes * 60
+    while True:
+        try:
+            moved = await archive_orders()
+            if moved:
+                logger.info("archived %s orders", moved)
+        except Exception:
+            logger.exception("order archival failed")
+        await asyncio.sleep(interval)
+
+
+async def find_archived(db: AsyncSession, ref: str, user: User | None = None) -> ArchivedOrder | None:
+    """Archived order by ref (slow path after a miss in orders); with user, only the buyer or a seller in it."""
+    q = select(ArchivedOrder).where(ArchivedOrder.ref == ref).options(selectinload(ArchivedOrder.items))
+    if user is not None:
+        q = q.where(
+            (ArchivedOrder.user_id == user.id)
+            | select(ArchivedSellerOrder.id)
+            .where(ArchivedSellerOrder.order_id == ArchivedOrder.id, ArchivedSellerOrder.seller_id == user.id)
+            .exists()
+        )
+    return (await db.execute(q)).scalar_one_or_none()
+
+
+async def _main() -> None:
+    from app.database import init_db
+
+    await init_db()
+    print(f"archive: moved {await archive_orders()} orders.")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,23 +1,29 @@
 # Session, passphrase validation, 2FA, role checks (US-005, US-006, US-017).
 from __future__ import annotations
 
+import hashlib
+import hmac
 import re
-from typing import Annotated
+import secrets
+import time
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer
 from itsdangerous import BadSignature, URLSafeTimedSerializer
 from passlib.context import CryptContext
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import USERS, LocalCache
 from app.config import get_settings
-from app.database import get_db
+from app.database import async_session_factory
 from app.models.user import User, UserRole
+from app.sessions import is_revoked, new_sid
 
 settings = get_settings()
 pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer(auto_error=False)
+# Detached, read-only User rows; cleared in every worker when the users namespace is bumped.
+_user_cache = LocalCache(USERS, maxsize=4096, ttl=settings.user_cache_ttl_seconds)
 
 
 def hash_passphrase(plain: str) -> str:
@@ -50,32 +56,93 @@ def make_serializer() -> URLSafeTimedSerializer:
 
 def encode_session(user_id: int, role: str) -> str:
     s = make_serializer()
-    return s.dumps({"user_id": user_id, "role": role}, salt="session")
+    # iat: issue time to the microsecond; the serializer's own timestamp is whole seconds, too coarse to
+    # tell a session revoked by "log out everywhere" from one started later in the same second.
+    return s.dumps({"user_id": user_id, "role": role, "sid": new_sid(), "iat": time.time()}, salt="session")
 
 
 def decode_session(token: str) -> dict | None:
+    """Session payload, or None if the token is invalid, expired or revoked (checked in memory, no query)."""
     s = make_serializer()
     try:
-        return s.loads(token, salt="session", max_age=settings.session_ttl_seconds)
+        data, issued = s.loads(token, salt="session", max_age=settings.session_ttl_seconds, return_timestamp=True)
     except BadSignature:
         return None
+    if is_revoked(data.get("sid"), data["user_id"], data.get("iat", issued.timestamp())):
+        return None
+    return data
+
+
+def csrf_token(sid: int) -> str:
+    """Token for the state-changing forms of one session: an HMAC of its sid, so nothing is stored."""
+    return hmac.new(settings.secret_key.encode(), f"csrf:{sid}".encode(), hashlib.sha256).hexdigest()
+
+
+async def csrf_ok(request: Request) -> bool:
+    """True if the posted form carries the token of the request's session (request.state.csrf)."""
+    expected = getattr(request.state, "csrf", None)
+    posted = (await request.form()).get("csrf") or ""
+    return expected is not None and hmac.compare_digest(posted, expected)
+
+
+def new_anon_id() -> str:
+    return secrets.token_hex(8)
+
+
+def encode_anon_token(anon_id: str) -> str:
+    """Signed random id for a visitor without a session (admission-control key)."""
+    return make_serializer().dumps(anon_id, salt="anon")
+
 
+def decode_anon_token(token: str) -> str | None:
+    try:
+        return make_serializer().loads(token, salt="anon", max_age=settings.session_ttl_seconds)
+    except BadSignature:
+        return None
+
+
+def encode_cart(lines: dict[int, int]) -> str:
+    """Signed anonymous cart: [[product_id, quantity], ...]; no prices, they are read at render/merge."""
+    return make_serializer().dumps([[pid, qty] for pid, qty in lines.items()], salt="cart")
 
-async def get_current_user(
-    request: Request,
-    db: Annotated[AsyncSession, Depends(get_db)],
-) -> User | None:
+
+def decode_cart(token: str) -> dict[int, int]:
+    """Cart lines from the cookie, capped to the configured limits; empty if missing or tampered."""
+    try:
+        raw = make_serializer().loads(token, salt="cart", max_age=settings.session_ttl_seconds)
+    except BadSignature:
+        return {}
+    lines: dict[int, int] = {}
+    try:
+        for pid, qty in raw[: settings.cart_max_lines]:
+            if int(qty) > 0:
+                lines[int(pid)] = min(int(qty), settings.cart_max_quantity)
+    except (TypeError, ValueError):
+        return {}
+    return lines
+
+
+async def load_active_user(user_id: int) -> User | None:
+    """Active user by id, from this worker's cache or a short-lived session (object is detached)."""
+    user = _user_cache.get(user_id)
+    if user is None:
+        async with async_session_factory() as db:
+            result = await db.execute(select(User).where(User.id == user_id))
+            user = result.scalar_one_or_none()
+        if user is None:
+            return None
+        _user_cache.set(user_id, user)
+    return user if user.is_active else None
+
+
+async def get_current_user(request: Request) -> User | None:
     token = request.cookies.get(settings.session_cookie_name)
     if not token:
         return None
     data = decode_session(token)
     if not data:
         return None
-    result = await db.execute(select(User).where(User.id == data["user_id"]))
-    user = result.scalar_one_or_none()
-    if not user or not user.is_active:
-        return None
-    return user
+    return await load_active_user(data["user_id"])
 
 
 async def require_user(
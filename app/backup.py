@@ -0,0 +1,196 @@
+# Online SQLite backup: copy store.db while the app keeps serving, verify it, optionally encrypt it.
+# The copy uses SQLite's backup API in small page steps from a pinned read snapshot, so writers
+# in WAL mode keep committing and the backup never restarts on their changes. It runs in a thread;
+# the event loop is never blocked. Scheduled in the leader worker, or run by hand:
+#   cd store && python -m app.backup [dest_dir]
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import get_settings
+from app.database import engine
+from app.leader import on_leader
+
+logger = logging.getLogger("darkstore.backup")
+
+PREFIX = "store-"
+
+
+class BackupError(Exception):
+    """Backup could not be written, verified or encrypted (the partial file is removed)."""
+
+
+@dataclass
+class BackupResult:
+    path: Path
+    pages: int
+    steps: int
+    seconds: float
+    max_step_ms: float  # longest single step (copy work between two pauses)
+    encrypted: bool
+
+
+def source_path() -> str:
+    """Filesystem path of the app database; only SQLite files can be backed up online."""
+    url = engine.url
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        raise BackupError(f"online backup needs a SQLite file database, not {url.get_backend_name()}")
+    return url.database
+
+
+def _copy(src_path: str, dest: Path, step_pages: int, pause: float) -> tuple[int, int, float]:
+    """Page-stepped copy of src into dest; returns (pages, steps, longest step in ms)."""
+    steps = 0
+    pages = 0
+    longest = 0.0
+    last = time.perf_counter()
+
+    def progress(_status: int, remaining: int, total: int) -> None:
+        nonlocal steps, pages, longest, last
+        now = time.perf_counter()
+        longest = max(longest, now - last)
+        steps += 1
+        pages = total
+        if remaining and pause:
+            time.sleep(pause)  # between steps: let the writer and checkpointer run
+        last = time.perf_counter()
+
+    # Readers never block writers in WAL mode. Holding one read transaction across all steps
+    # pins a consistent snapshot; without it, every commit by another connection would restart
+    # the backup from page 0 and a busy store would never finish.
+    src = sqlite3.connect(src_path, isolation_level=None)
+    dst = sqlite3.connect(dest)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=step_pages, progress=progress)
+        src.execute("COMMIT")
+        dst.execute("PRAGMA journal_mode=DELETE")  # the copy inherits WAL mode; make it one self-contained file
+    finally:
+        dst.close()
+        src.close()
+    return pages, steps, longest * 1000
+
+
+def _verify(path: Path) -> None:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    if rows != ["ok"]:
+        raise BackupError(f"integrity check failed: {'; '.join(rows[:5])}")
+
+
+def _encrypt(path: Path, recipient: str) -> Path:
+    """Encrypt to the operator's PGP key with gpg (public key only on this host); removes the plaintext."""
+    if shutil.which("gpg") is None:
+        raise BackupError("STORE_BACKUP_GPG_RECIPIENT is set but gpg is not installed")
+    out = path.with_name(path.name + ".gpg")
+    proc = subprocess.run(
+        ["gpg", "--batch", "--yes", "--trust-model", "always", "--recipient", recipient, "--output", str(out), "--encrypt", str(path)],
+        capture_output=True,
+    )
+    if proc.returncode != 0:
+        out.unlink(missing_ok=True)
+        raise BackupError(f"gpg failed: {proc.stderr.decode(errors='replace').strip()[:500]}")
+    out.chmod(0o600)
+    path.unlink()
+    return out
+
+
+def _run(dest_dir: Path) -> BackupResult:
+    settings = get_settings()
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    final = dest_dir / f"{PREFIX}{stamp}.db"
+    tmp = dest_dir / f".{final.name}.part"
+    # Created 0600 before SQLite opens it: the copy holds every order and account.
+    os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+    start = time.perf_counter()
+    try:
+        pages, steps, longest = _copy(source_path(), tmp, settings.backup_step_pages, settings.backup_step_pause_ms / 1000)
+        _verify(tmp)
+        tmp.replace(final)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    encrypted = bool(settings.backup_gpg_recipient)
+    if encrypted:
+        try:
+            final = _encrypt(final, settings.backup_gpg_recipient)
+        except BackupError:
+            final.unlink(missing_ok=True)  # never leave a plaintext copy when encryption was asked for
+            raise
+    return BackupResult(final, pages, steps, time.perf_counter() - start, longest, encrypted)
+
+
+def backups(dest_dir: Path) -> list[Path]:
+    """Finished backups in dest_dir, oldest first."""
+    if not dest_dir.is_dir():
+        return []
+    return sorted(p for p in dest_dir.iterdir() if p.name.startswith(PREFIX) and p.suffix in (".db", ".gpg"))
+
+
+def prune(dest_dir: Path, keep: int) -> int:
+    """Delete all but the newest keep backups; returns how many were removed."""
+    old = backups(dest_dir)[:-keep] if keep > 0 else []
+    for p in old:
+        p.unlink(missing_ok=True)
+    return len(old)
+
+
+async def backup_database(dest_dir: str | Path | None = None) -> BackupResult:
+    """Write a verified (and, if configured, encrypted) copy of the database into dest_dir."""
+    settings = get_settings()
+    target = Path(dest_dir or settings.backup_dir)
+    result = await asyncio.to_thread(_run, target)
+    await asyncio.to_thread(prune, target, settings.backup_keep)
+    logger.info(
+        "backup %s: %s pages in %s steps, %.2fs, longest step %.1fms",
+        result.path.name, result.pages, result.steps, result.seconds, result.max_step_ms,
+    )
+    return result
+
+
+@on_leader
+async def _backup_periodically() -> None:
+    settings = get_settings()
+    interval = settings.backup_interval_hours * 3600
+    if interval <= 0 or engine.dialect.name != "sqlite":
+        return  # server databases are backed up with their own tools (pg_dump, base backups)
+    while True:
+        # Due when the newest backup is older than the interval, so restarts neither skip nor repeat one.
+        existing = backups(Path(settings.backup_dir))
+        age = time.time() - existing[-1].stat().st_mtime if existing else interval
+        if age >= interval:
+            try:
+                await backup_database()
+                age = 0
+            except Exception:
+                logger.exception("database backup failed")
+                age = interval - 600  # retry in 10 minutes
+        await asyncio.sleep(interval - age)
+
+
+async def _main(dest_dir: str | None) -> None:
+    result = await backup_database(dest_dir)
+    print(
+        f"backup: {result.path} ({result.pages} pages, {result.steps} steps, {result.seconds:.2f}s, "
+        f"longest step {result.max_step_ms:.1f}ms{', encrypted' if result.encrypted else ''})"
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,158 @@
+# Per-worker caches with cross-process invalidation through the cache_versions table.
+# A change bumps its namespace in the same transaction; every worker polls for bumps
+# (cheaply via SQLite PRAGMA data_version) and clears its local caches for that namespace.
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from sqlalchemy import event, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import engine
+from app.models.system import CacheVersion
+
+logger = logging.getLogger("darkstore.cache")
+
+# Namespaces that can be bumped; each is a row in cache_versions.
+PRODUCTS = "products"
+USERS = "users"
+SESSIONS = "sessions"
+NAMESPACES = (PRODUCTS, USERS, SESSIONS)
+
+_MISSING = object()
+
+
+class LocalCache:
+    """Bounded LRU with TTL, local to this worker, cleared when its namespace is bumped anywhere."""
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float | None = None) -> None:
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        _registry.setdefault(namespace, []).append(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_registry: dict[str, list[LocalCache]] = {}
+_listeners: dict[str, list[Callable[[], None]]] = {}
+_seen_versions: dict[str, int] = {}
+
+
+def on_bump(namespace: str, fn: Callable[[], None]) -> None:
+    """Call fn in this worker whenever namespace is bumped (here or elsewhere); it must not block."""
+    _listeners.setdefault(namespace, []).append(fn)
+
+
+def clear_local(namespace: str) -> None:
+    for c in _registry.get(namespace, ()):
+        c.clear()
+    for fn in _listeners.get(namespace, ()):
+        fn()
+
+
+async def bump(db: AsyncSession, namespace: str) -> None:
+    """Invalidate namespace in every worker; call inside the transaction that makes the change."""
+    await db.execute(update(CacheVersion).where(CacheVersion.name == namespace).values(version=CacheVersion.version + 1))
+    db.sync_session.info.setdefault("cache_bumps", set()).add(namespace)
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_after_commit(session: Session) -> None:
+    # This worker does not wait for the poller to see its own changes.
+    for ns in session.info.pop("cache_bumps", ()):
+        clear_local(ns)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bumps(session: Session) -> None:
+    session.info.pop("cache_bumps", None)
+
+
+async def ensure_versions() -> None:
+    """Create missing namespace rows (run at startup; workers may race, the loser re-checks)."""
+    for _ in range(2):
+        try:
+            async with engine.begin() as conn:
+                existing = set((await conn.execute(select(CacheVersion.name))).scalars())
+                missing = [{"name": ns, "version": 0} for ns in NAMESPACES if ns not in existing]
+                if missing:
+                    await conn.execute(insert(CacheVersion), missing)
+            return
+        except IntegrityError:
+            continue
+
+
+async def _read_versions(conn) -> dict[str, int]:
+    return dict((await conn.execute(select(CacheVersion.name, CacheVersion.version))).all())
+
+
+def _apply(versions: dict[str, int]) -> None:
+    for ns, v in versions.items():
+        if _seen_versions.get(ns, v) != v:
+            logger.debug("cache namespace %s bumped to %s; clearing", ns, v)
+            clear_local(ns)
+        _seen_versions[ns] = v
+
+
+async def poll_invalidations(stop: asyncio.Event) -> None:
+    """Watch cache_versions on a dedicated connection until stop is set.
+
+    On SQLite, PRAGMA data_version changes only when another connection commits, so the
+    version table is read only after some write; other backends read it every interval.
+    """
+    interval = get_settings().cache_poll_ms / 1000
+    sqlite = engine.dialect.name == "sqlite"
+    async with engine.connect() as conn:
+        last_data_version = None
+        _apply(await _read_versions(conn))
+        await conn.rollback()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                if sqlite:
+                    dv = (await conn.execute(text("PRAGMA data_version"))).scalar()
+                    if dv == last_data_version:
+                        continue
+                    last_data_version = dv
+                _apply(await _read_versions(conn))
+                await conn.rollback()
+            except Exception:
+                logger.exception("cache invalidation poll failed")
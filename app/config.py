@@ -17,8 +17,10 @@ def _env_int(name: str, default: int) -> int:
 
 
 def _env_bool(name: str, default: bool = False) -> bool:
-    v = os.getenv(name, "").lower()
-    return v in ("1", "true", "yes") if default is False else v not in ("0", "false", "no", "")
+    v = os.getenv(name, "").strip().lower()
+    if not v:
+        return default
+    return v in ("1", "true", "yes")
 
 
 class Settings:
@@ -30,11 +32,19 @@ class Settings:
         self.host: str = _env("STORE_HOST", "127.0.0.1")
         self.port: int = _env_int("STORE_PORT", 8000)
         self.database_url: str = _env("STORE_DATABASE_URL", "sqlite+aiosqlite:///./store.db")
+        # Connection pool for server databases (PostgreSQL via asyncpg); SQLite ignores these.
+        self.db_pool_size: int = _env_int("STORE_DB_POOL_SIZE", 10)  # per worker process
+        self.db_max_overflow: int = _env_int("STORE_DB_MAX_OVERFLOW", 10)
+        self.db_pool_timeout_seconds: int = _env_int("STORE_DB_POOL_TIMEOUT_SECONDS", 10)
+        self.db_pool_recycle_seconds: int = _env_int("STORE_DB_POOL_RECYCLE_SECONDS", 1800)
+        self.db_statement_cache_size: int = _env_int("STORE_DB_STATEMENT_CACHE_SIZE", 256)  # 0 behind pgbouncer (transaction mode)
         self.secret_key: str = _env("STORE_SECRET_KEY", "CHANGE_IN_PRODUCTION_use_env_SECRET_KEY")
         self.session_cookie_name: str = _env("STORE_SESSION_COOKIE_NAME", "session")
         self.session_ttl_seconds: int = _env_int("STORE_SESSION_TTL_SECONDS", 86400 * 7)
         self.session_same_site: str = _env("STORE_SESSION_SAME_SITE", "lax")
         self.session_secure: bool = _env_bool("STORE_SESSION_SECURE", True)
+        # Revoked session ids the in-memory bloom filter is sized for (app/sessions.py); more still work, with more false hits.
+        self.session_revocation_capacity: int = _env_int("STORE_SESSION_REVOCATION_CAPACITY", 100_000)
         self.passphrase_min_length: int = _env_int("STORE_PASSPHRASE_MIN_LENGTH", 12)
         self.passphrase_require_upper: bool = _env_bool("STORE_PASSPHRASE_REQUIRE_UPPER", True)
         self.passphrase_require_lower: bool = _env_bool("STORE_PASSPHRASE_REQUIRE_LOWER", True)
@@ -50,6 +60,69 @@ class Settings:
         self.platform_pgp_public_key: str | None = os.getenv("STORE_PLATFORM_PGP_PUBLIC_KEY") or None
         self.platform_pgp_public_key_path: str | None = os.getenv("STORE_PLATFORM_PGP_PUBLIC_KEY_PATH") or None
         self.escrow_auto_finalize_days: int = _env_int("STORE_ESCROW_AUTO_FINALIZE_DAYS", 14)
+        # Max seconds a request waits on a shared (single-flight) catalog lookup before a 503.
+        self.singleflight_timeout_seconds: int = _env_int("STORE_SINGLEFLIGHT_TIMEOUT_SECONDS", 10)
+        # Admission control (app/admission.py): token bucket per session / anonymous token.
+        self.admission_enabled: bool = _env_bool("STORE_ADMISSION_ENABLED", True)
+        self.admission_bucket_size: int = _env_int("STORE_ADMISSION_BUCKET_SIZE", 60)
+        self.admission_refill_per_minute: int = _env_int("STORE_ADMISSION_REFILL_PER_MINUTE", 60)
+        self.admission_max_buckets: int = _env_int("STORE_ADMISSION_MAX_BUCKETS", 50000)
+        self.admission_mint_per_minute: int = _env_int("STORE_ADMISSION_MINT_PER_MINUTE", 600)  # new anonymous tokens, all clients
+        self.anon_cookie_name: str = _env("STORE_ANON_COOKIE_NAME", "anon")
+        self.catalog_max_page_size: int = _env_int("STORE_CATALOG_MAX_PAGE_SIZE", 100)
+        # Multi-worker mode (app/cache.py, app/leader.py).
+        self.sqlite_busy_timeout_ms: int = _env_int("STORE_SQLITE_BUSY_TIMEOUT_MS", 5000)
+        # Retries of a checkout whose busy timeout ran out; then 503 with Retry-After instead of a 500.
+        self.sqlite_lock_retries: int = _env_int("STORE_SQLITE_LOCK_RETRIES", 1)
+        self.cache_poll_ms: int = _env_int("STORE_CACHE_POLL_MS", 500)
+        self.user_cache_ttl_seconds: int = _env_int("STORE_USER_CACHE_TTL_SECONDS", 60)
+        self.page_cache_ttl_seconds: int = _env_int("STORE_PAGE_CACHE_TTL_SECONDS", 60)  # 0 disables
+        self.leader_lease_seconds: int = _env_int("STORE_LEADER_LEASE_SECONDS", 15)
+        # Anonymous cart in a signed cookie; merged into the DB cart at login/checkout.
+        self.cart_cookie_name: str = _env("STORE_CART_COOKIE_NAME", "cart")
+        self.cart_max_lines: int = _env_int("STORE_CART_MAX_LINES", 20)
+        self.cart_max_quantity: int = _env_int("STORE_CART_MAX_QUANTITY", 99)
+        # Hot/cold order archival (app/archive.py).
+        self.archive_after_days: int = _env_int("STORE_ARCHIVE_AFTER_DAYS", 90)  # 0 disables
+        self.archive_batch_size: int = _env_int("STORE_ARCHIVE_BATCH_SIZE", 200)
+        self.archive_interval_minutes: int = _env_int("STORE_ARCHIVE_INTERVAL_MINUTES", 60)
+        # Seller bulk import (app/product_import.py).
+        self.import_batch_rows: int = _env_int("STORE_IMPORT_BATCH_ROWS", 500)
+        self.import_max_rows: int = _env_int("STORE_IMPORT_MAX_ROWS", 20000)
+        # Support exports (app/export.py).
+        self.export_page_rows: int = _env_int("STORE_EXPORT_PAGE_ROWS", 5000)
+        self.export_max_concurrent: int = _env_int("STORE_EXPORT_MAX_CONCURRENT", 1)  # per worker
+        self.export_pause_ms: int = _env_int("STORE_EXPORT_PAUSE_MS", 5)  # after every 500 rows
+        # Durable job queue (app/jobs.py).
+        self.job_workers: int = _env_int("STORE_JOB_WORKERS", 2)  # per process; 0 disables
+        self.job_poll_ms: int = _env_int("STORE_JOB_POLL_MS", 500)
+        self.job_batch_size: int = _env_int("STORE_JOB_BATCH_SIZE", 20)
+        self.job_lease_seconds: int = _env_int("STORE_JOB_LEASE_SECONDS", 60)
+        self.job_retention_hours: int = _env_int("STORE_JOB_RETENTION_HOURS", 24)
+        # Online database backup (app/backup.py).
+        self.backup_dir: str = _env("STORE_BACKUP_DIR", "./backups")
+        self.backup_interval_hours: int = _env_int("STORE_BACKUP_INTERVAL_HOURS", 24)  # 0 disables the schedule
+        self.backup_keep: int = _env_int("STORE_BACKUP_KEEP", 7)
+        self.backup_step_pages: int = _env_int("STORE_BACKUP_STEP_PAGES", 256)
+        self.backup_step_pause_ms: int = _env_int("STORE_BACKUP_STEP_PAUSE_MS", 5)
+        self.backup_gpg_recipient: str = _env("STORE_BACKUP_GPG_RECIPIENT", "")  # key id/fingerprint in gpg's keyring
+        # Migration runner (python -m migrations): backfill batches and DDL lock waits.
+        self.migration_batch_rows: int = _env_int("STORE_MIGRATION_BATCH_ROWS", 1000)
+        self.migration_pause_ms: int = _env_int("STORE_MIGRATION_PAUSE_MS", 50)  # between backfill batches
+        self.migration_lock_timeout_ms: int = _env_int("STORE_MIGRATION_LOCK_TIMEOUT_MS", 5000)  # PostgreSQL DDL
+        # Per-request SQL statement counting (app/querybudget.py): off, warn (log) or strict (raise; tests/CI).
+        self.query_budgets: str = _env("STORE_QUERY_BUDGETS", "warn" if self.debug else "off").lower()
+        self.query_repeat_threshold: int = _env_int("STORE_QUERY_REPEAT_THRESHOLD", 5)  # same shape this often = likely N+1
+        # PGP via gpg (app/pgp.py): concurrent gpg processes per worker, queued encryptions, cached key files.
+        self.pgp_workers: int = _env_int("STORE_PGP_WORKERS", 2)
+        self.pgp_queue_size: int = _env_int("STORE_PGP_QUEUE_SIZE", 200)
+        self.pgp_key_cache_size: int = _env_int("STORE_PGP_KEY_CACHE_SIZE", 1024)
+        # Templates (app/templating.py): compiled bytecode on disk ("" disables), rendered {% cache %} fragments per worker.
+        self.template_cache_dir: str = os.getenv("STORE_TEMPLATE_CACHE_DIR", "./template-cache").strip()
+        self.fragment_cache_size: int = _env_int("STORE_FRAGMENT_CACHE_SIZE", 5000)  # 0 disables
+        # Notification inbox (app/notifications.py).
+        self.notification_page_size: int = _env_int("STORE_NOTIFICATION_PAGE_SIZE", 50)
+        self.notification_retention_days: int = _env_int("STORE_NOTIFICATION_RETENTION_DAYS", 90)  # read ones; 0 keeps all
 
     def get_platform_pgp_public_key(self) -> str | None:
         """Return platform PGP public key (from env or from file). Used for Escrow policy page; never logged."""
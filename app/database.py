@@ -1,27 +1,106 @@
 # Async database session and lifecycle.
 from __future__ import annotations
 
-from collections.abc import AsyncGenerator
+import asyncio
+import functools
+import inspect
+import random
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from contextlib import asynccontextmanager
+from typing import Any, TypeVar
 
+from sqlalchemy import event, make_url, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import get_settings
 
 settings = get_settings()
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def _engine_options(url: str) -> dict[str, Any]:
+    """Pool and driver options: SQLite keeps SQLAlchemy's defaults; server databases get a sized pool."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return {}
+    options: dict[str, Any] = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": True,
+    }
+    if parsed.get_driver_name() == "asyncpg":
+        # SQLAlchemy prepares every statement on asyncpg and caches the prepared statement per
+        # connection; asyncpg's own cache is then unused. 0 disables both (needed behind pgbouncer).
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "statement_cache_size": settings.db_statement_cache_size,
+        }
+    return options
+
+
 engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
     future=True,
+    **_engine_options(settings.database_url),
 )
 async_session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record) -> None:
+        # WAL lets readers run alongside the single writer; busy_timeout makes writers in
+        # other worker processes wait for the lock instead of failing with "database is locked".
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cur.close()
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def is_lock_timeout(exc: BaseException) -> bool:
+    """SQLite gave up waiting for the write lock (STORE_SQLITE_BUSY_TIMEOUT_MS ran out)."""
+    return isinstance(exc, OperationalError) and "database is locked" in str(exc.orig)
+
+
+def retry_locked(fn: F) -> F:
+    """Re-run a write route whose transaction timed out on SQLite's write lock, after a rollback.
+
+    For routes whose form has been read before the first write (request.form() is cached, so
+    the retry sees the same input). After STORE_SQLITE_LOCK_RETRIES retries the error propagates
+    and the app answers 503 with Retry-After. Put it above @query_budget.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        db: AsyncSession = kwargs["db"]
+        for attempt in range(settings.sqlite_lock_retries + 1):
+            try:
+                return await fn(*args, **kwargs)
+            except OperationalError as e:
+                if not is_lock_timeout(e) or attempt == settings.sqlite_lock_retries:
+                    raise
+                await db.rollback()
+                await asyncio.sleep(random.uniform(0.05, 0.2))  # let the queue of writers drain
+    # FastAPI reads the route's parameters from here; resolve them against the route's own module.
+    wrapper.__signature__ = inspect.signature(fn, eval_str=True)  # type: ignore[attr-defined]
+    return wrapper  # type: ignore[return-value]
+
+
+def upsert(model: Any) -> Any:
+    """INSERT for the configured backend, with on_conflict_do_update() / on_conflict_do_nothing()."""
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_factory() as session:
         try:
@@ -37,5 +116,15 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 async def init_db() -> None:
     # Import models so they are registered with Base.metadata
     from app import models  # noqa: F401
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Several workers starting at once may race to create the same tables; retry until settled.
+    # On PostgreSQL an advisory lock serialises them instead (DDL is transactional there).
+    for attempt in range(10):
+        try:
+            async with engine.begin() as conn:
+                if engine.dialect.name == "postgresql":
+                    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('darkstore.init_db'))"))
+                await conn.run_sync(Base.metadata.create_all)
+            return
+        except DBAPIError as e:
+            if "already exists" not in str(e).lower() or attempt == 9:
+                raise
@@ -0,0 +1,122 @@
+# Bulk order/escrow export for support reconciliation (CSV or JSONL, streamed).
+# Rows are read in keyset pages on (created_at, id), each page through a server-side cursor in
+# its own short read transaction, so an export of any size holds one page in memory and never
+# pins an old WAL snapshot that would stop checkpoints under live traffic.
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+
+from app.config import get_settings
+from app.database import async_session_factory
+from app.models.archive import ArchivedOrder
+from app.models.order import Order
+
+# Exported columns; the encrypted notes/evidence and free-text operator notes are never exported.
+EXPORT_COLUMNS = (
+    "ref", "status", "escrow_status", "payment_method", "created_at", "updated_at",
+    "user_id", "primary_seller_id", "item_count", "total_cents", "escrow_amount_cents", "escrow_address",
+    "escrow_funded_at", "buyer_reported_payment_at", "auto_finalize_at",
+    "dispute_opened_at", "dispute_resolved_at", "dispute_resolution",
+)
+
+# Rows formatted per chunk written to the client; each write yields to other requests.
+EXPORT_CHUNK_ROWS = 500
+
+# Exports running in this worker; more are refused rather than queued.
+_active = 0
+
+
+@dataclass
+class ExportFilter:
+    status: str | None = None
+    escrow_status: str | None = None
+    date_from: date | None = None  # created_at, inclusive
+    date_to: date | None = None  # inclusive
+    include_archived: bool = False
+
+
+def _page_query(model, f: ExportFilter, after: tuple[str, int] | None, limit: int):
+    cols = [getattr(model, c) for c in EXPORT_COLUMNS]
+    q = select(model.id, *cols).order_by(model.created_at, model.id).limit(limit)
+    if f.status:
+        q = q.where(model.status == f.status)
+    if f.escrow_status:
+        q = q.where(model.escrow_status == f.escrow_status)
+    if f.date_from:
+        q = q.where(model.created_at >= f.date_from.isoformat())
+    if f.date_to:
+        q = q.where(model.created_at < (f.date_to + timedelta(days=1)).isoformat())
+    if after is not None:
+        q = q.where(tuple_(model.created_at, model.id) > after)
+    return q
+
+
+async def iter_orders(f: ExportFilter) -> AsyncIterator[list]:
+    """Yield export rows in chunks of EXPORT_CHUNK_ROWS (live orders, then archived ones if asked)."""
+    settings = get_settings()
+    page_rows = settings.export_page_rows
+    pause = settings.export_pause_ms / 1000
+    for model in (Order, ArchivedOrder) if f.include_archived else (Order,):
+        after = None
+        while True:
+            async with async_session_factory() as db:
+                result = await db.stream(_page_query(model, f, after, page_rows).execution_options(yield_per=1000))
+                page = [row async for row in result]
+            for i in range(0, len(page), EXPORT_CHUNK_ROWS):
+                yield page[i:i + EXPORT_CHUNK_ROWS]
+                await asyncio.sleep(pause)  # cap the export's share of this worker
+            if len(page) < page_rows:
+                break
+            after = (page[-1].created_at, page[-1].id)
+
+
+async def csv_chunks(f: ExportFilter) -> AsyncIterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in iter_orders(f):
+        writer.writerows(row[1:] for row in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+async def jsonl_chunks(f: ExportFilter) -> AsyncIterator[str]:
+    async for rows in iter_orders(f):
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row[1:])), separators=(",", ":")) + "\n" for row in rows)
+
+
+def try_acquire() -> bool:
+    """Take an export slot without waiting; the ExportResponse gives it back when it is done."""
+    global _active
+    if _active >= get_settings().export_max_concurrent:
+        return False
+    _active += 1
+    return True
+
+
+class ExportResponse(StreamingResponse):
+    """Streamed export download that releases its slot however the transfer ends."""
+
+    def __init__(self, chunks: AsyncIterator[str], media_type: str, filename: str) -> None:
+        super().__init__(
+            chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    async def __call__(self, scope, receive, send) -> None:
+        global _active
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            _active -= 1
@@ -0,0 +1,113 @@
+# Catalog category facet: listed products per category, kept in category_counts.
+# Product writes (seller form, delist, bulk import) add their deltas in the same transaction, so the
+# facet never counts products; each worker keeps the counts in memory until products change
+# (cache_versions), and a reconcile job corrects drift from the products table.
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Any
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import PRODUCTS, LocalCache, bump
+from app.database import async_session_factory, engine, upsert
+from app.jobs import enqueue, handler
+from app.leader import on_leader
+from app.models.product import Product
+from app.models.rollup import CategoryCount
+
+logger = logging.getLogger("darkstore.facets")
+
+RECONCILE_INTERVAL_HOURS = 6
+
+# A product's facet state: (category, is_listed), or None before it exists.
+Listing = tuple[str, bool]
+
+_counts = LocalCache(PRODUCTS, maxsize=1)
+
+
+def listing_delta(before: Listing | None, after: Listing | None) -> Counter[str]:
+    """Per-category change in listed products when one product goes from before to after."""
+    delta: Counter[str] = Counter()
+    if before is not None and before[1]:
+        delta[before[0]] -= 1
+    if after is not None and after[1]:
+        delta[after[0]] += 1
+    return delta
+
+
+async def record_listing_change(db: AsyncSession, delta: Counter[str]) -> None:
+    """Add a listing delta (one product's, or a batch's sum) to category_counts in one upsert.
+
+    Call inside the transaction that writes the products.
+    """
+    rows = [{"category": c, "listed": n} for c, n in sorted(delta.items()) if n]
+    if not rows:
+        return
+    stmt = upsert(CategoryCount).values(rows)
+    await db.execute(
+        stmt.on_conflict_do_update(index_elements=["category"], set_={"listed": CategoryCount.listed + stmt.excluded.listed})
+    )
+
+
+async def category_counts() -> list[tuple[str, int]]:
+    """(category, listed) for categories with listed products, by name; from memory when unchanged."""
+    counts = _counts.get("all")
+    if counts is None:
+        async with async_session_factory() as db:
+            rows = await db.execute(
+                select(CategoryCount.category, CategoryCount.listed)
+                .where(CategoryCount.listed > 0)
+                .order_by(CategoryCount.category)
+            )
+            counts = [tuple(r) for r in rows]
+        _counts.set("all", counts)
+    return counts
+
+
+async def reconcile() -> int:
+    """Recount listed products per category and fix rows that drifted; returns how many were fixed.
+
+    Two statements in one write transaction (a scan of products; runs as a job, a few times a day).
+    """
+    per_category = select(Product.category, func.count().label("listed")).where(Product.is_listed).group_by(Product.category)
+    stmt = upsert(CategoryCount).from_select(["category", "listed"], per_category)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["category"],
+        set_={"listed": stmt.excluded.listed},
+        where=CategoryCount.listed != stmt.excluded.listed,
+    )
+    async with engine.begin() as conn:
+        fixed = (await conn.execute(stmt)).rowcount
+        listed_categories = select(Product.category).where(Product.is_listed)
+        fixed += (await conn.execute(
+            update(CategoryCount)
+            .where(CategoryCount.listed != 0, CategoryCount.category.not_in(listed_categories))
+            .values(listed=0)
+        )).rowcount
+    return fixed
+
+
+@handler("facets.reconcile")
+async def _reconcile_job(payload: dict[str, Any]) -> None:
+    fixed = await reconcile()
+    if fixed:
+        logger.warning("reconciled listed counts of %s categories", fixed)
+        async with async_session_factory() as db:
+            await bump(db, PRODUCTS)
+            await db.commit()
+
+
+@on_leader
+async def _reconcile_periodically() -> None:
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL_HOURS * 3600)
+        try:
+            async with async_session_factory() as db:
+                enqueue(db, "facets.reconcile", priority=-1)
+                await db.commit()
+        except Exception:
+            logger.exception("could not enqueue category count reconciliation")
@@ -0,0 +1,259 @@
+# Durable job queue stored in the app database: deferred work runs after the response.
+# Jobs are enqueued inside the caller's transaction, claimed with a lease by a single
+# UPDATE (safe across worker processes), retried with exponential backoff, then dead-lettered.
+# A batch runs one job at a time: each job is settled as soon as it ends, in the transaction that
+# renews the lease of the next one, so a batch may take longer than one lease.
+# The leader worker requeues jobs whose lease lapsed and prunes finished ones.
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import secrets
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import engine
+from app.leader import WORKER_ID, on_leader
+from app.models.job import Job, JobState
+
+logger = logging.getLogger("darkstore.jobs")
+
+Handler = Callable[[dict[str, Any]], Awaitable[None]]
+_handlers: dict[str, Handler] = {}
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+
+
+def handler(kind: str) -> Callable[[Handler], Handler]:
+    """Register an async handler for jobs of this kind; it receives the decoded payload."""
+    def register(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: dict[str, Any] | None = None,
+    *,
+    priority: int = 0,
+    delay: float = 0,
+    max_attempts: int = 5,
+) -> Job:
+    """Add a job in the caller's transaction, so it exists only if the surrounding change commits."""
+    now = time.time()
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}, separators=(",", ":")),
+        state=JobState.QUEUED.value,
+        priority=priority,
+        created_at=now,
+        run_at=now + delay,
+        attempts=0,
+        max_attempts=max_attempts,
+    )
+    db.add(job)
+    return job
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.75, 1.25)
+
+
+async def claim(limit: int, owner: str) -> list[Any]:
+    """Lease up to limit ready jobs to owner (a token unique to this batch) in one statement."""
+    settings = get_settings()
+    now = time.time()
+    # SQLite runs the statement under its write lock; FOR UPDATE SKIP LOCKED covers server databases.
+    ids = (
+        select(Job.id)
+        .where(Job.state == JobState.QUEUED.value, Job.run_at <= now)
+        .order_by(Job.priority.desc(), Job.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            update(Job)
+            .where(Job.id.in_(ids))
+            .values(
+                state=JobState.RUNNING.value,
+                started_at=now,
+                lease_until=now + settings.job_lease_seconds,
+                locked_by=owner,
+                attempts=Job.attempts + 1,
+            )
+            .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.priority, Job.run_at)
+        )
+        # RETURNING order is unspecified; run (and renew leases) in claim order.
+        return sorted(result.all(), key=lambda j: (-j.priority, j.run_at))
+
+
+def _leased(job_id: int, owner: str) -> tuple[Any, ...]:
+    # A lapsed lease may have been requeued by the leader and claimed again: only the holder may settle.
+    return Job.id == job_id, Job.state == JobState.RUNNING.value, Job.locked_by == owner
+
+
+async def _finish(owner: str, job: Any, error: str | None, renew: Any | None) -> bool:
+    """Settle job (error None: done) and extend the lease of renew, the batch's next job.
+
+    Returns False if renew is no longer leased to owner; its lease lapsed and the leader requeued it.
+    """
+    now = time.time()
+    if error is None:
+        values: dict[str, Any] = {"state": JobState.DONE.value, "finished_at": now, "lease_until": None}
+    else:
+        dead = job.attempts >= job.max_attempts
+        values = {
+            "state": JobState.DEAD.value if dead else JobState.QUEUED.value,
+            "run_at": now if dead else now + _backoff(job.attempts),
+            "finished_at": now if dead else None,
+            "lease_until": None,
+            "locked_by": None,
+            "last_error": error[:2000],
+        }
+    async with engine.begin() as conn:
+        settled = await conn.execute(update(Job).where(*_leased(job.id, owner)).values(**values))
+        if settled.rowcount == 0:
+            logger.warning("job %s (%s) outlived its lease; it was requeued and may run again", job.id, job.kind)
+        if renew is None:
+            return True
+        renewed = await conn.execute(
+            update(Job).where(*_leased(renew.id, owner)).values(lease_until=now + get_settings().job_lease_seconds)
+        )
+    return renewed.rowcount == 1
+
+
+async def _run(job: Any) -> str | None:
+    """Run one job; its error text, or None on success."""
+    fn = _handlers.get(job.kind)
+    if fn is None:
+        return f"no handler for {job.kind!r}"
+    try:
+        await fn(json.loads(job.payload))
+    except Exception as e:
+        logger.warning("job %s (%s) attempt %s failed: %s", job.id, job.kind, job.attempts, type(e).__name__)
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+async def run_batch(limit: int) -> int:
+    """Claim and run one batch; returns the number of jobs claimed."""
+    owner = f"{WORKER_ID}:{secrets.token_hex(4)}"  # worker loops in one process share WORKER_ID; <= 56 chars
+    jobs = await claim(limit, owner)
+    leased = True
+    for job, after in zip(jobs, [*jobs[1:], None]):
+        if not leased:
+            continue  # requeued while earlier jobs ran: another claim runs it
+        leased = await _finish(owner, job, await _run(job), after)
+    return len(jobs)
+
+
+async def _worker(stop: asyncio.Event) -> None:
+    settings = get_settings()
+    idle = settings.job_poll_ms / 1000
+    while not stop.is_set():
+        try:
+            if await run_batch(settings.job_batch_size):
+                continue
+        except Exception:
+            logger.exception("job worker error")
+        try:
+            await asyncio.wait_for(stop.wait(), idle)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_workers(stop: asyncio.Event) -> list[asyncio.Task]:
+    """Start STORE_JOB_WORKERS worker loops in this process (called from lifespan)."""
+    return [asyncio.create_task(_worker(stop)) for _ in range(get_settings().job_workers)]
+
+
+async def recover_expired() -> int:
+    """Requeue running jobs whose worker died (lease lapsed), or dead-letter them if out of attempts."""
+    now = time.time()
+    expired = (Job.state == JobState.RUNNING.value, Job.lease_until < now)
+    async with engine.begin() as conn:
+        dead = await conn.execute(
+            update(Job)
+            .where(*expired, Job.attempts >= Job.max_attempts)
+            .values(state=JobState.DEAD.value, finished_at=now, lease_until=None, locked_by=None, last_error="lease expired")
+        )
+        requeued = await conn.execute(
+            update(Job)
+            .where(*expired)
+            .values(state=JobState.QUEUED.value, lease_until=None, locked_by=None, last_error="lease expired")
+        )
+    return dead.rowcount + requeued.rowcount
+
+
+async def prune_finished() -> int:
+    """Delete done jobs past retention (dead jobs are kept for inspection)."""
+    cutoff = time.time() - get_settings().job_retention_hours * 3600
+    total = 0
+    while True:
+        ids = select(Job.id).where(Job.state == JobState.DONE.value, Job.finished_at < cutoff).limit(500)
+        async with engine.begin() as conn:
+            deleted = (await conn.execute(delete(Job).where(Job.id.in_(ids)))).rowcount
+        total += deleted
+        if deleted < 500:
+            return total
+        await asyncio.sleep(0.1)  # let request writes in between batches
+
+
+@on_leader
+async def _maintain() -> None:
+    interval = max(1, get_settings().job_lease_seconds / 4)
+    while True:
+        try:
+            await recover_expired()
+            await prune_finished()
+        except Exception:
+            logger.exception("job queue maintenance failed")
+        await asyncio.sleep(interval)
+
+
+async def queue_stats(db: AsyncSession) -> dict[str, Any]:
+    """Queue depth per state/kind, wait time of the oldest ready job, and recent latencies."""
+    now = time.time()
+    by_state = (
+        await db.execute(select(Job.state, Job.kind, func.count()).group_by(Job.state, Job.kind).order_by(Job.state, Job.kind))
+    ).all()
+    oldest_ready = (
+        await db.execute(select(func.min(Job.run_at)).where(Job.state == JobState.QUEUED.value, Job.run_at <= now))
+    ).scalar()
+    recent = (
+        await db.execute(
+            select(
+                func.count(),
+                func.avg(Job.started_at - Job.run_at),
+                func.avg(Job.finished_at - Job.started_at),
+            ).where(Job.state == JobState.DONE.value, Job.finished_at >= now - 3600)
+        )
+    ).one()
+    dead = (
+        await db.execute(
+            select(Job.id, Job.kind, Job.attempts, Job.last_error)
+            .where(Job.state == JobState.DEAD.value)
+            .order_by(Job.finished_at.desc())
+            .limit(20)
+        )
+    ).all()
+    return {
+        "by_state": by_state,
+        "oldest_ready_wait": (now - oldest_ready) if oldest_ready else 0.0,
+        "done_last_hour": recent[0],
+        "avg_wait": recent[1] or 0.0,
+        "avg_run": recent[2] or 0.0,
+        "dead": dead,
+    }
@@ -0,0 +1,102 @@
+# Leader election across workers: one lease row per role, renewed by its holder.
+# Background loops registered with on_leader() run only in the worker holding the lease.
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import get_settings
+from app.database import engine
+from app.models.system import WorkerLease
+
+logger = logging.getLogger("darkstore.leader")
+
+LEASE_NAME = "background"
+
+
+def _worker_id() -> str:
+    """host:pid:random, at most 47 characters.
+
+    The hostname is cut to 32, so this id and the job owners built from it (plus ":" and 8 hex)
+    fit the String(64) holder and locked_by columns on PostgreSQL.
+    """
+    return f"{socket.gethostname()[:32]}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+WORKER_ID = _worker_id()
+
+_background: list[Callable[[], Awaitable[None]]] = []
+_running: list[asyncio.Task] = []
+_leader = False
+
+
+def on_leader(fn: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+    """Register a long-running coroutine function to run only while this worker is leader."""
+    _background.append(fn)
+    return fn
+
+
+def is_leader() -> bool:
+    return _leader
+
+
+async def _try_acquire(lease_seconds: int) -> bool:
+    now = time.time()
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            update(WorkerLease)
+            .where(WorkerLease.name == LEASE_NAME)
+            .where((WorkerLease.holder == WORKER_ID) | (WorkerLease.expires_at < now))
+            .values(holder=WORKER_ID, expires_at=now + lease_seconds)
+        )
+        if result.rowcount:
+            return True
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(insert(WorkerLease).values(name=LEASE_NAME, holder=WORKER_ID, expires_at=now + lease_seconds))
+        return True
+    except IntegrityError:
+        return False  # another worker holds a live lease
+
+
+def _set_leader(leader: bool) -> None:
+    global _leader
+    if leader == _leader:
+        return
+    _leader = leader
+    if leader:
+        logger.info("worker %s elected leader", WORKER_ID)
+        _running.extend(asyncio.ensure_future(fn()) for fn in _background)
+    else:
+        logger.info("worker %s lost leadership", WORKER_ID)
+        for t in _running:
+            t.cancel()
+        _running.clear()
+
+
+async def run_election(stop: asyncio.Event) -> None:
+    """Acquire or renew the lease every third of its length until stop is set, then release it."""
+    lease = get_settings().leader_lease_seconds
+    while not stop.is_set():
+        try:
+            _set_leader(await _try_acquire(lease))
+        except Exception:
+            logger.exception("leader election failed")
+            _set_leader(False)
+        try:
+            await asyncio.wait_for(stop.wait(), lease / 3)
+        except asyncio.TimeoutError:
+            pass
+    was_leader = _leader
+    _set_leader(False)
+    if was_leader:
+        async with engine.begin() as conn:
+            await conn.execute(delete(WorkerLease).where(WorkerLease.name == LEASE_NAME, WorkerLease.holder == WORKER_ID))
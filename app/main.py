@@ -1,21 +1,29 @@
 # Darkstore FastAPI app – Tor onion store (US-001, US-002, US-003, US-017).
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from sqlalchemy.exc import OperationalError
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select
 
-from app.auth import decode_session
+from app.admission import classify, controller as admission, minter, too_many
+from app import backup, pgp, sessions  # noqa: F401  (backup registers the leader's backup schedule)
+from app.auth import csrf_token, decode_anon_token, decode_session, encode_anon_token, load_active_user, new_anon_id
+from app.cache import ensure_versions, poll_invalidations
 from app.config import get_settings
-from app.database import async_session_factory, init_db
-from app.models.user import User
-from app.routers import auth_router, catalog_router, cart_router, checkout_router, orders_router, seller_router, admin_router, policy_router, escrow_router
+from app.database import init_db, is_lock_timeout
+from app.jobs import start_workers
+from app.leader import run_election
+from app.notifications import unread_count
+from app.querybudget import track_queries
+from app.templating import precompile
+from app.routers import auth_router, catalog_router, cart_router, checkout_router, orders_router, seller_router, admin_router, policy_router, escrow_router, profile_router, api_router, notifications_router
 
 settings = get_settings()
 
@@ -43,8 +51,19 @@ SAFE_HEADERS = {"x-content-type-options": "nosniff"}
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await ensure_versions()
+    await sessions.refresh(full=True)  # revoked sessions, before the first request is checked
+    precompile()  # from the bytecode cache when warm, so the first requests do not compile templates
+    # Per-worker: cache invalidation listener, leader election and job workers (safe with uvicorn --workers N).
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(poll_invalidations(stop)), asyncio.create_task(run_election(stop))]
+    tasks.append(asyncio.create_task(sessions.sync(stop)))
+    tasks += start_workers(stop)
+    tasks += pgp.start_workers(stop)
     yield
-    # shutdown if needed
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    pgp.cleanup()
 
 
 app = FastAPI(
@@ -56,27 +75,81 @@ app = FastAPI(
 )
 
 
+def _renders_header(path: str) -> bool:
+    """HTML pages show the unread count in base.html; the JSON API and static files do not."""
+    return not path.startswith(("/api/", "/static/"))
+
+
 @app.middleware("http")
 async def add_user_and_strip_headers(request: Request, call_next):
     request.state.user = None
+    request.state.unread_notifications = 0
     token = request.cookies.get(settings.session_cookie_name)
-    if token:
-        data = decode_session(token)
+    data = decode_session(token) if token else None
+    request.state.csrf = csrf_token(data["sid"]) if data else None
+    # Admission control runs before any DB or bcrypt work (only signature checks above).
+    route_class = classify(request.method, request.url.path) if settings.admission_enabled else None
+    new_anon: str | None = None
+    response = None
+    if route_class is not None:
         if data:
-            async with async_session_factory() as db:
-                result = await db.execute(select(User).where(User.id == data["user_id"]))
-                user = result.scalar_one_or_none()
-                if user and user.is_active:
-                    request.state.user = user
-    response = await call_next(request)
+            key = f"u:{data['user_id']}"
+        else:
+            anon_id = decode_anon_token(request.cookies.get(settings.anon_cookie_name, ""))
+            if anon_id is None:
+                # A new client gets its own token and bucket; only minting itself is rate-limited.
+                retry = minter.try_mint()
+                if retry is None:
+                    anon_id = new_anon = new_anon_id()
+                else:
+                    response = too_many(retry)
+            key = f"a:{anon_id}"
+        if response is None:
+            response = admission.try_acquire(key, route_class)
+            if response is not None:
+                route_class = None  # rejected: nothing to release
+    if response is None:
+        try:
+            if data:
+                request.state.user = await load_active_user(data["user_id"])
+                if request.state.user is not None and request.method == "GET" and _renders_header(request.url.path):
+                    request.state.unread_notifications = await unread_count(request.state.user.id)
+            response = await call_next(request)
+        finally:
+            if route_class is not None:
+                admission.release(route_class)
+    if new_anon is not None:  # also on a 429/503, so the retry is keyed by this token
+        response.set_cookie(
+            key=settings.anon_cookie_name,
+            value=encode_anon_token(new_anon),
+            max_age=settings.session_ttl_seconds,
+            httponly=True,
+            samesite=settings.session_same_site,
+            secure=settings.session_secure,
+        )
     for h in HEADERS_TO_REMOVE:
-        response.headers.pop(h, None)
+        if h in response.headers:
+            del response.headers[h]
     for k, v in SAFE_HEADERS.items():
         response.headers[k] = v
     logger.info("%s %s %s", request.method, request.url.path, response.status_code)
     return response
 
 
+# Declared after the middleware above, so it wraps it and counts the session user load too.
+if settings.query_budgets != "off":
+    app.middleware("http")(track_queries)
+
+
+@app.exception_handler(OperationalError)
+async def database_busy(request: Request, exc: OperationalError):
+    """SQLite's write lock wait ran out (the transaction was rolled back): ask the client to retry."""
+    if not is_lock_timeout(exc):
+        raise exc
+    logger.warning("%s %s: timed out waiting for the database write lock", request.method, request.url.path)
+    return PlainTextResponse("Server busy, try again shortly.", status_code=503, headers={"Retry-After": "1"})
+
+
 # Static (relative links only for onion; no mixed content).
 from app.templating import BASE_DIR
 
@@ -96,6 +169,8 @@ app.include_router(admin_router, prefix="/admin", tags=["admin"])
 app.include_router(policy_router, prefix="", tags=["policy"])
 app.include_router(escrow_router, prefix="", tags=["escrow"])
 app.include_router(profile_router, prefix="", tags=["profile"])
+app.include_router(notifications_router, prefix="", tags=["notifications"])
+app.include_router(api_router, prefix="/api/v1", tags=["api"])
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -1,7 +1,14 @@
 from app.models.user import User, UserRole
 from app.models.product import Product, ProductCategory
 from app.models.cart import Cart, CartItem
-from app.models.order import Order, OrderItem, OrderStatus, EscrowStatus
+from app.models.order import Order, OrderItem, OrderStatus, EscrowStatus, SellerOrder
+from app.models.rollup import SellerDailySales, ProductDailySales, EscrowStatusCount, CategoryCount
+from app.models.system import CacheVersion, WorkerLease
+from app.models.job import Job, JobState
+from app.models.archive import ArchivedOrder, ArchivedOrderItem, ArchivedSellerOrder
+from app.models.notification import Notification, NotificationCount
+from app.models.review import Review
+from app.models.session import SessionRevocation
 
 __all__ = [
     "User",
@@ -14,4 +21,20 @@ __all__ = [
     "OrderItem",
     "OrderStatus",
     "EscrowStatus",
+    "SellerOrder",
+    "SellerDailySales",
+    "ProductDailySales",
+    "EscrowStatusCount",
+    "CategoryCount",
+    "CacheVersion",
+    "WorkerLease",
+    "Job",
+    "JobState",
+    "ArchivedOrder",
+    "ArchivedOrderItem",
+    "ArchivedSellerOrder",
+    "Notification",
+    "NotificationCount",
+    "Review",
+    "SessionRevocation",
 ]
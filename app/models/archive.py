@@ -0,0 +1,42 @@
+# Cold copies of orders in terminal states, moved out of the working tables by app/archive.py.
+from __future__ import annotations
+
+from sqlalchemy import ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.database import Base
+from app.models.order import OrderFields, OrderItemFields
+
+
+class ArchivedOrder(OrderFields, Base):
+    """Same columns and ids as orders; looked up by ref, or listed per buyer."""
+
+    __tablename__ = "archived_orders"
+    __table_args__ = (Index("ix_archived_orders_user_created", "user_id", "created_at"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+
+    items: Mapped[list[ArchivedOrderItem]] = relationship("ArchivedOrderItem", back_populates="order")
+
+
+class ArchivedOrderItem(OrderItemFields, Base):
+    __tablename__ = "archived_order_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    order_id: Mapped[int] = mapped_column(ForeignKey("archived_orders.id"), index=True)
+
+    order: Mapped[ArchivedOrder] = relationship("ArchivedOrder", back_populates="items")
+
+
+class ArchivedSellerOrder(Base):
+    """seller_orders rows of archived orders; kept so sellers can still open them by ref."""
+
+    __tablename__ = "archived_seller_orders"
+    __table_args__ = (Index("ix_archived_seller_orders_order_seller", "order_id", "seller_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    order_id: Mapped[int] = mapped_column(ForeignKey("archived_orders.id"))
+    created_at: Mapped[str] = mapped_column(String(50))
+    subtotal_cents: Mapped[int] = mapped_column(Integer, default=0)
+    item_count: Mapped[int] = mapped_column(Integer, default=0)
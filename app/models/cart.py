@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -26,6 +26,8 @@ class Cart(Base):
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    # One line per product: adds are upserts on (cart_id, product_id) (app/routers/cart_router.py).
+    __table_args__ = (Index("uq_cart_items_cart_product", "cart_id", "product_id", unique=True),)
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     cart_id: Mapped[int] = mapped_column(ForeignKey("carts.id"))
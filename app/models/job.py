@@ -0,0 +1,41 @@
+# Durable job queue rows (see app/jobs.py).
+from __future__ import annotations
+
+from enum import Enum as PyEnum
+
+from sqlalchemy import Float, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class JobState(str, PyEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"  # gave up after max_attempts
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_state_finished", "state", "finished_at"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(64))
+    payload: Mapped[str] = mapped_column(Text, default="{}")  # JSON
+    state: Mapped[str] = mapped_column(String(16), default=JobState.QUEUED.value)
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+    # Unix timestamps (seconds).
+    created_at: Mapped[float] = mapped_column(Float)
+    run_at: Mapped[float] = mapped_column(Float)
+    started_at: Mapped[float | None] = mapped_column(Float, nullable=True)
+    finished_at: Mapped[float | None] = mapped_column(Float, nullable=True)
+    lease_until: Mapped[float | None] = mapped_column(Float, nullable=True)
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)  # claim owner (app/jobs.py run_batch)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=5)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
+# Claim order: highest priority first, then earliest run_at, read straight off the index.
+Index("ix_jobs_claim", Job.state, Job.priority.desc(), Job.run_at)
@@ -0,0 +1,33 @@
+# Per-user notifications, written when an order's status or escrow status changes, or a submitted
+# message could not be encrypted (see app/notifications.py).
+from __future__ import annotations
+
+from sqlalchemy import ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_id", "user_id", "id"),  # inbox pages: newest first, keyset on id
+        Index("ix_notifications_read_at", "read_at"),  # pruning of old read notifications
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    order_ref: Mapped[str] = mapped_column(String(16))  # ref, not id: stays valid after archival
+    kind: Mapped[str] = mapped_column(String(16))  # status | escrow | message
+    detail: Mapped[str] = mapped_column(String(32))  # the new OrderStatus / EscrowStatus value; message: the column
+    created_at: Mapped[str] = mapped_column(String(50))
+    read_at: Mapped[str | None] = mapped_column(String(50), nullable=True)
+
+
+class NotificationCount(Base):
+    """Unread notifications per user, kept in step with notifications so the header never counts rows."""
+
+    __tablename__ = "notification_counts"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    unread: Mapped[int] = mapped_column(Integer, default=0)
@@ -5,7 +5,7 @@ import uuid
 from enum import Enum as PyEnum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -38,16 +38,16 @@ class OrderStatus(str, PyEnum):
     CANCELLED = "cancelled"
 
 
-class Order(Base):
-    __tablename__ = "orders"
+class OrderFields:
+    """Order columns, shared by orders and archived_orders (app/archive.py)."""
 
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     ref: Mapped[str] = mapped_column(String(16), unique=True, index=True, default=_order_ref)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     status: Mapped[str] = mapped_column(String(32), default=OrderStatus.PENDING.value)
     payment_method: Mapped[str | None] = mapped_column(String(32), nullable=True)
-    notes_encrypted: Mapped[str | None] = mapped_column(Text, nullable=True)
-    operator_notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Large text columns are deferred; list pages never load them.
+    notes_encrypted: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
+    operator_notes: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
     created_at: Mapped[str] = mapped_column(String(50))
     updated_at: Mapped[str] = mapped_column(String(50))
     # Escrow (US-020)
@@ -61,22 +61,63 @@ class Order(Base):
     dispute_opened_at: Mapped[str | None] = mapped_column(String(50), nullable=True)
     dispute_resolved_at: Mapped[str | None] = mapped_column(String(50), nullable=True)
     dispute_resolution: Mapped[str | None] = mapped_column(String(32), nullable=True)  # released_to_seller | released_to_buyer
-    dispute_evidence_encrypted: Mapped[str | None] = mapped_column(Text, nullable=True)
+    dispute_evidence_encrypted: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
+    # Summary written once at checkout so list pages never read order_items.
+    item_count: Mapped[int] = mapped_column(Integer, default=0)  # total quantity across lines
+    total_cents: Mapped[int] = mapped_column(Integer, default=0)
+    first_item_title: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    # Set once the reserved units went back to stock (cancel or refund), so they are never released twice.
+    stock_released: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class Order(OrderFields, Base):
+    __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_user_created", "user_id", "created_at"),
+        Index("ix_orders_seller_created", "primary_seller_id", "created_at"),
+        Index("ix_orders_created", "created_at"),
+    )
 
-    user: Mapped[User] = relationship("User", back_populates="orders", foreign_keys=[user_id])
-    primary_seller: Mapped[User | None] = relationship("User", foreign_keys=[primary_seller_id])
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    user: Mapped[User] = relationship("User", back_populates="orders", foreign_keys="Order.user_id")
+    primary_seller: Mapped[User | None] = relationship("User", foreign_keys="Order.primary_seller_id")
     items: Mapped[list[OrderItem]] = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
 
-class OrderItem(Base):
-    __tablename__ = "order_items"
+class OrderItemFields:
+    """Order item columns except order_id, shared with archived_order_items."""
 
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"))
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
     product_title: Mapped[str] = mapped_column(String(256))
     quantity: Mapped[int] = mapped_column(Integer)
     price_cents: Mapped[int] = mapped_column(Integer)
 
+
+class OrderItem(OrderItemFields, Base):
+    __tablename__ = "order_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), index=True)
+
     order: Mapped[Order] = relationship("Order", back_populates="items")
     product: Mapped[Product] = relationship("Product", back_populates="order_items")
+
+
+class SellerOrder(Base):
+    """Per-seller fan-out of an order, written at checkout (one row per seller in the cart)."""
+
+    __tablename__ = "seller_orders"
+    __table_args__ = (
+        UniqueConstraint("seller_id", "order_id", name="uq_seller_orders_seller_order"),
+        Index("ix_seller_orders_seller_created", "seller_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), index=True)
+    created_at: Mapped[str] = mapped_column(String(50))  # copy of Order.created_at for the index
+    subtotal_cents: Mapped[int] = mapped_column(Integer, default=0)
+    item_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    order: Mapped[Order] = relationship("Order")
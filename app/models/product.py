@@ -4,7 +4,7 @@ from __future__ import annotations
 import uuid
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Integer, String, Text, Boolean
+from sqlalchemy import ForeignKey, Index, Integer, String, Text, Boolean
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -28,17 +28,29 @@ class ProductCategory(str, __import__("enum").Enum):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Newest-first listing and its keyset cursor (created_at, id) without a sort.
+        Index("ix_products_listed_created", "is_listed", "created_at", "id"),
+        # Best-rated listing (/catalog?sort=rating) without a sort.
+        Index("ix_products_listed_rating", "is_listed", "rating_avg_x100", "review_count", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     slug: Mapped[str] = mapped_column(String(16), unique=True, index=True, default=_slug_id)
     title: Mapped[str] = mapped_column(String(256))
-    description: Mapped[str | None] = mapped_column(Text, nullable=True)
+    description: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)  # undefer() where shown
     price_cents: Mapped[int] = mapped_column(Integer)
     category: Mapped[str] = mapped_column(String(32), default="general")
     image_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
     seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     is_listed: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Units left; None means unlimited. Only changed by conditional UPDATEs (app/stock.py) and the seller.
+    stock: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[str] = mapped_column(String(50))
+    # Review aggregates, changed in the review's transaction (app/reviews.py) and reconciled by a job.
+    review_count: Mapped[int] = mapped_column(Integer, default=0)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0)
+    rating_avg_x100: Mapped[int] = mapped_column(Integer, default=0)  # rating_sum * 100 // review_count, for sorting
 
     seller: Mapped[User] = relationship("User", back_populates="products")
     order_items: Mapped[list[OrderItem]] = relationship("OrderItem", back_populates="product")
@@ -46,3 +58,11 @@ class Product(Base):
     @property
     def price_display(self) -> str:
         return f"{self.price_cents / 100:.2f}"
+
+    @property
+    def rating_display(self) -> str:
+        return f"{self.rating_sum / self.review_count:.1f}" if self.review_count else ""
+
+    @property
+    def sold_out(self) -> bool:
+        return self.stock is not None and self.stock <= 0
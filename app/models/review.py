@@ -0,0 +1,23 @@
+# Product reviews by buyers with a completed or released order for the product (see app/reviews.py).
+from __future__ import annotations
+
+from sqlalchemy import ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class Review(Base):
+    __tablename__ = "reviews"
+    __table_args__ = (
+        # One review per buyer and product: inserts are INSERT ... ON CONFLICT DO NOTHING.
+        Index("uq_reviews_product_user", "product_id", "user_id", unique=True),
+        Index("ix_reviews_product_id", "product_id", "id"),  # product page: newest first, keyset on id
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    rating: Mapped[int] = mapped_column(Integer)  # 1..5
+    body: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[str] = mapped_column(String(50))
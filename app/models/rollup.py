@@ -0,0 +1,48 @@
+# Sales and escrow rollups, maintained incrementally at checkout and escrow transitions (see app/rollups.py),
+# and listed-product counts per category, maintained by product writes (app/facets.py).
+from __future__ import annotations
+
+from sqlalchemy import ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class SellerDailySales(Base):
+    __tablename__ = "seller_daily_sales"
+    __table_args__ = (UniqueConstraint("seller_id", "day", name="uq_seller_daily_sales"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    day: Mapped[str] = mapped_column(String(10))  # YYYY-MM-DD (UTC)
+    order_count: Mapped[int] = mapped_column(Integer, default=0)
+    item_count: Mapped[int] = mapped_column(Integer, default=0)
+    revenue_cents: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ProductDailySales(Base):
+    __tablename__ = "product_daily_sales"
+    __table_args__ = (UniqueConstraint("seller_id", "day", "product_id", name="uq_product_daily_sales"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
+    seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # copied so a seller's range is one index scan
+    day: Mapped[str] = mapped_column(String(10))
+    units: Mapped[int] = mapped_column(Integer, default=0)
+    revenue_cents: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class EscrowStatusCount(Base):
+    __tablename__ = "escrow_status_counts"
+
+    status: Mapped[str] = mapped_column(String(32), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class CategoryCount(Base):
+    """Listed products per category, for the catalog's category facet (app/facets.py)."""
+
+    __tablename__ = "category_counts"
+
+    category: Mapped[str] = mapped_column(String(32), primary_key=True)
+    listed: Mapped[int] = mapped_column(Integer, default=0)
@@ -0,0 +1,17 @@
+# Revoked sessions (see app/sessions.py): one row per logged-out session or per "log out everywhere".
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, Float, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class SessionRevocation(Base):
+    __tablename__ = "session_revocations"
+    __table_args__ = (Index("ix_session_revocations_created_at", "created_at"),)  # sync and expiry scans
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    sid: Mapped[int | None] = mapped_column(BigInteger, nullable=True)  # None: every session issued until created_at
+    created_at: Mapped[float] = mapped_column(Float)  # unix time; the row expires with the sessions it revokes
@@ -0,0 +1,22 @@
+# Cross-worker coordination: cache invalidation versions and leader leases (multi-worker mode).
+from __future__ import annotations
+
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class WorkerLease(Base):
+    __tablename__ = "worker_leases"
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(64))  # app.leader.WORKER_ID, at most 47 characters
+    expires_at: Mapped[float] = mapped_column()  # unix time
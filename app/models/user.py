@@ -39,11 +39,13 @@ class User(Base):
     role: Mapped[UserRole] = mapped_column(Enum(UserRole), default=UserRole.BUYER)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[str] = mapped_column(String(50))  # ISO timestamp
-    pgp_public_key: Mapped[str | None] = mapped_column(Text, nullable=True)  # US-020 escrow/dispute
+    # US-020 escrow/dispute: normalised armored key and its fingerprint, set together by app/pgp.py on profile save.
+    pgp_public_key: Mapped[str | None] = mapped_column(Text, nullable=True)
+    pgp_fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
     products: Mapped[list[Product]] = relationship("Product", back_populates="seller")
     cart: Mapped["Cart | None"] = relationship("Cart", back_populates="user", uselist=False)
-    orders: Mapped[list[Order]] = relationship("Order", back_populates="user")
+    orders: Mapped[list[Order]] = relationship("Order", back_populates="user", foreign_keys="Order.user_id")
 
     def has_role(self, *roles: UserRole) -> bool:
         return self.role in roles
@@ -0,0 +1,133 @@
+# Notification inbox: fan-out on write, with a per-user unread counter.
+# When an order's status or escrow status changes, one row per party (buyer and every seller in
+# seller_orders, except whoever made the change) is written in the same transaction, and their
+# notification_counts rows are bumped. The page header then reads one counter by primary key
+# instead of buyers and sellers reloading order pages to see what changed. A note or dispute
+# evidence that could not be encrypted is reported the same way, to whoever submitted it.
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session_factory, engine, upsert
+from app.leader import on_leader
+from app.models.notification import Notification, NotificationCount
+from app.models.order import Order, SellerOrder
+
+logger = logging.getLogger("darkstore.notifications")
+
+STATUS = "status"
+ESCROW = "escrow"
+MESSAGE = "message"  # to one user: their note or evidence (detail: the order column) could not be encrypted
+
+_PRUNE_BATCH = 500
+_PRUNE_INTERVAL_SECONDS = 3600
+
+
+async def notify(db: AsyncSession, order: Order, kind: str, detail: str, *, actor_id: int | None = None) -> None:
+    """Tell the order's buyer and sellers (except actor_id) that its kind (status/escrow) is now detail.
+
+    Three statements whatever the number of sellers; call inside the transaction making the change.
+    """
+    sellers = (await db.execute(select(SellerOrder.seller_id).where(SellerOrder.order_id == order.id))).scalars()
+    recipients = sorted({order.user_id, *sellers} - {actor_id})  # fixed order: counter rows lock the same way
+    if recipients:
+        await _deliver(db, recipients, order.ref, kind, detail)
+
+
+async def notify_user(db: AsyncSession, user_id: int, order_ref: str, kind: str, detail: str) -> None:
+    """Tell one user about one of their orders; call inside a transaction."""
+    await _deliver(db, [user_id], order_ref, kind, detail)
+
+
+async def _deliver(db: AsyncSession, recipients: list[int], order_ref: str, kind: str, detail: str) -> None:
+    now = datetime.now(timezone.utc).isoformat()
+    await db.execute(insert(Notification), [
+        {"user_id": uid, "order_ref": order_ref, "kind": kind, "detail": detail, "created_at": now}
+        for uid in recipients
+    ])
+    stmt = upsert(NotificationCount).values([{"user_id": uid, "unread": 1} for uid in recipients])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id"], set_={"unread": NotificationCount.unread + stmt.excluded.unread}
+    ))
+
+
+async def unread_count(user_id: int) -> int:
+    """The user's unread count: one primary-key read on a short-lived session (page header)."""
+    async with async_session_factory() as db:
+        result = await db.execute(select(NotificationCount.unread).where(NotificationCount.user_id == user_id))
+        return max(0, result.scalar() or 0)
+
+
+async def mark_read(db: AsyncSession, user_id: int, order_ref: str | None = None) -> int:
+    """Mark the user's unread notifications (only those for order_ref, if given) read; returns how many.
+
+    The counter is decreased by what was marked rather than zeroed, so a notification written
+    concurrently stays counted.
+    """
+    where = [Notification.user_id == user_id, Notification.read_at.is_(None)]
+    if order_ref is not None:
+        where.append(Notification.order_ref == order_ref)
+    result = await db.execute(
+        update(Notification).where(*where).values(read_at=datetime.now(timezone.utc).isoformat())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        await db.execute(
+            update(NotificationCount).where(NotificationCount.user_id == user_id)
+            .values(unread=NotificationCount.unread - result.rowcount)
+        )
+    return result.rowcount
+
+
+async def inbox_page(db: AsyncSession, user_id: int, before: int | None = None) -> dict[str, Any]:
+    """One page of the user's notifications, newest first, older than id before; {items, next}."""
+    size = get_settings().notification_page_size
+    q = (
+        select(
+            Notification.id, Notification.order_ref, Notification.kind, Notification.detail,
+            Notification.created_at, Notification.read_at,
+        )
+        .where(Notification.user_id == user_id)
+        .order_by(Notification.id.desc())
+        .limit(size + 1)
+    )
+    if before is not None:
+        q = q.where(Notification.id < before)
+    rows = (await db.execute(q)).all()
+    return {"items": rows[:size], "next": rows[size - 1].id if len(rows) > size else None}
+
+
+async def prune_read() -> int:
+    """Delete read notifications past retention (unread ones are kept, so counters stay exact)."""
+    days = get_settings().notification_retention_days
+    if days <= 0:
+        return 0
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    total = 0
+    while True:
+        ids = select(Notification.id).where(Notification.read_at < cutoff).limit(_PRUNE_BATCH)
+        async with engine.begin() as conn:
+            deleted = (await conn.execute(delete(Notification).where(Notification.id.in_(ids)))).rowcount
+        total += deleted
+        if deleted < _PRUNE_BATCH:
+            return total
+        await asyncio.sleep(0.1)  # let request writes in between batches
+
+
+@on_leader
+async def _prune_periodically() -> None:
+    while True:
+        try:
+            pruned = await prune_read()
+            if pruned:
+                logger.info("pruned %s read notifications", pruned)
+        except Exception:
+            logger.exception("notification pruning failed")
+        await asyncio.sleep(_PRUNE_INTERVAL_SECONDS)
@@ -0,0 +1,274 @@
+# PGP with the gpg binary: key parsing on profile save, and encryption of order notes and dispute
+# evidence to the order's buyer, sellers and the platform key.
+# Public-key work never runs on the event loop: every operation is a gpg process, at most
+# STORE_PGP_WORKERS at once per worker. Encryption is queued in memory (plaintext is never
+# written to the database or the job queue) and the ciphertext is appended to the order when ready.
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import func, select, update
+
+from app.cache import USERS, LocalCache
+from app.config import get_settings
+from app.database import async_session_factory
+from app.models.order import Order, SellerOrder
+from app.models.user import User
+from app.notifications import MESSAGE, notify_user
+
+logger = logging.getLogger("darkstore.pgp")
+
+settings = get_settings()
+
+# Order columns that take encrypted messages (each message is appended as one armored block).
+NOTES = "notes_encrypted"
+EVIDENCE = "dispute_evidence_encrypted"
+_COLUMNS = {NOTES: Order.notes_encrypted, EVIDENCE: Order.dispute_evidence_encrypted}
+
+MESSAGE_MAX_CHARS = 20000
+_ARMOR_MAX_CHARS = 100_000  # pasted key blocks longer than this are refused before gpg sees them
+
+
+class PGPError(ValueError):
+    """A key gpg cannot use, or a failed gpg run; the message is safe to show the user."""
+
+
+@dataclass(frozen=True)
+class PublicKey:
+    """A validated public key: its primary fingerprint and minimal ASCII-armored export."""
+
+    fingerprint: str
+    armored: str
+    user_ids: tuple[str, ...] = ()
+
+
+# Per-worker gpg state: a private homedir (gpg needs one even for keyless operations) and
+# one file per recipient key, named by a hash of its armored export, for --recipient-file.
+_home: Path | None = None
+_slots: asyncio.Semaphore | None = None
+# key hash -> key file already written. A key re-uploaded with new subkeys or a later expiry keeps
+# its fingerprint but not its hash, so it gets a new file instead of encrypting to the stale one.
+_key_files = LocalCache(USERS, maxsize=settings.pgp_key_cache_size)
+_platform: PublicKey | None = None
+
+
+def _gpg_home() -> Path:
+    global _home
+    if _home is None:
+        _home = Path(tempfile.mkdtemp(prefix="darkstore-gpg-"))  # mode 0700
+        (_home / "keys").mkdir()
+    return _home
+
+
+def available() -> bool:
+    """Whether this server can run gpg at all."""
+    return shutil.which("gpg") is not None
+
+
+async def _gpg(*args: str, stdin: bytes = b"", home: Path | None = None) -> bytes:
+    """Run gpg in batch mode and return stdout; at most STORE_PGP_WORKERS run at once."""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, settings.pgp_workers))
+    if not available():
+        raise PGPError("PGP is unavailable: gpg is not installed on the server.")
+    async with _slots:
+        proc = await asyncio.create_subprocess_exec(
+            "gpg", "--batch", "--no-tty", "--quiet", "--no-greeting", "--homedir", str(home or _gpg_home()), *args,
+            stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        out, err = await proc.communicate(stdin or None)
+    if proc.returncode != 0:
+        logger.debug("gpg %s failed: %s", args[:2], err.decode(errors="replace")[:500])
+        raise PGPError("gpg could not process the key or message.")
+    return out
+
+
+def _check_listing(colons: str) -> tuple[str, tuple[str, ...]]:
+    """Fingerprint and user ids from `gpg --with-colons` output for exactly one usable encryption key."""
+    primaries = [line.split(":") for line in colons.splitlines() if line.startswith("pub:")]
+    if len(primaries) != 1:
+        raise PGPError("Paste exactly one PGP public key.")
+    pub = primaries[0]
+    if pub[1] in ("r", "e", "d", "i"):
+        raise PGPError("This key is revoked, expired or invalid.")
+    if pub[6] and pub[6].isdigit() and int(pub[6]) <= time.time():
+        raise PGPError("This key has expired.")
+    if "E" not in pub[11]:  # upper case: some valid (sub)key of this key can encrypt
+        raise PGPError("This key has no usable encryption subkey.")
+    fingerprint = next((line.split(":")[9] for line in colons.splitlines() if line.startswith("fpr:")), "")
+    user_ids = tuple(line.split(":")[9] for line in colons.splitlines() if line.startswith("uid:"))
+    return fingerprint, user_ids
+
+
+async def parse_public_key(text: str) -> PublicKey:
+    """Validate an ASCII-armored public key and normalise it (minimal export: no foreign signatures)."""
+    text = text.strip()
+    if "BEGIN PGP PUBLIC KEY BLOCK" not in text or len(text) > _ARMOR_MAX_CHARS:
+        raise PGPError("Key must be one ASCII-armored PGP public key block.")
+    with tempfile.TemporaryDirectory(prefix="darkstore-gpg-parse-") as tmp:
+        home = Path(tmp)
+        await _gpg("--import", stdin=text.encode(), home=home)
+        colons = (await _gpg("--with-colons", "--fixed-list-mode", "--list-keys", home=home)).decode(errors="replace")
+        fingerprint, user_ids = _check_listing(colons)
+        armored = await _gpg("--armor", "--export-options", "export-minimal", "--export", fingerprint, home=home)
+    return PublicKey(fingerprint=fingerprint, armored=armored.decode().strip(), user_ids=user_ids)
+
+
+def _key_file(key: PublicKey) -> Path:
+    digest = hashlib.sha256(key.armored.encode()).hexdigest()[:16]
+    path = _key_files.get(digest)
+    if path is None:
+        path = _gpg_home() / "keys" / f"{digest}.asc"
+        if not path.exists():
+            path.write_text(key.armored)
+        _key_files.set(digest, path)
+    return path
+
+
+async def encrypt(plaintext: str, recipients: list[PublicKey]) -> str:
+    """ASCII-armored message readable by every recipient."""
+    if not recipients:
+        raise PGPError("No recipient keys.")
+    args = ["--trust-model", "always", "--armor", "--encrypt"]
+    for key in recipients:
+        args += ["--recipient-file", str(_key_file(key))]
+    return (await _gpg(*args, stdin=plaintext.encode())).decode()
+
+
+async def platform_key() -> PublicKey | None:
+    """The configured platform key, parsed on first use."""
+    global _platform
+    if _platform is None:
+        text = settings.get_platform_pgp_public_key()
+        if not text:
+            return None
+        _platform = await parse_public_key(text)
+    return _platform
+
+
+# Encryption queue: handlers submit and return; workers encrypt and append to the order.
+@dataclass
+class _Message:
+    order_id: int
+    column: str
+    plaintext: str
+    user_id: int  # who submitted it; told in their inbox if it cannot be encrypted
+
+
+_queue: asyncio.Queue[_Message] | None = None
+_failed = 0  # messages this worker could not encrypt since it started (shown on /admin/jobs)
+
+
+def submit(order_id: int, column: str, plaintext: str, user_id: int) -> str | None:
+    """Queue plaintext for encryption into the order's column.
+
+    None once queued; otherwise why nothing was queued: "unavailable" (no gpg on this server)
+    or "busy" (the queue is full, try later).
+    """
+    if _queue is None:
+        raise RuntimeError("PGP workers are not running")
+    if not available():
+        return "unavailable"
+    try:
+        _queue.put_nowait(_Message(order_id, column, plaintext[:MESSAGE_MAX_CHARS], user_id))
+    except asyncio.QueueFull:
+        return "busy"
+    return None
+
+
+async def _recipients(order_id: int) -> list[PublicKey]:
+    """Platform key plus the keys of the order's buyer and sellers that have one."""
+    async with async_session_factory() as db:
+        parties = (
+            select(Order.user_id).where(Order.id == order_id)
+            .union(select(SellerOrder.seller_id).where(SellerOrder.order_id == order_id))
+        )
+        rows = (
+            await db.execute(
+                select(User.pgp_fingerprint, User.pgp_public_key)
+                .where(User.id.in_(parties), User.pgp_fingerprint.is_not(None))
+            )
+        ).all()
+    keys = [PublicKey(fingerprint=fpr, armored=armored) for fpr, armored in rows]
+    platform = await platform_key()
+    if platform is not None:
+        keys.append(platform)
+    return keys
+
+
+async def _process(msg: _Message) -> None:
+    ciphertext = await encrypt(msg.plaintext, await _recipients(msg.order_id))
+    column = _COLUMNS[msg.column]
+    async with async_session_factory() as db:
+        result = await db.execute(
+            update(Order).where(Order.id == msg.order_id).values({msg.column: func.coalesce(column, "") + ciphertext})
+        )
+        await db.commit()
+    if result.rowcount == 0:
+        logger.warning("order %s no longer live; encrypted %s dropped", msg.order_id, msg.column)
+
+
+async def _report_failure(msg: _Message) -> None:
+    """Tell the submitter in their inbox that the message was not saved, so they can send it again."""
+    async with async_session_factory() as db:
+        ref = (await db.execute(select(Order.ref).where(Order.id == msg.order_id))).scalar_one_or_none()
+        if ref is None:
+            return
+        await notify_user(db, msg.user_id, ref, MESSAGE, msg.column)
+        await db.commit()
+
+
+async def _worker(stop: asyncio.Event) -> None:
+    global _failed
+    assert _queue is not None
+    while not stop.is_set():
+        try:
+            msg = await asyncio.wait_for(_queue.get(), 1)
+        except asyncio.TimeoutError:
+            continue
+        try:
+            await _process(msg)
+        except Exception:
+            logger.exception("encrypting %s for order %s failed", msg.column, msg.order_id)
+            try:
+                await _report_failure(msg)
+            except Exception:
+                logger.exception("could not notify user %s of the lost %s", msg.user_id, msg.column)
+            _failed += 1
+        finally:
+            msg.plaintext = ""
+            _queue.task_done()
+
+
+def start_workers(stop: asyncio.Event) -> list[asyncio.Task]:
+    """Create the queue and its consumers (one per gpg slot) in this worker process."""
+    global _queue
+    _queue = asyncio.Queue(maxsize=settings.pgp_queue_size)
+    return [asyncio.create_task(_worker(stop)) for _ in range(max(1, settings.pgp_workers))]
+
+
+def queue_depth() -> int:
+    return _queue.qsize() if _queue is not None else 0
+
+
+def failed_count() -> int:
+    return _failed
+
+
+def cleanup() -> None:
+    """Remove this worker's gpg homedir (run after the workers stopped)."""
+    global _home
+    if _home is not None:
+        shutil.rmtree(_home, ignore_errors=True)
+        _home = None
+    _key_files.clear()
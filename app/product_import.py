@@ -0,0 +1,200 @@
+# Seller bulk product import (CSV or JSONL): validate row by row, upsert by slug in batches.
+# Each batch is one short transaction with one cache bump, so thousands of price, listing
+# and category changes cost a handful of commits instead of one form post per product.
+from __future__ import annotations
+
+import asyncio
+import csv
+import json
+import re
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import IO, Any
+
+from sqlalchemy import select, update
+
+from app.cache import PRODUCTS, bump
+from app.config import get_settings
+from app.database import async_session_factory, upsert
+from app.facets import listing_delta, record_listing_change
+from app.models.product import Product, ProductCategory, _slug_id
+from app.models.user import User, UserRole
+
+COLUMNS = ("slug", "title", "description", "price", "category", "listed", "stock")
+_SLUG_RE = re.compile(r"^[a-z0-9][a-z0-9-]{0,15}$")
+_TRUE = {"1", "true", "yes", "y"}
+_FALSE = {"0", "false", "no", "n"}
+# Per-row errors kept for the report; the rest are only counted.
+MAX_REPORTED_ERRORS = 200
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    batches: int = 0
+    errors: list[tuple[int, str, str]] = field(default_factory=list)  # (line, slug, message)
+    truncated: bool = False  # stopped at STORE_IMPORT_MAX_ROWS
+
+    def error(self, line: int, slug: str, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, slug, message))
+
+
+def _read_rows(fh: IO[bytes], fmt: str) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    """(line number, raw row or error message) pairs read lazily from the upload.
+
+    A file that is not UTF-8, or not valid CSV, ends with one error at the line it broke on.
+    """
+    read = 0
+
+    def lines() -> Iterator[str]:
+        nonlocal read
+        for raw in fh:  # decoded line by line, so rows before a bad byte are still imported
+            read += 1
+            yield raw.decode("utf-8-sig" if read == 1 else "utf-8")
+
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(lines())
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line in lines():
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                obj = None
+            yield read, obj if isinstance(obj, dict) else "not a JSON object"
+    except UnicodeDecodeError:
+        yield read, "file is not UTF-8"
+    except csv.Error:
+        yield read, "malformed CSV"
+
+
+def _parse_row(raw: dict[str, Any]) -> dict[str, Any] | str:
+    """Column values present in a row (blank means unchanged), or an error message."""
+    values: dict[str, Any] = {}
+    cell = {k: ("" if raw.get(k) is None else str(raw.get(k)).strip()) for k in COLUMNS}
+    if cell["slug"]:
+        if not _SLUG_RE.match(cell["slug"]):
+            return "slug must be 1-16 lowercase letters, digits or dashes"
+        values["slug"] = cell["slug"]
+    if cell["title"]:
+        values["title"] = cell["title"][:256]
+    if cell["description"]:
+        values["description"] = cell["description"]
+    if cell["price"]:
+        try:
+            price = Decimal(cell["price"])
+        except InvalidOperation:
+            return "price is not a number"
+        if not price.is_finite() or price < 0:
+            return "price must be zero or more"
+        values["price_cents"] = int((price * 100).to_integral_value(ROUND_HALF_UP))
+    if cell["category"]:
+        if cell["category"] not in {c.value for c in ProductCategory}:
+            return "unknown category"
+        values["category"] = cell["category"]
+    if cell["listed"]:
+        flag = cell["listed"].lower()
+        if flag not in _TRUE | _FALSE:
+            return "listed must be 1/0, true/false or yes/no"
+        values["is_listed"] = flag in _TRUE
+    if cell["stock"]:
+        if cell["stock"].lower() == "unlimited":
+            values["stock"] = None
+        elif not (cell["stock"].isascii() and cell["stock"].isdigit()):
+            return "stock must be a whole number or 'unlimited'"
+        else:
+            values["stock"] = int(cell["stock"])
+    return values
+
+
+async def _apply_batch(user: User, batch: dict[str, tuple[int, dict[str, Any]]], report: ImportReport) -> None:
+    """Upsert one batch (slug -> (line, values)) in a single transaction."""
+    now = datetime.now(timezone.utc).isoformat()
+    async with async_session_factory() as db:
+        existing = {
+            row.slug: row
+            for row in await db.execute(
+                select(Product.id, Product.slug, Product.seller_id, Product.category, Product.is_listed)
+                .where(Product.slug.in_(batch))
+                .with_for_update()  # PostgreSQL: concurrent edits of these rows wait, so facet deltas stay exact
+            )
+        }
+        inserts: dict[str, dict[str, Any]] = {}
+        updates: dict[frozenset, list[dict[str, Any]]] = {}
+        listed: Counter[str] = Counter()  # category facet change of the whole batch
+        for slug, (line, values) in batch.items():
+            row = existing.get(slug)
+            if row is None:
+                if "title" not in values or "price_cents" not in values:
+                    report.error(line, slug, "new product needs title and price")
+                    continue
+                inserts[slug] = {"category": "general", "is_listed": True, **values, "slug": slug, "seller_id": user.id, "created_at": now}
+            elif row.seller_id != user.id and user.role != UserRole.ADMIN:
+                report.error(line, slug, "slug is already in use")
+            elif values:
+                updates.setdefault(frozenset(values), []).append({"id": row.id, **values})
+                listed.update(listing_delta(
+                    (row.category, row.is_listed),
+                    (values.get("category", row.category), values.get("is_listed", row.is_listed)),
+                ))
+        created = set()
+        if inserts:
+            # A slug another import or form post took since the SELECT above is skipped, not an IntegrityError.
+            stmt = upsert(Product).on_conflict_do_nothing(index_elements=["slug"]).returning(Product.slug)
+            created = set((await db.execute(stmt, list(inserts.values()))).scalars())
+            for slug, row_values in inserts.items():
+                if slug in created:
+                    listed.update(listing_delta(None, (row_values["category"], row_values["is_listed"])))
+                else:
+                    report.error(batch[slug][0], slug, "slug is already in use")
+        for params in updates.values():
+            await db.execute(update(Product), params)  # bulk UPDATE by primary key
+        if created or updates:
+            await record_listing_change(db, listed)
+            await bump(db, PRODUCTS)
+        await db.commit()
+    report.created += len(created)
+    report.updated += sum(len(p) for p in updates.values())
+    report.batches += 1
+
+
+async def import_products(user: User, fh: IO[bytes], fmt: str) -> ImportReport:
+    """Validate the upload row by row and upsert it in batches of STORE_IMPORT_BATCH_ROWS."""
+    settings = get_settings()
+    report = ImportReport()
+    batch: dict[str, tuple[int, dict[str, Any]]] = {}
+    rows = 0
+    for line, raw in _read_rows(fh, fmt):
+        if rows >= settings.import_max_rows:
+            report.truncated = True
+            break
+        rows += 1
+        if isinstance(raw, str):
+            report.error(line, "", raw)
+            continue
+        values = _parse_row(raw)
+        if isinstance(values, str):
+            report.error(line, str(raw.get("slug") or ""), values)
+            continue
+        slug = values.pop("slug", None) or _slug_id()
+        if slug in batch:  # repeated slug: later columns win
+            values = {**batch[slug][1], **values}
+        batch[slug] = (line, values)
+        if len(batch) >= settings.import_batch_rows:
+            await _apply_batch(user, batch, report)
+            batch = {}
+            await asyncio.sleep(0)
+    if batch:
+        await _apply_batch(user, batch, report)
+    return report
@@ -0,0 +1,132 @@
+# Per-request SQL statement counting: declared query budgets per route and an N+1 detector.
+# Every statement on the engine is counted against the request (or count_queries() block) it
+# runs in, grouped by shape: the SQL text with placeholders and IN lists collapsed, never the
+# parameters. A shape repeated many times in one request is a lazy load or a query in a loop.
+from __future__ import annotations
+
+import logging
+import re
+from collections import Counter
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from fastapi import Request
+from sqlalchemy import event
+
+from app.config import get_settings
+from app.database import engine
+
+logger = logging.getLogger("darkstore.queries")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|\$\d+|%s)(?:\s*,\s*(?:\?|\$\d+|%s))+\s*\)")
+_NUMBERED = re.compile(r"\$\d+")
+_SPACE = re.compile(r"\s+")
+# Shapes are logged up to this length.
+SHAPE_LOG_CHARS = 240
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    shapes: Counter[str] = field(default_factory=Counter)
+    parent: QueryStats | None = None  # enclosing count_queries() block also sees these statements
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Shapes run at least threshold times, most frequent first."""
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def shape(statement: str) -> str:
+    """Statement text with parameters, IN-list lengths and whitespace normalised away."""
+    s = _NUMBERED.sub("?", statement)
+    s = _IN_LIST.sub("(?...)", s)
+    return _SPACE.sub(" ", s).strip()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count(_conn, _cursor, statement, _parameters, _context, _executemany) -> None:
+    stats = _current.get()
+    if stats is None:
+        return
+    s = shape(statement)
+    while stats is not None:
+        stats.count += 1
+        stats.shapes[s] += 1
+        stats = stats.parent
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """Count statements run in this context and in tasks started from it (tests, benchmarks)."""
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def query_budget(max_queries: int) -> Callable[[F], F]:
+    """Declare the most SQL statements one request to this route may run.
+
+    Put it under the @router decorator. Checked per request when STORE_QUERY_BUDGETS is warn or strict.
+    """
+    def mark(fn: F) -> F:
+        fn.__query_budget__ = max_queries  # type: ignore[attr-defined]
+        return fn
+    return mark
+
+
+def route_budget(request: Request) -> int | None:
+    return getattr(request.scope.get("endpoint"), "__query_budget__", None)
+
+
+def problems(stats: QueryStats, budget: int | None, repeat_threshold: int) -> list[str]:
+    """Over-budget and likely-N+1 findings for one request (shapes only, no parameters)."""
+    found = []
+    if budget is not None and stats.count > budget:
+        found.append(f"{stats.count} queries, budget {budget}")
+    for s, n in stats.repeated(repeat_threshold):
+        found.append(f"possible N+1: {n}x {s[:SHAPE_LOG_CHARS]}")
+    return found
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised in strict mode (tests, CI) when a request breaks its budget or repeats a shape."""
+
+
+async def track_queries(request: Request, call_next):
+    """HTTP middleware: count the request's statements, including those run while the body streams."""
+    settings = get_settings()
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    body = response.body_iterator
+
+    async def checked() -> AsyncIterator[bytes]:
+        # Streamed templates query while rendering, so the verdict waits for the last chunk.
+        async for chunk in body:
+            yield chunk
+        route = request.scope.get("route")
+        where = f"{request.method} {getattr(route, 'path', request.url.path)}"
+        found = problems(stats, route_budget(request), settings.query_repeat_threshold)
+        if not found:
+            return
+        for p in found:
+            logger.warning("%s: %s", where, p)
+        if settings.query_budgets == "strict":
+            raise QueryBudgetExceeded(f"{where}: {'; '.join(found)}")
+
+    response.body_iterator = checked()
+    return response
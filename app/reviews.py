@@ -0,0 +1,147 @@
+# Product reviews and their aggregates on products (review_count, rating_sum, rating_avg_x100).
+# A review and its product's aggregate change commit together, so pages read the columns and never
+# aggregate reviews; reconcile() recomputes them from the reviews table in short batches (a job).
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import PRODUCTS, bump
+from app.database import async_session_factory, engine, upsert
+from app.jobs import enqueue, handler
+from app.leader import on_leader
+from app.models.archive import ArchivedOrder, ArchivedOrderItem
+from app.models.order import EscrowStatus, Order, OrderItem, OrderStatus
+from app.models.product import Product
+from app.models.review import Review
+from app.models.user import User
+
+logger = logging.getLogger("darkstore.reviews")
+
+RATINGS = range(1, 6)
+BODY_MAX_CHARS = 2000
+PAGE_SIZE = 10  # reviews per product-page section / reviews page
+RECONCILE_BATCH = 500  # products per reconcile transaction
+RECONCILE_INTERVAL_HOURS = 24
+
+
+def _bought(order: Any, item: Any, user_id: int, product_id: int):
+    """EXISTS: an order by user_id for product_id that completed or whose escrow went to the seller."""
+    return (
+        select(item.id)
+        .join(order, order.id == item.order_id)
+        .where(
+            order.user_id == user_id,
+            item.product_id == product_id,
+            or_(order.status == OrderStatus.COMPLETED.value, order.escrow_status == EscrowStatus.RELEASED_TO_SELLER.value),
+        )
+        .exists()
+    )
+
+
+async def can_review(db: AsyncSession, user: User, product_id: int) -> bool:
+    """Whether user bought product_id in an order that completed or released escrow (live or archived)."""
+    q = select(or_(_bought(Order, OrderItem, user.id, product_id), _bought(ArchivedOrder, ArchivedOrderItem, user.id, product_id)))
+    return bool((await db.execute(q)).scalar())
+
+
+async def add_review(db: AsyncSession, user: User, product_id: int, rating: int, body: str | None) -> bool:
+    """Insert the user's review and add it to the product's aggregates; False if they already reviewed it."""
+    result = await db.execute(
+        upsert(Review)
+        .values(
+            product_id=product_id,
+            user_id=user.id,
+            rating=rating,
+            body=body or None,
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
+        .on_conflict_do_nothing(index_elements=["product_id", "user_id"])
+    )
+    if result.rowcount == 0:
+        return False
+    # Right-hand sides read the row's old values, so the average is computed from the new totals.
+    await db.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(
+            review_count=Product.review_count + 1,
+            rating_sum=Product.rating_sum + rating,
+            rating_avg_x100=(Product.rating_sum + rating) * 100 // (Product.review_count + 1),
+        )
+    )
+    await bump(db, PRODUCTS)  # cached product and catalog pages show the new rating
+    return True
+
+
+async def review_page(db: AsyncSession, product_id: int, before: int | None = None) -> dict[str, Any]:
+    """Newest-first reviews of a product older than id before, with reviewer names; {items, next}."""
+    q = (
+        select(Review.id, Review.rating, Review.body, Review.created_at, User.username)
+        .join(User, User.id == Review.user_id)
+        .where(Review.product_id == product_id)
+        .order_by(Review.id.desc())
+        .limit(PAGE_SIZE + 1)
+    )
+    if before is not None:
+        q = q.where(Review.id < before)
+    rows = (await db.execute(q)).all()
+    return {"items": rows[:PAGE_SIZE], "next": rows[PAGE_SIZE - 1].id if len(rows) > PAGE_SIZE else None}
+
+
+async def reconcile() -> int:
+    """Recompute review aggregates from the reviews table, RECONCILE_BATCH products per transaction.
+
+    Only rows that drifted are written; returns how many were corrected.
+    """
+    count = select(func.count()).where(Review.product_id == Product.id).scalar_subquery()
+    total = select(func.coalesce(func.sum(Review.rating), 0)).where(Review.product_id == Product.id).scalar_subquery()
+    avg = case((count > 0, total * 100 // count), else_=0)
+    fixed = 0
+    last_id = 0
+    while True:
+        async with engine.connect() as conn:
+            ids = list((await conn.execute(
+                select(Product.id).where(Product.id > last_id).order_by(Product.id).limit(RECONCILE_BATCH)
+            )).scalars())
+        if not ids:
+            return fixed
+        last_id = ids[-1]
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                update(Product)
+                .where(
+                    Product.id.between(ids[0], ids[-1]),
+                    or_(Product.review_count != count, Product.rating_sum != total, Product.rating_avg_x100 != avg),
+                )
+                .values(review_count=count, rating_sum=total, rating_avg_x100=avg)
+            )
+            fixed += result.rowcount
+        await asyncio.sleep(0.05)  # let request writes in between batches
+
+
+@handler("reviews.reconcile")
+async def _reconcile_job(payload: dict[str, Any]) -> None:
+    fixed = await reconcile()
+    if fixed:
+        logger.warning("reconciled review aggregates of %s products", fixed)
+        async with async_session_factory() as db:
+            await bump(db, PRODUCTS)
+            await db.commit()
+
+
+@on_leader
+async def _reconcile_periodically() -> None:
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL_HOURS * 3600)
+        try:
+            async with async_session_factory() as db:
+                enqueue(db, "reviews.reconcile", priority=-1)
+                await db.commit()
+        except Exception:
+            logger.exception("could not enqueue review reconciliation")
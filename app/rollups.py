@@ -0,0 +1,210 @@
+# Incremental sales/escrow rollups for /seller and /admin dashboards.
+# Updated inside the checkout and escrow-transition transactions; rebuild() reconciles drift:
+#   cd store && python -m app.rollups
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import async_session_factory, upsert
+from app.jobs import handler
+from app.models.order import EscrowStatus, Order, SellerOrder
+from app.models.product import Product
+from app.models.rollup import EscrowStatusCount, ProductDailySales, SellerDailySales
+
+DASHBOARD_DAYS = 30
+
+
+def _day(iso_ts: str) -> str:
+    return iso_ts[:10]
+
+
+async def _bump(db: AsyncSession, model: Any, keys: dict[str, Any], incs: dict[str, int]) -> None:
+    """Upsert one rollup row, adding incs to its counters."""
+    await _bump_rows(db, model, list(keys), [{**keys, **incs}])
+
+
+async def _bump_rows(db: AsyncSession, model: Any, key_cols: list[str], rows: list[dict[str, Any]]) -> None:
+    """Upsert many rollup rows in one statement; columns not in key_cols are added to the counters.
+
+    Rows must have distinct keys (PostgreSQL refuses to update one row twice in a statement).
+    """
+    if not rows:
+        return
+    stmt = upsert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_cols,
+        set_={k: getattr(model, k) + stmt.excluded[k] for k in rows[0] if k not in key_cols},
+    )
+    await db.execute(stmt)
+
+
+async def record_checkout(
+    db: AsyncSession,
+    order: Order,
+    items: Iterable[tuple[dict[str, Any], int]],
+    seller_orders: Iterable[SellerOrder],
+) -> None:
+    """Add a newly placed order to the rollups; items are (order_items row, seller id) pairs.
+
+    One upsert per rollup table however many lines and sellers the order has.
+    """
+    day = _day(order.created_at)
+    await _bump_rows(db, SellerDailySales, ["seller_id", "day"], [
+        {"seller_id": so.seller_id, "day": day, "order_count": 1, "item_count": so.item_count, "revenue_cents": so.subtotal_cents}
+        for so in seller_orders
+    ])
+    per_product: dict[int, dict[str, Any]] = {}
+    for oi, seller_id in items:
+        row = per_product.setdefault(
+            oi["product_id"],
+            {"seller_id": seller_id, "day": day, "product_id": oi["product_id"], "units": 0, "revenue_cents": 0},
+        )
+        row["units"] += oi["quantity"]
+        row["revenue_cents"] += oi["quantity"] * oi["price_cents"]
+    await _bump_rows(db, ProductDailySales, ["seller_id", "day", "product_id"], list(per_product.values()))
+    await record_escrow_transition(db, None, order.escrow_status)
+
+
+async def record_escrow_transition(db: AsyncSession, old: str | None, new: str) -> None:
+    """Move one order between escrow status counters (old=None for a new order)."""
+    if old == new:
+        return
+    if old is not None:
+        await _bump(db, EscrowStatusCount, {"status": old}, {"count": -1})
+    await _bump(db, EscrowStatusCount, {"status": new}, {"count": 1})
+
+
+async def transition_escrow(db: AsyncSession, order: Order, old: str, new: str, **values: Any) -> bool:
+    """Move order from escrow status old to new (plus other column values) and count it.
+
+    One conditional UPDATE, so of two concurrent requests making the same move only one applies
+    it and the counters stay exact; returns False, writing nothing, for the one that lost.
+    """
+    result = await db.execute(
+        update(Order).where(Order.id == order.id, Order.escrow_status == old).values(escrow_status=new, **values)
+    )
+    if result.rowcount == 0:
+        return False
+    await record_escrow_transition(db, old, new)
+    return True
+
+
+def _since(days: int = DASHBOARD_DAYS) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days - 1)).date().isoformat()
+
+
+async def seller_summary(db: AsyncSession, seller_id: int) -> dict[str, Any]:
+    """Daily sales and per-product revenue for the last DASHBOARD_DAYS days (index range scans only)."""
+    since = _since()
+    daily = await db.execute(
+        select(SellerDailySales.day, SellerDailySales.order_count, SellerDailySales.item_count, SellerDailySales.revenue_cents)
+        .where(SellerDailySales.seller_id == seller_id, SellerDailySales.day >= since)
+        .order_by(SellerDailySales.day.desc())
+    )
+    products = await db.execute(
+        select(
+            Product.slug,
+            Product.title,
+            func.sum(ProductDailySales.units).label("units"),
+            func.sum(ProductDailySales.revenue_cents).label("revenue_cents"),
+        )
+        .join(Product, Product.id == ProductDailySales.product_id)
+        .where(ProductDailySales.seller_id == seller_id, ProductDailySales.day >= since)
+        .group_by(ProductDailySales.product_id, Product.slug, Product.title)
+        .order_by(func.sum(ProductDailySales.revenue_cents).desc())
+    )
+    return {"days": DASHBOARD_DAYS, "daily": daily.all(), "products": products.all()}
+
+
+async def admin_summary(db: AsyncSession) -> dict[str, Any]:
+    """Escrow status counts and store-wide daily sales for the last DASHBOARD_DAYS days."""
+    escrow = await db.execute(
+        select(EscrowStatusCount.status, EscrowStatusCount.count)
+        .where(EscrowStatusCount.count != 0)
+        .order_by(EscrowStatusCount.status)
+    )
+    daily = await db.execute(
+        select(
+            SellerDailySales.day,
+            func.sum(SellerDailySales.order_count).label("order_count"),
+            func.sum(SellerDailySales.item_count).label("item_count"),
+            func.sum(SellerDailySales.revenue_cents).label("revenue_cents"),
+        )
+        .where(SellerDailySales.day >= _since())
+        .group_by(SellerDailySales.day)
+        .order_by(SellerDailySales.day.desc())
+    )
+    return {"days": DASHBOARD_DAYS, "escrow": escrow.all(), "daily": daily.all()}
+
+
+async def rebuild(db: AsyncSession) -> None:
+    """Recompute every rollup from live and archived orders, seller rows and items in one transaction."""
+    await db.execute(delete(SellerDailySales))
+    await db.execute(delete(ProductDailySales))
+    await db.execute(delete(EscrowStatusCount))
+    # Archived orders (app/archive.py) still count towards their days.
+    await db.execute(text(
+        """
+        INSERT INTO seller_daily_sales (seller_id, day, order_count, item_count, revenue_cents)
+        SELECT seller_id, substr(created_at, 1, 10), COUNT(*), SUM(item_count), SUM(subtotal_cents)
+        FROM (
+            SELECT seller_id, created_at, item_count, subtotal_cents FROM seller_orders
+            UNION ALL
+            SELECT seller_id, created_at, item_count, subtotal_cents FROM archived_seller_orders
+        ) so
+        GROUP BY seller_id, substr(created_at, 1, 10)
+        """
+    ))
+    await db.execute(text(
+        """
+        INSERT INTO product_daily_sales (product_id, seller_id, day, units, revenue_cents)
+        SELECT oi.product_id, p.seller_id, substr(o.created_at, 1, 10), SUM(oi.quantity), SUM(oi.quantity * oi.price_cents)
+        FROM (
+            SELECT order_id, product_id, quantity, price_cents FROM order_items
+            UNION ALL
+            SELECT order_id, product_id, quantity, price_cents FROM archived_order_items
+        ) oi
+        JOIN (
+            SELECT id, created_at FROM orders
+            UNION ALL
+            SELECT id, created_at FROM archived_orders
+        ) o ON o.id = oi.order_id
+        JOIN products p ON p.id = oi.product_id
+        GROUP BY oi.product_id, p.seller_id, substr(o.created_at, 1, 10)
+        """
+    ))
+    await db.execute(text(
+        """
+        INSERT INTO escrow_status_counts (status, count)
+        SELECT COALESCE(escrow_status, :none), COUNT(*)
+        FROM (SELECT escrow_status FROM orders UNION ALL SELECT escrow_status FROM archived_orders) o
+        GROUP BY COALESCE(escrow_status, :none)
+        """
+    ), {"none": EscrowStatus.NONE.value})
+
+
+@handler("rollups.rebuild")
+async def _rebuild_job(payload: dict[str, Any]) -> None:
+    async with async_session_factory() as db:
+        await rebuild(db)
+        await db.commit()
+
+
+async def _main() -> None:
+    from app.database import init_db
+
+    await init_db()
+    async with async_session_factory() as db:
+        await rebuild(db)
+        await db.commit()
+    print("rollups: rebuilt.")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
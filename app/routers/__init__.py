@@ -9,3 +9,5 @@ from app.routers.admin_router import router as admin_router
 from app.routers.policy_router import router as policy_router
 from app.routers.escrow_router import router as escrow_router
 from app.routers.profile_router import router as profile_router
+from app.routers.api_router import router as api_router
+from app.routers.notifications_router import router as notifications_router
@@ -1,38 +1,94 @@
 # Admin: order management (US-011); escrow mark funded and resolve dispute (US-020).
 from __future__ import annotations
 
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, undefer
 
+from app.admission import controller as admission
+from app.archive import find_archived
 from app.auth import RequireAdmin, RequireSupport
 from app.database import get_db
+from app.export import ExportFilter, ExportResponse, csv_chunks, jsonl_chunks, try_acquire
+from app import pgp
+from app.jobs import enqueue, queue_stats
 from app.models.order import Order, OrderStatus, EscrowStatus
 from app.models.user import User
-from app.templating import templates
+from app.notifications import ESCROW, STATUS, notify
+from app.querybudget import query_budget
+from app.routers.escrow_router import resubmit_page
+from app.rollups import admin_summary, transition_escrow
+from app.stock import release_stock
+from app.templating import StreamedRows, StreamingTemplateResponse, templates
 
 router = APIRouter()
 
+# Columns admin/orders.html renders.
+_LIST_COLUMNS = (
+    Order.ref, Order.status, Order.escrow_status, Order.created_at, Order.item_count, Order.total_cents,
+)
+
 
 @router.get("/orders", response_class=HTMLResponse)
+@query_budget(6)
 async def admin_orders(
     request: Request,
     user: User = Depends(RequireSupport),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    result = await db.execute(
-        select(Order).order_by(Order.created_at.desc()).options(selectinload(Order.items))
+    summary = await admin_summary(db)
+    orders = StreamedRows(select(*_LIST_COLUMNS).order_by(Order.created_at.desc()), scalars=False)
+    return StreamingTemplateResponse(
+        "admin/orders.html", {"request": request, "user": user, "orders": orders, "summary": summary}
     )
-    orders = result.scalars().all()
-    return templates.TemplateResponse("admin/orders.html", {"request": request, "user": user, "orders": orders})
+
+
+def _export_filter(
+    status: str | None, escrow_status: str | None, date_from: str | None, date_to: str | None, archived: bool
+) -> ExportFilter | str:
+    """Validated export filter, or an error message."""
+    if status and status not in {s.value for s in OrderStatus}:
+        return "Unknown status"
+    if escrow_status and escrow_status not in {s.value for s in EscrowStatus}:
+        return "Unknown escrow status"
+    try:
+        start = date.fromisoformat(date_from) if date_from else None
+        end = date.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        return "Dates must be YYYY-MM-DD"
+    return ExportFilter(status or None, escrow_status or None, start, end, archived)
+
+
+@router.get("/export/orders.{fmt}")
+async def admin_export_orders(
+    fmt: str,
+    status: str | None = None,
+    escrow_status: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    archived: bool = False,
+    user: User = Depends(RequireSupport),
+):
+    """Stream orders and escrow state as CSV or JSONL (no encrypted or free-text fields)."""
+    if fmt not in ("csv", "jsonl"):
+        return PlainTextResponse("Not found", status_code=404)
+    f = _export_filter(status, escrow_status, date_from, date_to, archived)
+    if isinstance(f, str):
+        return PlainTextResponse(f, status_code=400)
+    if not try_acquire():
+        return PlainTextResponse("An export is already running, try again shortly.", status_code=503, headers={"Retry-After": "30"})
+    if fmt == "csv":
+        return ExportResponse(csv_chunks(f), "text/csv; charset=utf-8", "orders.csv")
+    return ExportResponse(jsonl_chunks(f), "application/x-ndjson", "orders.jsonl")
 
 
 @router.get("/orders/{ref}", response_class=HTMLResponse)
+@query_budget(6)
 async def admin_order_detail(
     request: Request,
     ref: str,
@@ -40,12 +96,26 @@ async def admin_order_detail(
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
     result = await db.execute(
-        select(Order).where(Order.ref == ref).options(selectinload(Order.items))
+        select(Order)
+        .where(Order.ref == ref)
+        .options(selectinload(Order.items), undefer(Order.notes_encrypted), undefer(Order.dispute_evidence_encrypted))
     )
     order = result.scalar_one_or_none()
     if not order:
-        return PlainTextResponse("Not found", status_code=404)
-    total_cents = order.escrow_amount_cents or sum(i.quantity * i.price_cents for i in order.items)
+        archived = await find_archived(db, ref)
+        if not archived:
+            return PlainTextResponse("Not found", status_code=404)
+        return templates.TemplateResponse(
+            "admin/order_detail.html",
+            {
+                "request": request,
+                "user": user,
+                "order": archived,
+                "archived": True,
+                "total_cents": archived.escrow_amount_cents or archived.total_cents,
+            },
+        )
+    total_cents = order.escrow_amount_cents or order.total_cents
     escrow_status = order.escrow_status or EscrowStatus.NONE.value
     can_mark_funded = escrow_status == EscrowStatus.AWAITING_PAYMENT.value
     can_resolve = user.can_resolve_escrow_dispute() and escrow_status == EscrowStatus.DISPUTED.value
@@ -58,10 +128,32 @@ async def admin_order_detail(
             "total_cents": total_cents,
             "can_mark_funded": can_mark_funded,
             "can_resolve_dispute": can_resolve,
+            "pgp_outcome": request.query_params.get("pgp"),
         },
     )
 
 
+@router.post("/orders/{ref}/notes")
+async def admin_order_note(
+    ref: str,
+    request: Request,
+    user: User = Depends(RequireSupport),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Queue an operator note for encryption to the buyer, sellers and platform; never stored in plaintext."""
+    form = await request.form()
+    text = (form.get("note") or "").strip()
+    if not text:
+        return RedirectResponse(url=f"/admin/orders/{ref}", status_code=302)
+    order_id = (await db.execute(select(Order.id).where(Order.ref == ref))).scalar_one_or_none()
+    if order_id is None:
+        return PlainTextResponse("Not found", status_code=404)
+    refused = "too_long" if len(text) > pgp.MESSAGE_MAX_CHARS else pgp.submit(order_id, pgp.NOTES, text, user.id)
+    if refused:
+        return resubmit_page(request, user, f"/admin/orders/{ref}/notes", "note", text, f"/admin/orders/{ref}", refused)
+    return RedirectResponse(url=f"/admin/orders/{ref}?pgp=queued", status_code=302)
+
+
 @router.post("/orders/{ref}/status")
 async def admin_order_status(
     ref: str,
@@ -77,8 +169,13 @@ async def admin_order_status(
     order = result.scalar_one_or_none()
     if not order:
         return PlainTextResponse("Not found", status_code=404)
+    if status_val == order.status:
+        return RedirectResponse(url=f"/admin/orders/{ref}", status_code=302)
+    if status_val == OrderStatus.CANCELLED.value:
+        await release_stock(db, order.id)
     order.status = status_val
     order.updated_at = datetime.now(timezone.utc).isoformat()
+    await notify(db, order, STATUS, status_val, actor_id=user.id)
     return RedirectResponse(url=f"/admin/orders/{ref}", status_code=302)
 
 
@@ -97,9 +194,10 @@ async def admin_mark_funded(
     if (order.escrow_status or EscrowStatus.NONE.value) != EscrowStatus.AWAITING_PAYMENT.value:
         return RedirectResponse(url=f"/admin/orders/{ref}", status_code=302)
     now = datetime.now(timezone.utc).isoformat()
-    order.escrow_status = EscrowStatus.IN_ESCROW.value
-    order.escrow_funded_at = now
-    order.updated_at = now
+    if await transition_escrow(
+        db, order, EscrowStatus.AWAITING_PAYMENT.value, EscrowStatus.IN_ESCROW.value, escrow_funded_at=now, updated_at=now
+    ):
+        await notify(db, order, ESCROW, EscrowStatus.IN_ESCROW.value, actor_id=user.id)
     return RedirectResponse(url=f"/admin/orders/{ref}", status_code=302)
 
 
@@ -123,8 +221,65 @@ async def admin_resolve_dispute(
     if (order.escrow_status or EscrowStatus.NONE.value) != EscrowStatus.DISPUTED.value:
         return RedirectResponse(url=f"/admin/orders/{ref}", status_code=302)
     now = datetime.now(timezone.utc).isoformat()
-    order.escrow_status = resolution
-    order.dispute_resolution = resolution
-    order.dispute_resolved_at = now
-    order.updated_at = now
+    resolved = await transition_escrow(
+        db, order, EscrowStatus.DISPUTED.value, resolution,
+        dispute_resolution=resolution, dispute_resolved_at=now, updated_at=now,
+    )
+    if resolved:
+        await notify(db, order, ESCROW, resolution, actor_id=user.id)
+    if resolved and resolution == EscrowStatus.RELEASED_TO_BUYER.value:
+        await release_stock(db, order.id)  # refunded: the goods go back on sale
     return RedirectResponse(url=f"/admin/orders/{ref}", status_code=302)
+
+
+@router.get("/admission", response_class=HTMLResponse)
+async def admin_admission(
+    request: Request,
+    user: User = Depends(RequireAdmin),
+):
+    """Admission-control buckets and per-route-class admit/throttle/shed counters (this worker)."""
+    return templates.TemplateResponse(
+        "admin/admission.html",
+        {"request": request, "user": user, "stats": admission.stats()},
+    )
+
+
+@router.get("/jobs", response_class=HTMLResponse)
+async def admin_jobs(
+    request: Request,
+    user: User = Depends(RequireAdmin),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Job queue depth by state and kind, oldest ready job, recent latency and dead jobs."""
+    return templates.TemplateResponse(
+        "admin/jobs.html",
+        {"request": request, "user": user, "stats": await queue_stats(db),
+         "pgp_queued": pgp.queue_depth(), "pgp_failed": pgp.failed_count()},
+    )
+
+
+@router.post("/jobs/rebuild-rollups")
+async def admin_jobs_rebuild_rollups(
+    user: User = Depends(RequireAdmin),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    enqueue(db, "rollups.rebuild", priority=-1)
+    return RedirectResponse(url="/admin/jobs", status_code=302)
+
+
+@router.post("/jobs/reconcile-reviews")
+async def admin_jobs_reconcile_reviews(
+    user: User = Depends(RequireAdmin),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    enqueue(db, "reviews.reconcile", priority=-1)
+    return RedirectResponse(url="/admin/jobs", status_code=302)
+
+
+@router.post("/jobs/reconcile-facets")
+async def admin_jobs_reconcile_facets(
+    user: User = Depends(RequireAdmin),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    enqueue(db, "facets.reconcile", priority=-1)
+    return RedirectResponse(url="/admin/jobs", status_code=302)
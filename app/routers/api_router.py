@@ -0,0 +1,313 @@
+# Versioned JSON API (/api/v1): catalog, cart and order status for light clients and cache warmers.
+# Same session cookie and role checks as the HTML routes; no redirects, no templates. Responses
+# carry only the requested fields (?fields=a,b), lists page by opaque keyset cursors (?cursor=),
+# and bodies are compact JSON (orjson when installed). Writes take JSON bodies only, which a
+# cross-site form cannot send.
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.archive import find_archived
+from app.auth import require_user
+from app.config import get_settings
+from app.database import get_db
+from app.models.cart import Cart, CartItem
+from app.models.order import Order
+from app.models.product import Product
+from app.models.user import User
+from app.notifications import unread_count
+from app.querybudget import query_budget
+from app.routers.cart_router import add_cart_lines, get_or_create_cart
+from app.routers.orders_router import order_for_user_ref
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder writes the same bytes for these payloads, only slower
+    orjson = None
+
+router = APIRouter()
+settings = get_settings()
+
+
+class APIResponse(JSONResponse):
+    """Compact JSON: no whitespace, UTF-8 as is."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _error(status_code: int, message: str) -> APIResponse:
+    """Same shape as FastAPI's own 401/403/422 bodies."""
+    return APIResponse({"detail": message}, status_code=status_code)
+
+
+# Selectable fields per resource (name -> column) and the defaults when ?fields= is absent.
+_PRODUCT_FIELDS: dict[str, InstrumentedAttribute] = {
+    "slug": Product.slug,
+    "title": Product.title,
+    "description": Product.description,
+    "price_cents": Product.price_cents,
+    "category": Product.category,
+    "stock": Product.stock,
+    "created_at": Product.created_at,
+    "review_count": Product.review_count,
+    "rating_sum": Product.rating_sum,
+}
+_PRODUCT_LIST_DEFAULT = ("slug", "title", "price_cents", "category")
+_PRODUCT_DETAIL_DEFAULT = ("slug", "title", "description", "price_cents", "category", "stock")
+_ORDER_FIELDS: dict[str, InstrumentedAttribute] = {
+    "ref": Order.ref,
+    "status": Order.status,
+    "escrow_status": Order.escrow_status,
+    "payment_method": Order.payment_method,
+    "created_at": Order.created_at,
+    "updated_at": Order.updated_at,
+    "auto_finalize_at": Order.auto_finalize_at,
+    "item_count": Order.item_count,
+    "total_cents": Order.total_cents,
+    "first_item_title": Order.first_item_title,
+}
+_ORDER_DETAIL_EXTRA = ("archived", "items")
+_ORDER_LIST_DEFAULT = ("ref", "status", "escrow_status", "created_at", "item_count", "total_cents", "first_item_title")
+
+
+def _fields(requested: str | None, allowed: dict[str, Any], default: tuple[str, ...]) -> list[str]:
+    """Field names from ?fields=a,b (unknown names are a 400), else the defaults."""
+    if not requested:
+        return list(default)
+    names = list(dict.fromkeys(f.strip() for f in requested.split(",") if f.strip()))
+    unknown = [n for n in names if n not in allowed]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {', '.join(unknown)}; allowed: {', '.join(allowed)}")
+    return names
+
+
+def _encode_cursor(created_at: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{row_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().rsplit("|", 1)
+        return created_at, int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="bad cursor") from None
+
+
+def _after(cursor: str | None, created: InstrumentedAttribute, row_id: InstrumentedAttribute):
+    """Keyset predicate for newest-first pages: rows strictly older than the cursor row."""
+    if not cursor:
+        return None
+    created_at, last_id = _decode_cursor(cursor)
+    return or_(created < created_at, and_(created == created_at, row_id < last_id))
+
+
+def _limit(limit: int) -> int:
+    return max(1, min(limit, settings.catalog_max_page_size))
+
+
+async def _page(db: AsyncSession, q, names: list[str], limit: int) -> dict[str, Any]:
+    """One newest-first page of q (whose last two columns are created_at and id) as {items, next}."""
+    rows = (await db.execute(q.limit(limit + 1))).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [dict(zip(names, row[: len(names)])) for row in rows]
+    return {"items": items, "next": _encode_cursor(rows[-1][-2], rows[-1][-1]) if more else None}
+
+
+@router.get("/products")
+@query_budget(3)
+async def api_products(
+    category: str | None = None,
+    q: str | None = None,
+    fields: str | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Listed products, newest first; q matches a substring of the title."""
+    names = _fields(fields, _PRODUCT_FIELDS, _PRODUCT_LIST_DEFAULT)
+    stmt = (
+        select(*(_PRODUCT_FIELDS[n] for n in names), Product.created_at, Product.id)
+        .where(Product.is_listed)
+        .order_by(Product.created_at.desc(), Product.id.desc())
+    )
+    if category:
+        stmt = stmt.where(Product.category == category)
+    if q and q.strip():
+        pattern = q.strip()[:100].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        stmt = stmt.where(Product.title.ilike(f"%{pattern}%", escape="\\"))
+    after = _after(cursor, Product.created_at, Product.id)
+    if after is not None:
+        stmt = stmt.where(after)
+    return APIResponse(await _page(db, stmt, names, _limit(limit)))
+
+
+@router.get("/products/{slug}")
+@query_budget(3)
+async def api_product(
+    slug: str,
+    fields: str | None = None,
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    names = _fields(fields, _PRODUCT_FIELDS, _PRODUCT_DETAIL_DEFAULT)
+    row = (
+        await db.execute(select(*(_PRODUCT_FIELDS[n] for n in names)).where(Product.slug == slug, Product.is_listed))
+    ).first()
+    if row is None:
+        return _error(404, "not found")
+    return APIResponse(dict(zip(names, row)))
+
+
+async def _cart_body(db: AsyncSession, user: User) -> dict[str, Any]:
+    rows = (
+        await db.execute(
+            select(Product.slug, Product.title, Product.price_cents, Product.stock, CartItem.quantity)
+            .join(CartItem, CartItem.product_id == Product.id)
+            .join(Cart, Cart.id == CartItem.cart_id)
+            .where(Cart.user_id == user.id)
+            .order_by(CartItem.id)
+        )
+    ).all()
+    items = [
+        {"slug": r.slug, "title": r.title, "price_cents": r.price_cents, "stock": r.stock, "quantity": r.quantity}
+        for r in rows
+    ]
+    return {"items": items, "total_cents": sum(r.price_cents * r.quantity for r in rows)}
+
+
+async def _listed_product_id(db: AsyncSession, slug: str) -> int | None:
+    return (await db.execute(select(Product.id).where(Product.slug == slug, Product.is_listed))).scalar_one_or_none()
+
+
+@router.get("/cart")
+@query_budget(2)
+async def api_cart(
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    return APIResponse(await _cart_body(db, user))
+
+
+@router.post("/cart/items")
+@query_budget(7)
+async def api_cart_add(
+    slug: Annotated[str, Body(max_length=16)],
+    quantity: Annotated[int, Body(ge=1)] = 1,
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Add quantity of a product (capped per line like the HTML cart); returns the cart."""
+    product_id = await _listed_product_id(db, slug)
+    if product_id is None:
+        return _error(404, "not found")
+    cart = await get_or_create_cart(db, user)
+    await add_cart_lines(db, cart, {product_id: quantity})
+    return APIResponse(await _cart_body(db, user))
+
+
+def _cart_line(user: User, slug: str):
+    """WHERE clause for the user's cart line of a product, without loading either."""
+    return and_(
+        CartItem.cart_id == select(Cart.id).where(Cart.user_id == user.id).scalar_subquery(),
+        CartItem.product_id == select(Product.id).where(Product.slug == slug).scalar_subquery(),
+    )
+
+
+@router.put("/cart/items/{slug}")
+@query_budget(4)
+async def api_cart_set(
+    slug: str,
+    quantity: Annotated[int, Body(ge=0, embed=True)],
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Set a line's quantity (0 removes it); returns the cart, or 404 if the line is not in it."""
+    where = _cart_line(user, slug)
+    if quantity == 0:
+        result = await db.execute(delete(CartItem).where(where))
+    else:
+        result = await db.execute(
+            update(CartItem).where(where).values(quantity=min(quantity, settings.cart_max_quantity))
+            .execution_options(synchronize_session=False)
+        )
+    if result.rowcount == 0:
+        return _error(404, "not in cart")
+    return APIResponse(await _cart_body(db, user))
+
+
+@router.delete("/cart/items/{slug}")
+@query_budget(4)
+async def api_cart_remove(
+    slug: str,
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    await db.execute(delete(CartItem).where(_cart_line(user, slug)))
+    return Response(status_code=204)
+
+
+@router.get("/orders")
+@query_budget(3)
+async def api_orders(
+    fields: str | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """The user's orders as buyer, newest first (archived orders are only found by ref)."""
+    names = _fields(fields, _ORDER_FIELDS, _ORDER_LIST_DEFAULT)
+    stmt = (
+        select(*(_ORDER_FIELDS[n] for n in names), Order.created_at, Order.id)
+        .where(Order.user_id == user.id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+    )
+    after = _after(cursor, Order.created_at, Order.id)
+    if after is not None:
+        stmt = stmt.where(after)
+    return APIResponse(await _page(db, stmt, names, _limit(limit)))
+
+
+@router.get("/orders/{ref}")
+@query_budget(6)
+async def api_order(
+    ref: str,
+    fields: str | None = None,
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Status and lines of an order the user bought or sells in, live or archived."""
+    allowed = {**_ORDER_FIELDS, **dict.fromkeys(_ORDER_DETAIL_EXTRA)}
+    names = _fields(fields, allowed, tuple(allowed))
+    order = await order_for_user_ref(db, ref, user)
+    archived = order is None
+    if archived:
+        order = await find_archived(db, ref, user)
+        if order is None:
+            return _error(404, "not found")
+    body = {name: getattr(order, name) for name in _ORDER_FIELDS}
+    body["total_cents"] = order.escrow_amount_cents or order.total_cents
+    body["archived"] = archived
+    body["items"] = [
+        {"title": i.product_title, "quantity": i.quantity, "price_cents": i.price_cents} for i in order.items
+    ]
+    return APIResponse({name: body[name] for name in names})
+
+
+@router.get("/notifications/unread")
+@query_budget(2)
+async def api_unread(user: User = Depends(require_user)):
+    """Unread notification count: the cheap poll for whether any order changed."""
+    return APIResponse({"unread": await unread_count(user.id)})
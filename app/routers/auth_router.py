@@ -6,11 +6,13 @@ from typing import Annotated
 
 import pyotp
 from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import (
+    csrf_ok,
+    decode_session,
     encode_session,
     get_current_user,
     hash_passphrase,
@@ -21,6 +23,8 @@ from app.auth import (
 from app.config import get_settings
 from app.database import get_db
 from app.models.user import User, UserRole
+from app.routers.cart_router import clear_cookie_cart, merge_cookie_cart
+from app.sessions import revoke
 from app.templating import templates
 
 settings = get_settings()
@@ -50,7 +54,8 @@ async def login(
         )
     # TODO: if user.totp_enabled, require TOTP code here
     token = encode_session(user.id, user.role.value)
-    r = RedirectResponse(url="/", status_code=302)
+    await merge_cookie_cart(db, user, request)
+    r = clear_cookie_cart(request, RedirectResponse(url="/", status_code=302))
     r.set_cookie(
         key=settings.session_cookie_name,
         value=token,
@@ -91,6 +96,11 @@ async def register(
             "auth/register.html",
             {"request": request, "user": None, "errors": err, "min_length": settings.passphrase_min_length},
         )
+    if not username or len(username) > 64:  # users.username is VARCHAR(64); PostgreSQL enforces it
+        return templates.TemplateResponse(
+            "auth/register.html",
+            {"request": request, "user": None, "error": "Username must be 1-64 characters.", "min_length": settings.passphrase_min_length},
+        )
     existing = await db.execute(select(User).where(User.username == username))
     if existing.scalar_one_or_none():
         return templates.TemplateResponse(
@@ -108,7 +118,8 @@ async def register(
     await db.flush()
     await db.refresh(user)
     token = encode_session(user.id, user.role.value)
-    r = RedirectResponse(url="/", status_code=302)
+    await merge_cookie_cart(db, user, request)
+    r = clear_cookie_cart(request, RedirectResponse(url="/", status_code=302))
     r.set_cookie(
         key=settings.session_cookie_name,
         value=token,
@@ -120,8 +131,33 @@ async def register(
     return r
 
 
-@router.get("/logout")
-async def logout(request: Request):
+def _bad_form_token() -> PlainTextResponse:
+    return PlainTextResponse("This form has expired; reload the page and try again.", status_code=403)
+
+
+@router.post("/logout")
+async def logout(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
+    # Revoked, not just forgotten: a copy of the cookie stops working too.
+    data = decode_session(request.cookies.get(settings.session_cookie_name, ""))
+    if data:
+        if not await csrf_ok(request):
+            return _bad_form_token()
+        await revoke(db, data["user_id"], data["sid"])
     r = RedirectResponse(url="/", status_code=302)
     r.delete_cookie(settings.session_cookie_name)
     return r
+
+
+@router.post("/logout/everywhere")
+async def logout_everywhere(
+    request: Request,
+    user: Annotated[User, Depends(require_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+):
+    """Revoke every session of this account, this one included (e.g. after a lost device)."""
+    if not await csrf_ok(request):
+        return _bad_form_token()
+    await revoke(db, user.id)
+    r = RedirectResponse(url="/login", status_code=302)
+    r.delete_cookie(settings.session_cookie_name)
+    return r
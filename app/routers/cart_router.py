@@ -1,73 +1,165 @@
 # Cart: add, remove, update, view (US-009).
+# Visitors without a session keep their cart in a signed cookie (no DB writes while browsing);
+# it is merged into the DB cart in one batch at login or checkout.
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy import select
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from sqlalchemy import case, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload
 
-from app.auth import get_current_user, require_user
-from app.database import get_db
+from app.auth import decode_cart, encode_cart, get_current_user
+from app.config import get_settings
+from app.database import get_db, upsert
 from app.models.cart import Cart, CartItem
 from app.models.product import Product
 from app.models.user import User
+from app.querybudget import query_budget
 from app.templating import templates
 
 router = APIRouter()
+settings = get_settings()
+
+
+@dataclass
+class CookieCartLine:
+    """Anonymous cart line shaped like CartItem for cart/view.html (id is the product id)."""
+
+    id: int
+    product: Product
+    quantity: int
+
+
+def cookie_cart(request: Request) -> dict[int, int]:
+    token = request.cookies.get(settings.cart_cookie_name)
+    return decode_cart(token) if token else {}
+
+
+def _save_cookie_cart(response: Response, lines: dict[int, int]) -> Response:
+    if not lines:
+        response.delete_cookie(settings.cart_cookie_name)
+        return response
+    response.set_cookie(
+        key=settings.cart_cookie_name,
+        value=encode_cart(lines),
+        max_age=settings.session_ttl_seconds,
+        httponly=True,
+        samesite=settings.session_same_site,
+        secure=settings.session_secure,
+    )
+    return response
+
+
+def clear_cookie_cart(request: Request, response: Response) -> Response:
+    """Drop the cookie cart once it has been merged."""
+    if settings.cart_cookie_name in request.cookies:
+        response.delete_cookie(settings.cart_cookie_name)
+    return response
+
+
+async def merge_cookie_cart(db: AsyncSession, user: User, request: Request) -> int:
+    """Move the cookie cart into the user's DB cart in one upsert; the caller clears the cookie.
+
+    Only products still listed are kept; prices are never taken from the cookie, so the
+    current price applies. Returns the number of lines merged.
+    """
+    lines = cookie_cart(request)
+    if not lines:
+        return 0
+    listed = set(
+        (await db.execute(select(Product.id).where(Product.id.in_(lines), Product.is_listed))).scalars()
+    )
+    lines = {pid: qty for pid, qty in lines.items() if pid in listed}
+    merged = len(lines)
+    if not merged:
+        return 0
+    cart = await get_or_create_cart(db, user)
+    await add_cart_lines(db, cart, lines)
+    return merged
+
+
+async def add_cart_lines(db: AsyncSession, cart: Cart, lines: dict[int, int]) -> None:
+    """Add quantities to the cart's lines (product_id -> quantity) in one upsert, capped per line.
+
+    The increment happens in the database, so concurrent adds of the same product neither lose
+    an update nor create a second line (unique cart_id, product_id).
+    """
+    cap = settings.cart_max_quantity
+    stmt = upsert(CartItem).values(
+        [{"cart_id": cart.id, "product_id": pid, "quantity": min(qty, cap)} for pid, qty in lines.items()]
+    )
+    total = CartItem.quantity + stmt.excluded.quantity
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["cart_id", "product_id"],
+            set_={"quantity": case((total > cap, cap), else_=total)},
+        )
+    )
+    cart.updated_at = datetime.now(timezone.utc).isoformat()
 
 
 async def get_or_create_cart(db: AsyncSession, user: User) -> Cart:
     result = await db.execute(select(Cart).where(Cart.user_id == user.id))
     cart = result.scalar_one_or_none()
     if not cart:
+        # Two first adds at once (double click, two tabs) both get here; the loser's insert is a no-op.
         now = datetime.now(timezone.utc).isoformat()
-        cart = Cart(user_id=user.id, updated_at=now)
-        db.add(cart)
-        await db.flush()
+        await db.execute(upsert(Cart).values(user_id=user.id, updated_at=now).on_conflict_do_nothing(index_elements=["user_id"]))
+        cart = (await db.execute(select(Cart).where(Cart.user_id == user.id))).scalar_one()
     return cart
 
 
 @router.get("/cart", response_class=HTMLResponse)
+@query_budget(3)
 async def cart_view(
     request: Request,
-    user: User = Depends(require_user),
+    user: User | None = Depends(get_current_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    cart = await get_or_create_cart(db, user)
-    result = await db.execute(select(Cart).where(Cart.id == cart.id).options(selectinload(Cart.items).selectinload(CartItem.product)))
-    cart = result.scalar_one()
-    total_cents = sum(i.quantity * i.product.price_cents for i in cart.items)
+    if user is None:
+        lines = cookie_cart(request)
+        products = {}
+        if lines:
+            result = await db.execute(select(Product).where(Product.id.in_(lines), Product.is_listed))
+            products = {p.id: p for p in result.scalars()}
+        items = [CookieCartLine(pid, products[pid], qty) for pid, qty in lines.items() if pid in products]
+    else:
+        # One joined SELECT for the lines and their products; the cart row itself is not needed.
+        result = await db.execute(
+            select(CartItem).join(Cart).where(Cart.user_id == user.id).options(joinedload(CartItem.product)).order_by(CartItem.id)
+        )
+        items = list(result.scalars())
+    total_cents = sum(i.quantity * i.product.price_cents for i in items)
     return templates.TemplateResponse(
         "cart/view.html",
-        {"request": request, "user": user, "cart": cart, "total_cents": total_cents},
+        {"request": request, "user": user, "items": items, "total_cents": total_cents},
     )
 
 
 @router.post("/cart/add")
+@query_budget(7)
 async def cart_add(
     request: Request,
     product_id: int = Form(...),
     quantity: int = Form(1),
-    user: User = Depends(require_user),
+    user: User | None = Depends(get_current_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    cart = await get_or_create_cart(db, user)
-    result = await db.execute(select(Product).where(Product.id == product_id, Product.is_listed))
-    product = result.scalar_one_or_none()
-    if not product:
+    result = await db.execute(select(Product.id).where(Product.id == product_id, Product.is_listed))
+    if result.scalar_one_or_none() is None:
         return RedirectResponse(url="/catalog", status_code=302)
-    existing = await db.execute(select(CartItem).where(CartItem.cart_id == cart.id, CartItem.product_id == product_id))
-    item = existing.scalar_one_or_none()
-    if item:
-        item.quantity += max(1, quantity)
-    else:
-        cart.items.append(CartItem(product_id=product_id, quantity=max(1, quantity)))
-    cart.updated_at = datetime.now(timezone.utc).isoformat()
-    await db.flush()
+    if user is None:
+        lines = cookie_cart(request)
+        if product_id in lines or len(lines) < settings.cart_max_lines:
+            lines[product_id] = min(lines.get(product_id, 0) + max(1, quantity), settings.cart_max_quantity)
+        return _save_cookie_cart(RedirectResponse(url="/cart", status_code=302), lines)
+    cart = await get_or_create_cart(db, user)
+    await add_cart_lines(db, cart, {product_id: max(1, quantity)})
     return RedirectResponse(url="/cart", status_code=302)
 
 
@@ -75,9 +167,13 @@ async def cart_add(
 async def cart_remove(
     request: Request,
     item_id: int = Form(...),
-    user: User = Depends(require_user),
+    user: User | None = Depends(get_current_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
+    if user is None:
+        lines = cookie_cart(request)
+        lines.pop(item_id, None)
+        return _save_cookie_cart(RedirectResponse(url="/cart", status_code=302), lines)
     result = await db.execute(select(CartItem).join(Cart).where(Cart.user_id == user.id, CartItem.id == item_id))
     item = result.scalar_one_or_none()
     if item:
@@ -90,13 +186,20 @@ async def cart_update(
     request: Request,
     item_id: int = Form(...),
     quantity: int = Form(...),
-    user: User = Depends(require_user),
+    user: User | None = Depends(get_current_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
+    if user is None:
+        lines = cookie_cart(request)
+        if item_id in lines:
+            lines[item_id] = min(max(0, quantity), settings.cart_max_quantity)
+            if lines[item_id] == 0:
+                del lines[item_id]
+        return _save_cookie_cart(RedirectResponse(url="/cart", status_code=302), lines)
     result = await db.execute(select(CartItem).join(Cart).where(Cart.user_id == user.id, CartItem.id == item_id))
     item = result.scalar_one_or_none()
     if item:
-        item.quantity = max(0, quantity)
+        item.quantity = min(max(0, quantity), settings.cart_max_quantity)
         if item.quantity == 0:
             await db.delete(item)
     return RedirectResponse(url="/cart", status_code=302)
@@ -1,50 +1,202 @@
 # Catalog and product listing (US-008); relative links, no PII in URLs.
 from __future__ import annotations
 
-from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
+import asyncio
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Form, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import undefer
 
-from app.database import get_db
+from app.auth import require_user
+from app.cache import PRODUCTS, LocalCache
+from app.config import get_settings
+from app.database import async_session_factory, get_db
+from app.facets import category_counts
 from app.models.product import Product
+from app.models.user import User
+from app.querybudget import query_budget
+from app.reviews import BODY_MAX_CHARS, RATINGS, add_review, can_review, review_page
+from app.singleflight import SingleFlight
 from app.templating import templates
-from fastapi import Depends
-from typing import Annotated
 
 router = APIRouter()
 
+# Columns catalog/list.html renders; rows come back as immutable tuples, not entities.
+_LIST_COLUMNS = (Product.slug, Product.title, Product.price_cents, Product.category, Product.review_count, Product.rating_sum)
+# ?sort= orders; each is served by an index on products (newest, or best rated with most reviews first).
+_SORTS = {
+    "new": (Product.created_at.desc(),),
+    "rating": (Product.rating_avg_x100.desc(), Product.review_count.desc(), Product.id.desc()),
+}
+
+# Identical concurrent lookups (a shared link, a burst on one category) run one query;
+# anonymous visitors also share one render, since their page does not depend on the user.
+flights = SingleFlight(timeout=get_settings().singleflight_timeout_seconds)
+
+# Rendered anonymous pages; dropped in every worker when any product changes.
+_PAGE_CACHE_TTL = get_settings().page_cache_ttl_seconds
+page_cache = LocalCache(PRODUCTS, maxsize=512, ttl=_PAGE_CACHE_TTL)
+
+
+async def _fetch_listing(category: str | None, page: int, size: int, sort: str) -> list:
+    q = select(*_LIST_COLUMNS).where(Product.is_listed).order_by(*_SORTS[sort])
+    if category:
+        q = q.where(Product.category == category)
+    q = q.offset((page - 1) * size).limit(size)
+    async with async_session_factory() as db:
+        result = await db.execute(q)
+        return result.all()
+
+
+async def _fetch_product(slug: str) -> tuple[Product, dict] | None:
+    """Listed product and its newest reviews page."""
+    async with async_session_factory() as db:
+        result = await db.execute(
+            select(Product).where(Product.slug == slug, Product.is_listed).options(undefer(Product.description))
+        )
+        product = result.scalar_one_or_none()
+        if product is None:
+            return None
+        return product, await review_page(db, product.id)
+
+
+def _busy() -> PlainTextResponse:
+    return PlainTextResponse("Busy, try again", status_code=503)
+
+
+async def _anon_page(key: tuple, render) -> str | None:
+    """Anonymous page HTML: page cache (if enabled), else one shared render per key."""
+    html = page_cache.get(key) if _PAGE_CACHE_TTL else None
+    if html is None:
+        html = await flights.do(key, render)
+        if _PAGE_CACHE_TTL and html is not None:
+            page_cache.set(key, html)
+    return html
+
 
 @router.get("/catalog", response_class=HTMLResponse)
+@query_budget(4)
 async def catalog_list(
     request: Request,
-    db: Annotated[AsyncSession, Depends(get_db)],
     category: str | None = None,
     page: int = 1,
     size: int = 20,
+    sort: str = "new",
 ):
-    q = select(Product).where(Product.is_listed).order_by(Product.created_at.desc())
-    if category:
-        q = q.where(Product.category == category)
-    q = q.offset((page - 1) * size).limit(size)
-    result = await db.execute(q)
-    products = result.scalars().all()
-    return templates.TemplateResponse(
-        "catalog/list.html",
-        {"request": request, "user": getattr(request.state, "user", None), "products": products, "category": category, "page": page},
-    )
+    page = max(1, page)
+    size = max(1, min(size, get_settings().catalog_max_page_size))
+    sort = sort if sort in _SORTS else "new"
+    user = getattr(request.state, "user", None)
+    key = ("catalog", category, page, size, sort)
+
+    async def load() -> list:
+        return await flights.do(key, lambda: _fetch_listing(category, page, size, sort))
+
+    async def context(user: User | None) -> dict:
+        return {
+            "request": request,
+            "user": user,
+            "products": await load(),
+            "categories": await category_counts(),
+            "category": category,
+            "page": page,
+            "sort": sort,
+        }
+
+    async def render() -> str:
+        return templates.get_template("catalog/list.html").render(await context(None))
+
+    try:
+        if user is None:
+            return HTMLResponse(await _anon_page(("html",) + key, render))
+        ctx = await context(user)
+    except asyncio.TimeoutError:
+        return _busy()
+    return templates.TemplateResponse("catalog/list.html", ctx)
 
 
 @router.get("/p/{slug}", response_class=HTMLResponse)
+@query_budget(4)
 async def product_detail(
     request: Request,
     slug: str,
-    db: Annotated[AsyncSession, Depends(get_db)],
+    review: str | None = None,
+):
+    """review= is the outcome of a review the user just posted (only shown to logged-in users)."""
+    user = getattr(request.state, "user", None)
+    key = ("product", slug)
+
+    async def render() -> str | None:
+        found = await flights.do(key, lambda: _fetch_product(slug))
+        if not found:
+            return None
+        product, reviews = found
+        return templates.get_template("catalog/detail.html").render(
+            {"request": request, "user": None, "product": product, "reviews": reviews}
+        )
+
+    try:
+        if user is None:
+            html = await _anon_page(("html",) + key, render)
+            if html is None:
+                return PlainTextResponse("Not found", status_code=404)
+            return HTMLResponse(html)
+        found = await flights.do(key, lambda: _fetch_product(slug))
+    except asyncio.TimeoutError:
+        return _busy()
+    if not found:
+        return PlainTextResponse("Not found", status_code=404)
+    product, reviews = found
+    return templates.TemplateResponse(
+        "catalog/detail.html",
+        {"request": request, "user": user, "product": product, "reviews": reviews, "review_outcome": review, "ratings": RATINGS},
+    )
+
+
+async def _listed(db: AsyncSession, slug: str) -> Product | None:
+    return (await db.execute(select(Product).where(Product.slug == slug, Product.is_listed))).scalar_one_or_none()
+
+
+@router.get("/p/{slug}/reviews", response_class=HTMLResponse)
+@query_budget(4)
+async def product_reviews(
+    request: Request,
+    slug: str,
+    before: int | None = None,
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Older reviews, newest first; ?before=<id> pages on."""
+    product = await _listed(db, slug)
+    if not product:
+        return PlainTextResponse("Not found", status_code=404)
+    return templates.TemplateResponse(
+        "catalog/reviews.html",
+        {"request": request, "user": request.state.user, "product": product, "reviews": await review_page(db, product.id, before)},
+    )
+
+
+@router.post("/p/{slug}/reviews")
+@query_budget(7)
+async def product_review_add(
+    slug: str,
+    rating: Annotated[int, Form()],
+    body: Annotated[str, Form()] = "",
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    result = await db.execute(select(Product).where(Product.slug == slug, Product.is_listed))
-    product = result.scalar_one_or_none()
+    """Buyers with a completed or released order for the product; one review each."""
+    product = await _listed(db, slug)
     if not product:
-        from fastapi.responses import PlainTextResponse
         return PlainTextResponse("Not found", status_code=404)
-    return templates.TemplateResponse("catalog/detail.html", {"request": request, "user": getattr(request.state, "user", None), "product": product})
+    if rating not in RATINGS:
+        outcome = "invalid"
+    elif not await can_review(db, user, product.id):
+        outcome = "not_eligible"
+    elif not await add_review(db, user, product.id, rating, body.strip()[:BODY_MAX_CHARS]):
+        outcome = "already_reviewed"
+    else:
+        outcome = "thanks"
+    return RedirectResponse(url=f"/p/{slug}?review={outcome}", status_code=302)
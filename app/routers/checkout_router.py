@@ -6,40 +6,52 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy import select
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.auth import require_user
 from app.config import get_settings
-from app.database import get_db
+from app.database import get_db, retry_locked
 from app.models.cart import Cart, CartItem
-from app.models.order import Order, OrderItem, OrderStatus, EscrowStatus
+from app.models.order import Order, OrderItem, OrderStatus, EscrowStatus, SellerOrder
 from app.models.product import Product
 from app.models.user import User
+from app.querybudget import query_budget
+from app.rollups import record_checkout
+from app.routers.cart_router import clear_cookie_cart, merge_cookie_cart
+from app.stock import fill_available, reserve_stock
 from app.templating import templates
 
 router = APIRouter()
 
 
+async def _load_cart(db: AsyncSession, user: User) -> Cart | None:
+    result = await db.execute(select(Cart).where(Cart.user_id == user.id).options(selectinload(Cart.items).selectinload(CartItem.product)))
+    return result.scalar_one_or_none()
+
+
 @router.get("/checkout", response_class=HTMLResponse)
+@query_budget(8)
 async def checkout_page(
     request: Request,
     user: User = Depends(require_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    result = await db.execute(select(Cart).where(Cart.user_id == user.id).options(selectinload(Cart.items).selectinload(CartItem.product)))
-    cart = result.scalar_one_or_none()
+    await merge_cookie_cart(db, user, request)
+    cart = await _load_cart(db, user)
     if not cart or not cart.items:
-        return RedirectResponse(url="/catalog", status_code=302)
+        return clear_cookie_cart(request, RedirectResponse(url="/catalog", status_code=302))
     total_cents = sum(i.quantity * i.product.price_cents for i in cart.items)
-    return templates.TemplateResponse(
+    return clear_cookie_cart(request, templates.TemplateResponse(
         "checkout/checkout.html",
         {"request": request, "user": user, "cart": cart, "total_cents": total_cents},
-    )
+    ))
 
 
 @router.post("/checkout")
+@retry_locked
+@query_budget(20)
 async def checkout_submit(
     request: Request,
     user: User = Depends(require_user),
@@ -47,10 +59,25 @@ async def checkout_submit(
 ):
     form = await request.form()
     payment_method = form.get("payment_method", "xmr") or "xmr"
-    result = await db.execute(select(Cart).where(Cart.user_id == user.id).options(selectinload(Cart.items).selectinload(CartItem.product)))
-    cart = result.scalar_one_or_none()
+    if payment_method not in ("xmr", "btc"):
+        payment_method = "xmr"
+    await merge_cookie_cart(db, user, request)
+    cart = await _load_cart(db, user)
     if not cart or not cart.items:
-        return RedirectResponse(url="/catalog", status_code=302)
+        return clear_cookie_cart(request, RedirectResponse(url="/catalog", status_code=302))
+    # Reserve before the order is written: a short line rolls back the whole transaction,
+    # including the lines already reserved, and the buyer sees what is left.
+    short = await reserve_stock(db, [(ci.product, ci.quantity) for ci in cart.items])
+    if short:
+        await db.rollback()
+        await merge_cookie_cart(db, user, request)  # the rollback undid the merge above
+        cart = await _load_cart(db, user)
+        total_cents = sum(i.quantity * i.product.price_cents for i in cart.items) if cart else 0
+        return clear_cookie_cart(request, templates.TemplateResponse(
+            "checkout/checkout.html",
+            {"request": request, "user": user, "cart": cart, "total_cents": total_cents, "short": await fill_available(db, short)},
+            status_code=409,
+        ))
     now_dt = datetime.now(timezone.utc)
     now = now_dt.isoformat()
     settings = get_settings()
@@ -71,18 +98,36 @@ async def checkout_submit(
     db.add(order)
     await db.flush()
     total_cents = 0
+    item_count = 0
+    per_seller: dict[int, SellerOrder] = {}
+    placed: list[tuple[dict, int]] = []
     for ci in cart.items:
-        oi = OrderItem(
-            order_id=order.id,
-            product_id=ci.product_id,
-            product_title=ci.product.title,
-            quantity=ci.quantity,
-            price_cents=ci.product.price_cents,
-        )
-        db.add(oi)
+        oi = {
+            "order_id": order.id,
+            "product_id": ci.product_id,
+            "product_title": ci.product.title,
+            "quantity": ci.quantity,
+            "price_cents": ci.product.price_cents,
+        }
+        placed.append((oi, ci.product.seller_id))
         total_cents += ci.quantity * ci.product.price_cents
+        item_count += ci.quantity
+        so = per_seller.get(ci.product.seller_id)
+        if so is None:
+            so = per_seller[ci.product.seller_id] = SellerOrder(
+                seller_id=ci.product.seller_id, order_id=order.id, created_at=now, subtotal_cents=0, item_count=0
+            )
+        so.subtotal_cents += ci.quantity * ci.product.price_cents
+        so.item_count += ci.quantity
+    # One executemany for the lines (no per-row RETURNING); fan-out rows commit with the order.
+    await db.execute(insert(OrderItem), [oi for oi, _ in placed])
+    db.add_all(per_seller.values())
+    await record_checkout(db, order, placed, per_seller.values())
     order.escrow_amount_cents = total_cents
+    order.total_cents = total_cents
+    order.item_count = item_count
+    order.first_item_title = cart.items[0].product.title
     for ci in cart.items:
         await db.delete(ci)
     cart.updated_at = now
-    return RedirectResponse(url=f"/orders/{order.ref}", status_code=302)
+    return clear_cookie_cart(request, RedirectResponse(url=f"/orders/{order.ref}", status_code=302))
@@ -10,10 +10,13 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app import pgp
 from app.auth import require_user
 from app.database import get_db
-from app.models.order import Order, EscrowStatus
+from app.models.order import Order, EscrowStatus, SellerOrder
 from app.models.user import User
+from app.notifications import ESCROW, notify
+from app.rollups import transition_escrow
 from app.templating import templates
 
 router = APIRouter()
@@ -23,7 +26,10 @@ async def _order_buyer_or_seller(db: AsyncSession, ref: str, user: User) -> Orde
     result = await db.execute(
         select(Order)
         .where(Order.ref == ref)
-        .where((Order.user_id == user.id) | (Order.primary_seller_id == user.id))
+        .where(
+            (Order.user_id == user.id)
+            | select(SellerOrder.id).where(SellerOrder.seller_id == user.id, SellerOrder.order_id == Order.id).exists()
+        )
         .options(selectinload(Order.items))
     )
     return result.scalar_one_or_none()
@@ -50,30 +56,52 @@ async def dispute_page(
         EscrowStatus.IN_ESCROW.value,
     ):
         return RedirectResponse(url=f"/orders/{ref}", status_code=302)
-    has_pgp = bool(user.pgp_public_key and user.pgp_public_key.strip())
-    error = request.query_params.get("error")
+    return _dispute_form(request, user, order, error=request.query_params.get("error"))
+
+
+def _dispute_form(request: Request, user: User, order: Order, evidence: str = "", error: str | None = None,
+                  status_code: int = 200) -> HTMLResponse:
     return templates.TemplateResponse(
         "escrow/dispute.html",
         {
             "request": request,
             "user": user,
             "order": order,
-            "has_pgp": has_pgp,
+            "has_pgp": user.pgp_fingerprint is not None,
             "error": error,
+            "evidence": evidence,
+            "max_chars": pgp.MESSAGE_MAX_CHARS,
         },
+        status_code=status_code,
+        headers={"Retry-After": "5"} if error == "busy" else None,
+    )
+
+
+def resubmit_page(request: Request, user: User, action: str, field: str, text: str, back: str,
+                  error: str) -> HTMLResponse:
+    """The message form again, holding text that was refused (queue full, no gpg, too long), so it is not lost."""
+    return templates.TemplateResponse(
+        "orders/resubmit.html",
+        {"request": request, "user": user, "action": action, "field": field, "text": text, "back": back,
+         "error": error, "max_chars": pgp.MESSAGE_MAX_CHARS},
+        status_code=400 if error == "too_long" else 503,
+        headers={"Retry-After": "5"} if error == "busy" else None,
     )
 
 
 @router.post("/orders/{ref}/dispute")
 async def dispute_open(
     ref: str,
+    request: Request,
     user: User = Depends(require_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
+    # Read and check the form before anything changes, so a refused submission keeps its text.
+    evidence = ((await request.form()).get("evidence") or "").strip()
     order = await _order_buyer_or_seller(db, ref, user)
     if not order:
         return PlainTextResponse("Not found", status_code=404)
-    if not (user.pgp_public_key and user.pgp_public_key.strip()):
+    if user.pgp_fingerprint is None:
         return RedirectResponse(
             url=f"/orders/{ref}/dispute?error=pgp_required",
             status_code=302,
@@ -89,8 +117,38 @@ async def dispute_open(
         EscrowStatus.IN_ESCROW.value,
     ):
         return RedirectResponse(url=f"/orders/{ref}", status_code=302)
+    if len(evidence) > pgp.MESSAGE_MAX_CHARS:
+        return _dispute_form(request, user, order, evidence, "too_long", status_code=400)
+    # Queued before the dispute opens: when it cannot be queued nothing has changed yet and the
+    # form comes back with the text. Losing the race below leaves the order disputed all the same.
+    refused = pgp.submit(order.id, pgp.EVIDENCE, evidence, user.id) if evidence else None
+    if refused:
+        return _dispute_form(request, user, order, evidence, refused, status_code=503)
+    outcome = "?evidence=queued" if evidence else ""
     now = datetime.now(timezone.utc).isoformat()
-    order.escrow_status = EscrowStatus.DISPUTED.value
-    order.dispute_opened_at = now
-    order.updated_at = now
-    return RedirectResponse(url=f"/orders/{ref}", status_code=302)
+    if not await transition_escrow(db, order, escrow_status, EscrowStatus.DISPUTED.value, dispute_opened_at=now, updated_at=now):
+        return RedirectResponse(url=f"/orders/{ref}{outcome}", status_code=302)
+    await notify(db, order, ESCROW, EscrowStatus.DISPUTED.value, actor_id=user.id)
+    return RedirectResponse(url=f"/orders/{ref}{outcome}", status_code=302)
+
+
+@router.post("/orders/{ref}/evidence")
+async def dispute_evidence(
+    ref: str,
+    request: Request,
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Queue dispute evidence for encryption; the handler returns before any public-key work."""
+    order = await _order_buyer_or_seller(db, ref, user)
+    if not order:
+        return PlainTextResponse("Not found", status_code=404)
+    evidence = ((await request.form()).get("evidence") or "").strip()
+    if not evidence or order.escrow_status != EscrowStatus.DISPUTED.value:
+        return RedirectResponse(url=f"/orders/{ref}", status_code=302)
+    if len(evidence) > pgp.MESSAGE_MAX_CHARS:
+        return resubmit_page(request, user, f"/orders/{ref}/evidence", "evidence", evidence, f"/orders/{ref}", "too_long")
+    refused = pgp.submit(order.id, pgp.EVIDENCE, evidence, user.id)
+    if refused:
+        return resubmit_page(request, user, f"/orders/{ref}/evidence", "evidence", evidence, f"/orders/{ref}", refused)
+    return RedirectResponse(url=f"/orders/{ref}?evidence=queued", status_code=302)
@@ -0,0 +1,45 @@
+# Notification inbox: order status and escrow changes for the buyer and sellers of an order.
+from __future__ import annotations
+
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import require_user
+from app.database import get_db
+from app.models.user import User
+from app.notifications import inbox_page, mark_read
+from app.querybudget import query_budget
+from app.templating import templates
+
+router = APIRouter()
+
+
+@router.get("/notifications", response_class=HTMLResponse)
+@query_budget(3)
+async def notifications_inbox(
+    request: Request,
+    before: int | None = None,
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Newest first; ?before=<id> pages to older ones."""
+    page = await inbox_page(db, user.id, before)
+    return templates.TemplateResponse(
+        "notifications/inbox.html",
+        {"request": request, "user": user, "notifications": page["items"], "next": page["next"]},
+    )
+
+
+@router.post("/notifications/read")
+async def notifications_mark_read(
+    request: Request,
+    user: User = Depends(require_user),
+    db: Annotated[AsyncSession, Depends(get_db)] = None,
+):
+    """Mark all read, or with order_ref only that order's and go to it (the inbox's order links)."""
+    order_ref = (await request.form()).get("order_ref") or None
+    await mark_read(db, user.id, order_ref)
+    return RedirectResponse(url=f"/orders/{order_ref}" if order_ref else "/notifications", status_code=302)
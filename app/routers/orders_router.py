@@ -10,52 +10,110 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.archive import find_archived
 from app.auth import require_user
 from app.database import get_db
-from app.models.order import Order, OrderItem, EscrowStatus
+from app.models.archive import ArchivedOrder
+from app.models.order import Order, OrderItem, EscrowStatus, SellerOrder
 from app.models.user import User
-from app.templating import templates
+from app.notifications import ESCROW, notify
+from app.querybudget import query_budget
+from app.rollups import transition_escrow
+from app.templating import StreamedRows, StreamingTemplateResponse, templates
 
 router = APIRouter()
 
+# Columns orders/list.html renders.
+_LIST_COLUMNS = (
+    Order.ref, Order.status, Order.created_at, Order.item_count, Order.total_cents, Order.first_item_title,
+)
+
 
 @router.get("/orders", response_class=HTMLResponse)
+@query_budget(4)
 async def order_list(
     request: Request,
     user: User = Depends(require_user),
-    db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    result = await db.execute(
-        select(Order).where(Order.user_id == user.id).order_by(Order.created_at.desc())
+    orders = StreamedRows(
+        select(*_LIST_COLUMNS).where(Order.user_id == user.id).order_by(Order.created_at.desc()),
+        scalars=False,
+    )
+    return StreamingTemplateResponse("orders/list.html", {"request": request, "user": user, "orders": orders})
+
+
+@router.get("/orders/archived", response_class=HTMLResponse)
+async def order_list_archived(
+    request: Request,
+    user: User = Depends(require_user),
+):
+    """Settled orders moved out of the working tables by app/archive.py."""
+    orders = StreamedRows(
+        select(*(getattr(ArchivedOrder, c.key) for c in _LIST_COLUMNS))
+        .where(ArchivedOrder.user_id == user.id)
+        .order_by(ArchivedOrder.created_at.desc()),
+        scalars=False,
+    )
+    return StreamingTemplateResponse(
+        "orders/list.html", {"request": request, "user": user, "orders": orders, "archived": True}
     )
-    orders = result.scalars().all()
-    return templates.TemplateResponse("orders/list.html", {"request": request, "user": user, "orders": orders})
 
 
-async def _order_for_user_ref(db: AsyncSession, ref: str, user: User) -> Order | None:
-    """Load order by ref if user is buyer or primary seller."""
+def _is_seller_of(user: User):
+    """EXISTS on seller_orders (seller_id, order_id) for the outer Order row."""
+    return (
+        select(SellerOrder.id)
+        .where(SellerOrder.seller_id == user.id, SellerOrder.order_id == Order.id)
+        .exists()
+    )
+
+
+async def order_for_user_ref(db: AsyncSession, ref: str, user: User) -> Order | None:
+    """Load order by ref if user is buyer or a seller of any item in it."""
     result = await db.execute(
         select(Order)
         .where(Order.ref == ref)
-        .where((Order.user_id == user.id) | (Order.primary_seller_id == user.id))
+        .where((Order.user_id == user.id) | _is_seller_of(user))
         .options(selectinload(Order.items))
     )
     return result.scalar_one_or_none()
 
 
+async def _user_sells_in_order(db: AsyncSession, order: Order, user: User) -> bool:
+    result = await db.execute(
+        select(SellerOrder.id).where(SellerOrder.seller_id == user.id, SellerOrder.order_id == order.id)
+    )
+    return result.first() is not None
+
+
 @router.get("/orders/{ref}", response_class=HTMLResponse)
+@query_budget(6)
 async def order_detail(
     request: Request,
     ref: str,
     user: User = Depends(require_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    order = await _order_for_user_ref(db, ref, user)
+    order = await order_for_user_ref(db, ref, user)
     if not order:
-        return PlainTextResponse("Not found", status_code=404)
-    total_cents = order.escrow_amount_cents or sum(i.quantity * i.price_cents for i in order.items)
+        archived = await find_archived(db, ref, user)
+        if not archived:
+            return PlainTextResponse("Not found", status_code=404)
+        return templates.TemplateResponse(
+            "orders/detail.html",
+            {
+                "request": request,
+                "user": user,
+                "order": archived,
+                "archived": True,
+                "total_cents": archived.escrow_amount_cents or archived.total_cents,
+                "is_buyer": archived.user_id == user.id,
+                "is_seller": archived.user_id != user.id,
+            },
+        )
+    total_cents = order.escrow_amount_cents or order.total_cents
     is_buyer = order.user_id == user.id
-    is_seller = order.primary_seller_id == user.id
+    is_seller = not is_buyer or await _user_sells_in_order(db, order, user)
     escrow_status = order.escrow_status or EscrowStatus.NONE.value
     can_report_payment = is_buyer and escrow_status == EscrowStatus.AWAITING_PAYMENT.value
     can_confirm_release = is_buyer and escrow_status == EscrowStatus.IN_ESCROW.value
@@ -89,7 +147,7 @@ async def order_report_payment(
     user: User = Depends(require_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    order = await _order_for_user_ref(db, ref, user)
+    order = await order_for_user_ref(db, ref, user)
     if not order or order.user_id != user.id:
         return PlainTextResponse("Not found", status_code=404)
     if (order.escrow_status or EscrowStatus.NONE.value) != EscrowStatus.AWAITING_PAYMENT.value:
@@ -106,12 +164,12 @@ async def order_confirm_release(
     user: User = Depends(require_user),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    order = await _order_for_user_ref(db, ref, user)
+    order = await order_for_user_ref(db, ref, user)
     if not order or order.user_id != user.id:
         return PlainTextResponse("Not found", status_code=404)
     if (order.escrow_status or EscrowStatus.NONE.value) != EscrowStatus.IN_ESCROW.value:
         return RedirectResponse(url=f"/orders/{ref}", status_code=302)
     now = datetime.now(timezone.utc).isoformat()
-    order.escrow_status = EscrowStatus.RELEASED_TO_SELLER.value
-    order.updated_at = now
+    if await transition_escrow(db, order, EscrowStatus.IN_ESCROW.value, EscrowStatus.RELEASED_TO_SELLER.value, updated_at=now):
+        await notify(db, order, ESCROW, EscrowStatus.RELEASED_TO_SELLER.value, actor_id=user.id)
     return RedirectResponse(url=f"/orders/{ref}", status_code=302)
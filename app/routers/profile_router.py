@@ -9,19 +9,15 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import require_user
+from app.cache import USERS, bump
 from app.database import get_db
 from app.models.user import User
+from app.pgp import PGPError, parse_public_key
 from app.templating import templates
 
 router = APIRouter()
 
 
-def _looks_like_pgp_public_key(text: str) -> bool:
-    """Minimal check: contains BEGIN PGP and END PGP."""
-    t = (text or "").strip()
-    return "BEGIN PGP" in t.upper() and "END PGP" in t.upper()
-
-
 @router.get("/profile", response_class=HTMLResponse)
 async def profile_page(
     request: Request,
@@ -41,17 +37,20 @@ async def profile_update(
 ):
     form = await request.form()
     pgp_raw = (form.get("pgp_public_key") or "").strip()
-    if pgp_raw and not _looks_like_pgp_public_key(pgp_raw):
-        return templates.TemplateResponse(
-            "profile/profile.html",
-            {
-                "request": request,
-                "user": user,
-                "error": "Key must be an ASCII-armored PGP public key (BEGIN PGP ... END PGP).",
-            },
-        )
+    key = None
+    if pgp_raw:
+        # Parsed and validated once here (gpg subprocess); later encryption uses the stored export.
+        try:
+            key = await parse_public_key(pgp_raw)
+        except PGPError as e:
+            return templates.TemplateResponse(
+                "profile/profile.html",
+                {"request": request, "user": user, "error": str(e)},
+            )
     result = await db.execute(select(User).where(User.id == user.id))
     u = result.scalar_one_or_none()
     if u:
-        u.pgp_public_key = pgp_raw or None
+        u.pgp_public_key = key.armored if key else None
+        u.pgp_fingerprint = key.fingerprint if key else None
+        await bump(db, USERS)
     return RedirectResponse(url="/profile", status_code=302)
@@ -4,40 +4,67 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Request, UploadFile
 from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 
 from app.auth import RequireSeller, get_current_user, require_user
+from app.cache import PRODUCTS, bump
 from app.database import get_db
-from app.models.order import Order
+from app.facets import listing_delta, record_listing_change
+from app.models.order import Order, SellerOrder
 from app.models.product import Product
 from app.models.user import User
-from app.templating import templates
+from app.product_import import COLUMNS as IMPORT_COLUMNS, import_products
+from app.querybudget import query_budget
+from app.rollups import seller_summary
+from app.templating import StreamedRows, StreamingTemplateResponse, templates
 
 router = APIRouter()
 
 
+def _form_stock(value: object) -> int | None:
+    """Stock field: blank means unlimited; raises ValueError for anything but a whole number >= 0."""
+    text = str(value or "").strip()
+    if not text:
+        return None
+    stock = int(text)
+    if stock < 0:
+        raise ValueError(text)
+    return stock
+
+# Columns seller/dashboard.html renders.
+_PRODUCT_COLUMNS = (Product.slug, Product.title, Product.price_cents, Product.is_listed, Product.stock)
+_ORDER_COLUMNS = (
+    Order.ref, Order.escrow_status, SellerOrder.created_at, SellerOrder.subtotal_cents, SellerOrder.item_count,
+)
+
+
 @router.get("", response_class=HTMLResponse)
+@query_budget(7)
 async def seller_dashboard(
     request: Request,
     user: User = Depends(RequireSeller),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    if user.role.value == "admin":
-        result = await db.execute(select(Product).order_by(Product.created_at.desc()))
-    else:
-        result = await db.execute(select(Product).where(Product.seller_id == user.id).order_by(Product.created_at.desc()))
-    products = result.scalars().all()
-    # Orders where this seller is primary (for escrow/release)
-    order_result = await db.execute(
-        select(Order).where(Order.primary_seller_id == user.id).order_by(Order.created_at.desc())
+    summary = await seller_summary(db, user.id)
+    q = select(*_PRODUCT_COLUMNS).order_by(Product.created_at.desc())
+    if user.role.value != "admin":
+        q = q.where(Product.seller_id == user.id)
+    products = StreamedRows(q, scalars=False)
+    # Orders containing this seller's products (seller_orders fan-out, newest first on its index)
+    seller_orders = StreamedRows(
+        select(*_ORDER_COLUMNS)
+        .join(Order, Order.id == SellerOrder.order_id)
+        .where(SellerOrder.seller_id == user.id)
+        .order_by(SellerOrder.created_at.desc()),
+        scalars=False,
     )
-    seller_orders = order_result.scalars().all()
-    return templates.TemplateResponse(
+    return StreamingTemplateResponse(
         "seller/dashboard.html",
-        {"request": request, "user": user, "products": products, "seller_orders": seller_orders},
+        {"request": request, "user": user, "products": products, "seller_orders": seller_orders, "summary": summary},
     )
 
 
@@ -53,7 +80,7 @@ async def product_create(
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
     form = await request.form()
-    title = (form.get("title") or "").strip()
+    title = (form.get("title") or "").strip()[:256]
     description = (form.get("description") or "").strip()
     try:
         price_cents = int(float(form.get("price", 0)) * 100)
@@ -65,20 +92,52 @@ async def product_create(
             "seller/product_form.html",
             {"request": request, "user": user, "product": None, "error": "Title and price required."},
         )
+    try:
+        stock = _form_stock(form.get("stock"))
+    except ValueError:
+        return templates.TemplateResponse(
+            "seller/product_form.html",
+            {"request": request, "user": user, "product": None, "error": "Stock must be a whole number (blank for unlimited)."},
+        )
     now = datetime.now(timezone.utc).isoformat()
     product = Product(
         title=title,
         description=description or None,
         price_cents=price_cents,
         category=category,
+        stock=stock,
         seller_id=user.id,
         created_at=now,
     )
     db.add(product)
     await db.flush()
+    await record_listing_change(db, listing_delta(None, (product.category, product.is_listed)))
+    await bump(db, PRODUCTS)
     return RedirectResponse(url="/seller", status_code=302)
 
 
+@router.get("/import", response_class=HTMLResponse)
+async def product_import_page(request: Request, user: User = Depends(RequireSeller)):
+    return templates.TemplateResponse(
+        "seller/import.html", {"request": request, "user": user, "columns": IMPORT_COLUMNS, "report": None}
+    )
+
+
+@router.post("/import", response_class=HTMLResponse)
+async def product_import(
+    request: Request,
+    file: UploadFile,
+    user: User = Depends(RequireSeller),
+):
+    """Create or update many products from a CSV/JSONL upload; shows a per-row error report."""
+    name = (file.filename or "").lower()
+    fmt = "jsonl" if name.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+    report = await import_products(user, file.file, fmt)
+    return templates.TemplateResponse(
+        "seller/import.html", {"request": request, "user": user, "columns": IMPORT_COLUMNS, "report": report}
+    )
+
+
 @router.get("/edit/{slug}", response_class=HTMLResponse)
 async def product_edit_page(
     request: Request,
@@ -86,7 +145,7 @@ async def product_edit_page(
     user: User = Depends(RequireSeller),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    result = await db.execute(select(Product).where(Product.slug == slug))
+    result = await db.execute(select(Product).where(Product.slug == slug).options(undefer(Product.description)))
     product = result.scalar_one_or_none()
     if not product or (user.role.value != "admin" and product.seller_id != user.id):
         return PlainTextResponse("Not found", status_code=404)
@@ -100,11 +159,38 @@ async def product_update(
     user: User = Depends(RequireSeller),
     db: Annotated[AsyncSession, Depends(get_db)] = None,
 ):
-    result = await db.execute(select(Product).where(Product.slug == slug))
+    # Row lock on PostgreSQL, so two concurrent edits cannot both count the same listing change.
+    result = await db.execute(
+        select(Product).where(Product.slug == slug).options(undefer(Product.description)).with_for_update()
+    )
     product = result.scalar_one_or_none()
     if not product or (user.role.value != "admin" and product.seller_id != user.id):
         return PlainTextResponse("Not found", status_code=404)
     form = await request.form()
+    try:
+        stock = _form_stock(form.get("stock"))
+    except ValueError:
+        return templates.TemplateResponse(
+            "seller/product_form.html",
+            {"request": request, "user": user, "product": product, "error": "Stock must be a whole number (blank for unlimited)."},
+        )
+    # Checkouts decrement stock while the form is open, so the level is written only when the seller
+    # changed it, and only if it is still the level the form showed (stock_original).
+    try:
+        original = _form_stock(form.get("stock_original", "" if product.stock is None else product.stock))
+    except ValueError:
+        original = product.stock
+    if stock != original:
+        unchanged = Product.stock.is_(None) if original is None else Product.stock == original
+        result = await db.execute(update(Product).where(Product.id == product.id, unchanged).values(stock=stock))
+        if result.rowcount == 0:
+            await db.refresh(product, ["stock"])
+            return templates.TemplateResponse(
+                "seller/product_form.html",
+                {"request": request, "user": user, "product": product,
+                 "error": "Stock changed while you were editing (orders came in). Check the level below and save again."},
+            )
+    before = (product.category, product.is_listed)
     product.title = (form.get("title") or product.title).strip()[:256]
     product.description = (form.get("description") or "").strip() or None
     try:
@@ -113,6 +199,8 @@ async def product_update(
         pass
     product.category = (form.get("category") or product.category).strip()[:32]
     product.is_listed = form.get("listed") == "1"
+    await record_listing_change(db, listing_delta(before, (product.category, product.is_listed)))
+    await bump(db, PRODUCTS)
     return RedirectResponse(url="/seller", status_code=302)
 
 
@@ -126,5 +214,9 @@ async def product_delist(
     product = result.scalar_one_or_none()
     if not product or (user.role.value != "admin" and product.seller_id != user.id):
         return PlainTextResponse("Not found", status_code=404)
-    product.is_listed = False
+    # Conditional, so a repeated or concurrent delist counts once.
+    result = await db.execute(update(Product).where(Product.id == product.id, Product.is_listed).values(is_listed=False))
+    if result.rowcount:
+        await record_listing_change(db, listing_delta((product.category, True), (product.category, False)))
+    await bump(db, PRODUCTS)
     return RedirectResponse(url="/seller", status_code=302)
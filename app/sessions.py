@@ -0,0 +1,207 @@
+# Session revocation. Every session token carries a random 63-bit id (sid). /logout revokes that id;
+# "log out everywhere" revokes every session a user has at that moment. Revocations are rows in
+# session_revocations, written in the request's transaction with a bump of the sessions cache namespace.
+# Each worker mirrors the live rows in memory, so checking a request runs no query: a bloom filter
+# rejects almost every live sid with one word test and a sorted array of the revoked ids confirms its
+# hits. Rows (and memory) expire once the sessions they revoke have (STORE_SESSION_TTL_SECONDS).
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import SESSIONS, bump, on_bump
+from app.config import get_settings
+from app.database import engine
+from app.leader import on_leader
+from app.models.session import SessionRevocation
+
+logger = logging.getLogger("darkstore.sessions")
+
+settings = get_settings()
+
+_BITS_PER_ID = 16  # bloom filter size per revoked id at capacity: about 0.2% false hits
+_REBUILD_SECONDS = 3600  # expired revocations leave memory and the table about this often
+_SLACK_SECONDS = 10  # incremental syncs re-read this far back, for rows that committed late
+_PRUNE_BATCH = 1000
+
+
+def new_sid() -> int:
+    return secrets.randbits(63)
+
+
+class DenyList:
+    """Revoked session ids: a bloom filter in front of a sorted array of the ids (8 bytes each).
+
+    The filter is blocked: each id sets 5 bits in one 64-bit word, so a lookup reads one word.
+    Sids are random and come only from signed tokens, so their own bits serve as the hash.
+    """
+
+    def __init__(self, sids: Iterable[int] = (), capacity: int = 0) -> None:
+        self._ids = array("q", sorted(set(sids)))
+        words = 1
+        while words * 64 < max(capacity, len(self._ids), 1024) * _BITS_PER_ID:
+            words *= 2
+        self._words = array("Q", bytes(8 * words))
+        self._block = words - 1
+        for sid in self._ids:
+            self._words[sid & self._block] |= _mask(sid)
+
+    def add(self, sid: int) -> None:
+        if sid not in self:
+            self._ids.insert(bisect_left(self._ids, sid), sid)
+            self._words[sid & self._block] |= _mask(sid)
+
+    def __contains__(self, sid: int) -> bool:
+        mask = _mask(sid)
+        if self._words[sid & self._block] & mask != mask:
+            return False
+        i = bisect_left(self._ids, sid)
+        return i < len(self._ids) and self._ids[i] == sid
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def _mask(sid: int) -> int:
+    x = sid >> 33  # the block index uses the low bits
+    return (1 << (x & 63)) | (1 << (x >> 6 & 63)) | (1 << (x >> 12 & 63)) | (1 << (x >> 18 & 63)) | (1 << (x >> 24 & 63))
+
+
+# This worker's mirror of session_revocations.
+_deny = DenyList(capacity=settings.session_revocation_capacity)
+_cutoffs: dict[int, float] = {}  # user_id -> sessions issued at or before this unix time are revoked
+_synced_until = 0.0  # newest created_at applied
+_changed = asyncio.Event()
+on_bump(SESSIONS, _changed.set)
+
+
+def is_revoked(sid: int | None, user_id: int, issued_at: float) -> bool:
+    """True if the session is revoked; issued_at is the token's issue time (unix seconds).
+
+    Tokens from before "iat" only carry whole seconds, so in the second of a revocation they count
+    as issued before it.
+    """
+    if sid is None:
+        return True  # token from before session ids: cannot be revoked, so not accepted
+    cutoff = _cutoffs.get(user_id)
+    if cutoff is not None and issued_at <= cutoff:
+        return True
+    return sid in _deny
+
+
+async def revoke(db: AsyncSession, user_id: int, sid: int | None = None) -> None:
+    """Revoke one session, or with sid None every session of user_id; in the caller's transaction.
+
+    Takes effect in every worker within STORE_CACHE_POLL_MS of the commit.
+    """
+    db.add(SessionRevocation(user_id=user_id, sid=sid, created_at=time.time()))
+    await bump(db, SESSIONS)
+
+
+async def refresh(full: bool = False) -> int:
+    """Apply revocations added since the last refresh; with full, rebuild from the live rows. Returns rows read."""
+    global _deny, _cutoffs, _synced_until
+    since = time.time() - settings.session_ttl_seconds
+    if not full:
+        since = max(since, _synced_until - _SLACK_SECONDS)
+    async with engine.connect() as conn:
+        rows = (await conn.execute(
+            select(SessionRevocation.user_id, SessionRevocation.sid, SessionRevocation.created_at)
+            .where(SessionRevocation.created_at > since)
+            .order_by(SessionRevocation.created_at)
+        )).all()
+    if full:
+        # Building the filter is pure Python (~0.3 s per 100k ids); a thread lets requests interleave.
+        sids = [r.sid for r in rows if r.sid is not None]
+        _deny = await asyncio.to_thread(DenyList, sids, settings.session_revocation_capacity)
+        _cutoffs = {}
+    for user_id, sid, created_at in rows:
+        if sid is None:
+            _cutoffs[user_id] = max(_cutoffs.get(user_id, 0.0), created_at)
+        elif not full:
+            _deny.add(sid)
+    if rows:
+        _synced_until = max(_synced_until, rows[-1].created_at)
+    return len(rows)
+
+
+async def sync(stop: asyncio.Event) -> None:
+    """Keep this worker's mirror current: read new rows on every sessions bump, rebuild hourly."""
+    rebuilt = time.monotonic()
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(_changed.wait(), 1)
+        except asyncio.TimeoutError:
+            if time.monotonic() - rebuilt < _REBUILD_SECONDS:
+                continue
+        _changed.clear()
+        full = time.monotonic() - rebuilt >= _REBUILD_SECONDS
+        try:
+            await refresh(full)
+        except Exception:
+            logger.exception("session revocation sync failed")
+            await asyncio.sleep(1)
+            _changed.set()  # retry: a missed row would stay valid until the next rebuild
+            continue
+        if full:
+            rebuilt = time.monotonic()
+
+
+async def prune_expired() -> int:
+    """Delete revocations older than the session TTL; the tokens they revoked have expired."""
+    cutoff = time.time() - settings.session_ttl_seconds
+    total = 0
+    while True:
+        ids = select(SessionRevocation.id).where(SessionRevocation.created_at < cutoff).limit(_PRUNE_BATCH)
+        async with engine.begin() as conn:
+            deleted = (await conn.execute(delete(SessionRevocation).where(SessionRevocation.id.in_(ids)))).rowcount
+        total += deleted
+        if deleted < _PRUNE_BATCH:
+            return total
+        await asyncio.sleep(0.1)
+
+
+@on_leader
+async def _prune_periodically() -> None:
+    while True:
+        try:
+            pruned = await prune_expired()
+            if pruned:
+                logger.info("pruned %s expired session revocations", pruned)
+        except Exception:
+            logger.exception("session revocation pruning failed")
+        await asyncio.sleep(_REBUILD_SECONDS)
+
+
+async def _main() -> None:
+    import sys
+
+    from app.cache import ensure_versions
+    from app.database import async_session_factory, init_db
+    from app.models.user import User
+
+    if len(sys.argv) != 3 or sys.argv[1] != "revoke-user":
+        print("usage: python -m app.sessions revoke-user USERNAME", file=sys.stderr)
+        sys.exit(2)
+    await init_db()
+    await ensure_versions()
+    async with async_session_factory() as db:
+        user_id = (await db.execute(select(User.id).where(User.username == sys.argv[2]))).scalar_one_or_none()
+        if user_id is None:
+            print(f"no user {sys.argv[2]!r}", file=sys.stderr)
+            sys.exit(1)
+        await revoke(db, user_id)
+        await db.commit()
+    print(f"sessions: revoked every session of {sys.argv[2]}.")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
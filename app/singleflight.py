@@ -0,0 +1,42 @@
+# Single-flight coalescing: concurrent identical calls share one in-flight execution.
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers with the same key await its result.
+
+    The call runs in its own task, so a caller that disconnects or times out does not cancel the
+    work for the others. Exceptions propagate to every waiter. Nothing is kept once the call ends,
+    so this is not a cache: the next caller after completion starts a new flight.
+    """
+
+    def __init__(self, timeout: float | None = None) -> None:
+        self.timeout = timeout
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0  # flights started (executions of fn)
+        self.shared = 0  # callers that joined an existing flight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: float | None = None) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        else:
+            self.shared += 1
+        wait = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(asyncio.shield(task), wait)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; waiters already got it
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,113 @@
+# Stock levels: reserved at checkout by conditional decrements, released on cancel or buyer refund.
+# Each reservation is a single UPDATE ... WHERE stock >= qty, so concurrent buyers of the last
+# units never read-then-write a stale count: the database decides who gets them, and the
+# losers see which lines are short instead of an oversold order.
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import PRODUCTS, bump
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+
+
+@dataclass
+class Shortfall:
+    """A cart line that could not be reserved (available is re-read after the rollback)."""
+
+    product_id: int
+    title: str
+    requested: int
+    available: int = 0
+
+
+async def reserve_stock(db: AsyncSession, lines: Iterable[tuple[Product, int]]) -> list[Shortfall]:
+    """Take stock for every (product, quantity) line in the caller's transaction.
+
+    Products without a stock level (None) are unlimited and not written. Returns the lines that
+    were short; if any, the caller must roll back so the lines that did succeed are returned too.
+    One statement locks the rows in the same scan order for every cart, so two carts sharing
+    products cannot deadlock by taking them in opposite orders.
+    """
+    limited: dict[int, tuple[Product, int]] = {}
+    for product, qty in lines:
+        if product.stock is not None:
+            prev = limited.get(product.id)
+            limited[product.id] = (product, qty + (prev[1] if prev else 0))
+    if not limited:
+        return []
+    # One statement for the whole cart: each row takes its own quantity and only if it has that
+    # much left. Rows that come back were reserved; the rest are short.
+    qty = case({pid: q for pid, (_, q) in limited.items()}, value=Product.id)
+    taken = dict(
+        (
+            await db.execute(
+                update(Product)
+                .where(Product.id.in_(sorted(limited)), Product.stock >= qty)
+                .values(stock=Product.stock - qty)
+                .returning(Product.id, Product.stock)
+                .execution_options(synchronize_session=False)
+            )
+        ).all()
+    )
+    short = [Shortfall(pid, p.title, q) for pid, (p, q) in sorted(limited.items()) if pid not in taken]
+    if not short and 0 in taken.values():
+        await bump(db, PRODUCTS)  # product pages stop offering it
+    return short
+
+
+async def fill_available(db: AsyncSession, short: list[Shortfall]) -> list[Shortfall]:
+    """Current stock for shortfall lines, for the message shown to the buyer."""
+    levels = dict(
+        (await db.execute(select(Product.id, Product.stock).where(Product.id.in_([s.product_id for s in short])))).all()
+    )
+    for s in short:
+        s.available = max(levels.get(s.product_id) or 0, 0)
+    return short
+
+
+async def release_stock(db: AsyncSession, order_id: int) -> int:
+    """Return an order's reserved units to stock, at most once per order; returns units released.
+
+    The orders.stock_released flag is claimed with a conditional UPDATE, so two admins cancelling
+    and refunding the same order cannot release it twice. A cancelled order that is later
+    re-opened does not take its stock back.
+    """
+    claimed = await db.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.stock_released.is_(False))
+        .values(stock_released=True)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount == 0:
+        return 0
+    lines = dict(
+        (
+            await db.execute(
+                select(OrderItem.product_id, func.sum(OrderItem.quantity))
+                .where(OrderItem.order_id == order_id)
+                .group_by(OrderItem.product_id)
+            )
+        ).all()
+    )
+    if not lines:
+        return 0
+    qty = case(lines, value=Product.id)
+    after = dict(
+        (
+            await db.execute(
+                update(Product)
+                .where(Product.id.in_(sorted(lines)), Product.stock.is_not(None))
+                .values(stock=Product.stock + qty)
+                .returning(Product.id, Product.stock)
+                .execution_options(synchronize_session=False)
+            )
+        ).all()
+    )
+    if any(left == lines[pid] for pid, left in after.items()):
+        await bump(db, PRODUCTS)  # was sold out
+    return sum(lines[pid] for pid in after)
@@ -1,7 +1,178 @@
 # Shared Jinja2 templates (avoids circular import with routers).
+# Compiled templates are kept on disk (STORE_TEMPLATE_CACHE_DIR), so a new worker loads bytecode
+# instead of compiling every template; {% cache %} keeps rendered fragments in memory per worker.
+from __future__ import annotations
+
+import hashlib
+import os
+from collections.abc import AsyncIterator
 from pathlib import Path
+from typing import Any
 
+import jinja2
+from fastapi.responses import StreamingResponse
 from fastapi.templating import Jinja2Templates
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import PRODUCTS, LocalCache
+from app.config import get_settings
+from app.database import async_session_factory
+
+settings = get_settings()
 
 BASE_DIR = Path(__file__).resolve().parent
-templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+
+# Rendered fragments; dropped in every worker when any product changes.
+fragments = LocalCache(PRODUCTS, maxsize=settings.fragment_cache_size)
+
+
+class FragmentCache(Extension):
+    """{% cache key, ... %}...{% endcache %}: render the body once per key and reuse the HTML.
+
+    The key is the template's source hash and the tag's line plus the given values, so an edited
+    template never serves old fragments. Fragments are dropped when products change; the values
+    must cover everything else the body shows (e.g. a product's slug and stock, which checkout
+    changes without a bump). Never put per-user data in a fragment that is not in its key.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment: jinja2.Environment) -> None:
+        super().__init__(environment)
+        self._versions: dict[str | None, str] = {}
+
+    def preprocess(self, source: str, name: str | None, filename: str | None = None) -> str:
+        # Runs only when compiling from source; bytecode is cached per source checksum, so a
+        # template loaded from the cache carries the version it was compiled with.
+        self._versions[name] = hashlib.sha1(source.encode()).hexdigest()[:12]
+        return source
+
+    def parse(self, parser: Any) -> nodes.Node:
+        lineno = next(parser.stream).lineno
+        key = [nodes.Const(parser.name), nodes.Const(self._versions.get(parser.name)), nodes.Const(lineno)]
+        key.append(parser.parse_expression())
+        while parser.stream.skip_if("comma"):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_fragment", [nodes.Tuple(key, "load")])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _fragment(self, key: tuple, caller: Any) -> Any:
+        html = fragments.get(key)
+        if html is not None:
+            return html
+        if self.environment.is_async:
+            return self._fragment_async(key, caller)
+        html = caller()
+        fragments.set(key, html)
+        return html
+
+    async def _fragment_async(self, key: tuple, caller: Any) -> Any:
+        html = await caller()
+        fragments.set(key, html)
+        return html
+
+
+def _bytecode_cache(kind: str) -> jinja2.BytecodeCache | None:
+    # Jinja's cache key is the template name and source only; sync and async builds of one
+    # template differ, so each environment gets its own file pattern.
+    if not settings.template_cache_dir:
+        return None
+    path = Path(settings.template_cache_dir).resolve()
+    os.makedirs(path, mode=0o700, exist_ok=True)  # bytecode is executed: keep it private to the app user
+    return jinja2.FileSystemBytecodeCache(str(path), pattern=f"{kind}-%s.cache")
+
+
+_env_options: dict[str, Any] = {
+    "autoescape": True,
+    "extensions": [FragmentCache],
+    "auto_reload": settings.debug,  # production never stats template files per render
+}
+templates = Jinja2Templates(env=jinja2.Environment(
+    loader=jinja2.FileSystemLoader(str(BASE_DIR / "templates")), bytecode_cache=_bytecode_cache("sync"), **_env_options
+))
+
+# Async twin of templates.env for streaming pages: same loader and options,
+# but {% for %} can iterate async results while the page is being written.
+stream_env = jinja2.Environment(
+    loader=templates.env.loader, enable_async=True, bytecode_cache=_bytecode_cache("async"), **_env_options
+)
+
+
+def precompile() -> int:
+    """Load every template into both environments (from bytecode when cached); run at startup."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+        stream_env.get_template(name)
+    return len(names)
+
+# Flush the layout head (everything up to <main>) as soon as it is rendered,
+# then write the rest in chunks of this size.
+STREAM_FLUSH_MARKER = "<main>"
+STREAM_CHUNK_SIZE = 8192
+# Rows fetched from the cursor per round-trip while streaming.
+STREAM_BATCH_ROWS = 500
+
+
+class StreamedRows:
+    """Rows of a select() fetched with a server-side cursor while the template renders.
+
+    Put one in a StreamingTemplateResponse context in place of a list; the template's
+    {% for %} loop consumes it row by row instead of from a fully loaded result.
+    """
+
+    def __init__(self, stmt: Any, *, scalars: bool = True) -> None:
+        self.stmt = stmt
+        self.scalars = scalars
+        self._session: AsyncSession | None = None
+
+    def bind(self, session: AsyncSession) -> "StreamedRows":
+        self._session = session
+        return self
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        if self._session is None:
+            raise RuntimeError("StreamedRows used outside a StreamingTemplateResponse")
+        result = await self._session.stream(self.stmt.execution_options(yield_per=STREAM_BATCH_ROWS))
+        rows = result.scalars() if self.scalars else result
+        async for batch in rows.partitions():
+            for row in batch:
+                yield row
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    """TemplateResponse that writes the page while it renders (large list pages).
+
+    The request-scoped session from get_db is closed before the body is sent, so
+    StreamedRows in the context are bound to a session owned by the response body.
+    """
+
+    media_type = "text/html"
+
+    def __init__(self, name: str, context: dict[str, Any], status_code: int = 200) -> None:
+        self.template = stream_env.get_template(name)
+        self.context = context
+        super().__init__(self._body(), status_code=status_code, media_type=self.media_type)
+
+    async def _body(self) -> AsyncIterator[str]:
+        async with async_session_factory() as session:
+            ctx = {
+                k: v.bind(session) if isinstance(v, StreamedRows) else v
+                for k, v in self.context.items()
+            }
+            buf: list[str] = []
+            size = 0
+            first = True
+            async for chunk in self.template.generate_async(ctx):
+                buf.append(chunk)
+                size += len(chunk)
+                if size >= STREAM_CHUNK_SIZE or (first and STREAM_FLUSH_MARKER in chunk):
+                    yield "".join(buf)
+                    buf.clear()
+                    size = 0
+                    first = False
+            if buf:
+                yield "".join(buf)
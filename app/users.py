@@ -0,0 +1,83 @@
+# Account changes made by operators: role, deactivation and passphrase reset. Each one writes the
+# users row and bumps the users cache namespace in the caller's transaction, so every worker drops
+# its cached copy of the account (app/auth.py) within STORE_CACHE_POLL_MS of the commit. Deactivating
+# an account or resetting its passphrase also revokes its sessions (app/sessions.py).
+from __future__ import annotations
+
+import asyncio
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import hash_passphrase, validate_passphrase
+from app.cache import USERS, bump
+from app.models.user import User, UserRole
+from app.sessions import revoke
+
+
+async def set_role(db: AsyncSession, user_id: int, role: UserRole) -> None:
+    await db.execute(update(User).where(User.id == user_id).values(role=role))
+    await bump(db, USERS)
+
+
+async def set_active(db: AsyncSession, user_id: int, active: bool) -> None:
+    """Deactivate (every session ends) or reactivate an account."""
+    await db.execute(update(User).where(User.id == user_id).values(is_active=active))
+    if not active:
+        await revoke(db, user_id)
+    await bump(db, USERS)
+
+
+async def set_passphrase(db: AsyncSession, user_id: int, plain: str) -> list[str]:
+    """Replace the passphrase and end every session; returns policy violations instead if any."""
+    errors = validate_passphrase(plain)
+    if errors:
+        return errors
+    await db.execute(update(User).where(User.id == user_id).values(passphrase_hash=hash_passphrase(plain)))
+    await revoke(db, user_id)
+    await bump(db, USERS)
+    return []
+
+
+_USAGE = """usage: python -m app.users COMMAND USERNAME
+  role USERNAME buyer|seller|support|admin
+  deactivate USERNAME
+  activate USERNAME
+  passphrase USERNAME      (prompts for the new passphrase)"""
+
+
+async def _main() -> None:
+    import getpass
+    import sys
+
+    from app.cache import ensure_versions
+    from app.database import async_session_factory, init_db
+
+    args = sys.argv[1:]
+    commands = {"role": 3, "deactivate": 2, "activate": 2, "passphrase": 2}
+    if not args or commands.get(args[0]) != len(args) or (args[0] == "role" and args[2] not in UserRole._value2member_map_):
+        print(_USAGE, file=sys.stderr)
+        sys.exit(2)
+    command, username = args[0], args[1]
+    await init_db()
+    await ensure_versions()
+    async with async_session_factory() as db:
+        user_id = (await db.execute(select(User.id).where(User.username == username))).scalar_one_or_none()
+        if user_id is None:
+            print(f"no user {username!r}", file=sys.stderr)
+            sys.exit(1)
+        if command == "role":
+            await set_role(db, user_id, UserRole(args[2]))
+        elif command in ("deactivate", "activate"):
+            await set_active(db, user_id, command == "activate")
+        else:
+            errors = await set_passphrase(db, user_id, getpass.getpass("New passphrase: "))
+            if errors:
+                print("\n".join(errors), file=sys.stderr)
+                sys.exit(1)
+        await db.commit()
+    print(f"users: {command} {username} done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,102 @@
+# HTML pages vs the /api/v1 JSON routes for the same data, one buyer against uvicorn: response
+# bytes and latency (p50 and p95 of --requests warm requests each). "add to cart" is the HTML
+# form post plus the /cart page it redirects to, against one JSON request.
+#   python -m bench.api --products 200 --requests 300
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+
+from bench import common
+
+
+async def seed(args) -> tuple[int, int, str, str]:
+    """(buyer id, a product's id and slug, the buyer's order ref)"""
+    from sqlalchemy import select
+
+    from app.database import async_session_factory
+    from app.models.order import Order
+    from app.models.product import Product
+    from app.models.user import UserRole
+
+    await common.reset_database()
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    (buyer,) = await common.add_users(UserRole.BUYER, 1)
+    products = await common.add_products(seller, args.products, text_bytes=300)
+    await common.add_orders(buyer, seller, products[0], args.orders)
+    async with async_session_factory() as db:
+        slug = (await db.execute(select(Product.slug).where(Product.id == products[0]))).scalar_one()
+        ref = (await db.execute(select(Order.ref).where(Order.user_id == buyer).limit(1))).scalar_one()
+    return buyer, products[0], slug, ref
+
+
+async def timed(args, send) -> tuple[int, int, float, float]:
+    """(bytes, requests, p50 ms, p95 ms) of send() over --requests runs after 20 warm-up runs."""
+    for _ in range(20):
+        await send()
+    latencies = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        responses = await send()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return (sum(len(r.content) for r in responses), len(responses),
+            common.percentile(latencies, 50), common.percentile(latencies, 95))
+
+
+async def compare(args, buyer: int, product_id: int, slug: str, ref: str) -> None:
+    from app.models.user import UserRole
+
+    async with common.client(args, common.session_cookies(buyer, UserRole.BUYER)) as c:
+        def get(path: str):
+            async def send() -> list[httpx.Response]:
+                r = await c.get(path)
+                assert r.status_code == 200, (path, r.status_code)
+                return [r]
+            return send
+
+        async def html_add() -> list[httpx.Response]:
+            added = await c.post("/cart/add", data={"product_id": product_id, "quantity": 1})
+            assert added.status_code == 302, added.status_code
+            return [added, await c.get(added.headers["location"])]
+
+        async def api_add() -> list[httpx.Response]:
+            r = await c.post("/api/v1/cart/items", json={"slug": slug, "quantity": 1})
+            assert r.status_code in (200, 201), r.status_code
+            return [r]
+
+        pairs = [  # adds first, so the cart rows show a cart with a line in it
+            ("add to cart", html_add, api_add),
+            ("catalog (20)", get("/catalog?size=20"), get("/api/v1/products?limit=20")),
+            ("product detail", get(f"/p/{slug}"), get(f"/api/v1/products/{slug}")),
+            ("cart", get("/cart"), get("/api/v1/cart")),
+            ("order list", get("/orders"), get("/api/v1/orders")),
+            ("order detail", get(f"/orders/{ref}"), get(f"/api/v1/orders/{ref}")),
+            ("status only", get(f"/orders/{ref}"),
+             get(f"/api/v1/orders/{ref}?fields=status,escrow_status")),
+        ]
+        for label, html, api in pairs:
+            line = []
+            for send in (html, api):
+                size, requests, p50, p95 = await timed(args, send)
+                line.append(f"{size:6} B, {requests} req, p50 {p50:5.1f} ms, p95 {p95:5.1f} ms")
+            print(f"  {label:<15} html {line[0]}  |  api {line[1]}")
+
+
+def main() -> None:
+    p = common.parser("HTML pages vs the JSON API: bytes and latency")
+    p.add_argument("--products", type=int, default=200)
+    p.add_argument("--orders", type=int, default=5, help="the buyer's orders")
+    p.add_argument("--requests", type=int, default=300, help="timed requests per route")
+    args = p.parse_args()
+    env = common.configure(args)
+    buyer, product_id, slug, ref = common.run(seed(args))
+    print(f"{common.backend()}, {args.workers} worker(s): {args.products} products, one buyer, "
+          f"{args.requests} warm requests per route")
+    with common.serve(args, env):
+        asyncio.run(compare(args, buyer, product_id, slug, ref))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Online SQLite backup under a steady writer, in-process: a writer commits single-row updates
+# through the app's engine every --write-ms, first alone for --alone-seconds, then while
+# app.backup.backup_database() copies the database. Reports the backup's time, steps and longest
+# step, the writer's commit latency in both phases, and checks the copy holds every order. With
+# STORE_BACKUP_GPG_RECIPIENT set, the copy is encrypted and only its size is reported.
+#   python -m bench.backup --orders 200000 --text-bytes 60
+from __future__ import annotations
+
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench import common
+
+
+async def seed(args) -> None:
+    from app.models.user import UserRole
+
+    await common.reset_database()
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    (buyer,) = await common.add_users(UserRole.BUYER, 1)
+    (product,) = await common.add_products(seller, 1)
+    await common.add_orders(buyer, seller, product, args.orders, text_bytes=args.text_bytes)
+
+
+async def writer(args, stop: asyncio.Event) -> list[float]:
+    """ms per commit of a one-row update, every --write-ms until stop is set."""
+    from sqlalchemy import update
+
+    from app.database import async_session_factory
+    from app.models.order import Order
+
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        async with async_session_factory() as db:
+            now = datetime.now(timezone.utc).isoformat()
+            await db.execute(update(Order).where(Order.id == random.randint(1, args.orders)).values(updated_at=now))
+            await db.commit()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(args.write_ms / 1000)
+    return latencies
+
+
+async def measure(args) -> tuple:
+    """(backup result, writer ms alone, writer ms during the backup)"""
+    from app.backup import backup_database
+
+    stop = asyncio.Event()
+    alone = asyncio.create_task(writer(args, stop))
+    await asyncio.sleep(args.alone_seconds)
+    stop.set()
+    baseline = await alone
+
+    stop = asyncio.Event()
+    during = asyncio.create_task(writer(args, stop))
+    try:
+        result = await backup_database(tempfile.mkdtemp(prefix="darkstore-bench-backup-"))
+    finally:
+        stop.set()
+    return result, baseline, await during
+
+
+def _latency(values: list[float]) -> str:
+    return (f"p50 {common.percentile(values, 50):.2f} ms, p99 {common.percentile(values, 99):.2f} ms, "
+            f"max {max(values):.2f} ms ({len(values)} commits)")
+
+
+def main() -> None:
+    p = common.parser("online SQLite backup under a steady writer (in-process)")
+    p.add_argument("--orders", type=int, default=200000)
+    p.add_argument("--text-bytes", type=int, default=60, help="in each heavy text column of an order")
+    p.add_argument("--write-ms", type=float, default=2, help="gap between the writer's commits")
+    p.add_argument("--alone-seconds", type=float, default=3, help="writer alone before the backup")
+    args = p.parse_args()
+    common.configure(args)
+    if common.backend() != "sqlite":
+        p.error("backups are SQLite-only; PostgreSQL uses pg_dump / base backups")
+    common.run(seed(args))
+    from app.backup import source_path
+
+    size = Path(source_path()).stat().st_size
+    result, baseline, during = common.run(measure(args))
+    print(f"sqlite: {args.orders} orders, {size / 1e6:.0f} MB, writer every {args.write_ms:g} ms")
+    print(f"  backup {result.seconds:.2f} s, {result.pages} pages in {result.steps} steps, "
+          f"longest step {result.max_step_ms:.0f} ms")
+    print(f"  writer alone         {_latency(baseline)}")
+    print(f"  writer during backup {_latency(during)}")
+    if result.encrypted:
+        print(f"  encrypted copy {result.path.stat().st_size / 1e6:.0f} MB")
+        return
+    with sqlite3.connect(result.path) as copy:
+        rows = copy.execute("SELECT count(*) FROM orders").fetchone()[0]
+    print(f"  copy holds {rows} orders")
+    if rows != args.orders:
+        raise SystemExit("FAILED: the copy is missing orders")
+
+
+if __name__ == "__main__":
+    main()
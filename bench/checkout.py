@@ -0,0 +1,109 @@
+# Concurrent checkouts: many buyers, each with one cart line, check out at once against uvicorn.
+# Like a browser, the client retries a 503 (write-lock timeout on SQLite) after its Retry-After.
+# Reports final statuses (a 500 is a bug), the 503s retried, orders/s and latency per checkout
+# including retries, then checks the database: one order per 302 and, with --stock, no overselling.
+#   python -m bench.checkout --workers 4 --buyers 500 --concurrency 64
+#   python -m bench.checkout --database-url postgresql+asyncpg://store@localhost/store_bench --workers 4
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from bench import common
+
+
+async def seed(args) -> tuple[list[int], list[int]]:
+    from app.models.user import UserRole
+
+    await common.reset_database()
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    products = await common.add_products(seller, args.products, stock=args.stock)
+    buyers = await common.add_users(UserRole.BUYER, args.buyers)
+    return products, buyers
+
+
+async def shop(args, products: list[int], buyers: list[int]) -> tuple[Counter, Counter, list[float], float]:
+    from app.models.user import UserRole
+
+    gate = asyncio.Semaphore(args.concurrency)
+    busy = Counter()
+    clients = [common.client(args, common.session_cookies(b, UserRole.BUYER)) for b in buyers]
+
+    async def post(c: httpx.AsyncClient, url: str, data: dict, step: str) -> tuple[httpx.Response, float]:
+        """The final response and ms from sending the first attempt (retries included, queueing not)."""
+        start = None
+        for _ in range(args.retries):
+            async with gate:
+                start = start or time.perf_counter()
+                r = await c.post(url, data=data)
+            if r.status_code != 503:
+                break
+            busy[step] += 1
+            await asyncio.sleep(float(r.headers.get("retry-after", 1)))
+        return r, (time.perf_counter() - start) * 1000
+
+    async def add(c: httpx.AsyncClient, product_id: int) -> None:
+        r, _ = await post(c, "/cart/add", {"product_id": product_id, "quantity": 1}, "add")
+        assert r.status_code == 302, r.status_code
+
+    async def checkout(c: httpx.AsyncClient) -> tuple[int, float]:
+        r, ms = await post(c, "/checkout", {"payment_method": "xmr"}, "checkout")
+        return r.status_code, ms
+
+    try:
+        await asyncio.gather(*(add(c, products[i % len(products)]) for i, c in enumerate(clients)))
+        start = time.perf_counter()
+        results = await asyncio.gather(*(checkout(c) for c in clients))
+        elapsed = time.perf_counter() - start
+    finally:
+        await asyncio.gather(*(c.aclose() for c in clients))
+    statuses = Counter(s for s, _ in results)
+    return statuses, busy, [ms for s, ms in results if s == 302], elapsed
+
+
+async def verify(args, products: list[int]) -> tuple[int, int]:
+    """(orders placed, units sold beyond --stock on any product)."""
+    from sqlalchemy import func, select
+
+    from app.database import async_session_factory
+    from app.models.order import Order, OrderItem
+
+    async with async_session_factory() as db:
+        orders = (await db.execute(select(func.count()).select_from(Order))).scalar_one()
+        sold = (await db.execute(
+            select(OrderItem.product_id, func.sum(OrderItem.quantity)).group_by(OrderItem.product_id)
+        )).all()
+    oversold = sum(max(0, n - args.stock) for _, n in sold) if args.stock is not None else 0
+    return orders, oversold
+
+
+def main() -> None:
+    p = common.parser(__doc__ or "concurrent checkouts")
+    p.add_argument("--buyers", type=int, default=500)
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--products", type=int, default=50, help="buyers are spread over this many products")
+    p.add_argument("--stock", type=int, help="units per product (default unlimited)")
+    p.add_argument("--retries", type=int, default=5, help="attempts per request while answered 503")
+    args = p.parse_args()
+    env = common.configure(args)
+    products, buyers = common.run(seed(args))
+    with common.serve(args, env):
+        statuses, busy, latencies, elapsed = asyncio.run(shop(args, products, buyers))
+    orders, oversold = common.run(verify(args, products))
+    placed = statuses.get(302, 0)
+    print(f"{common.backend()}, {args.workers} workers: {args.buyers} buyers at {args.concurrency} concurrent, "
+          f"{args.products} products, stock {args.stock if args.stock is not None else 'unlimited'}")
+    print(f"  statuses {dict(sorted(statuses.items()))}, 503s retried: "
+          f"{busy['add']} cart adds, {busy['checkout']} checkouts")
+    print(f"  {placed} placed in {elapsed:.1f} s ({placed / elapsed:.0f} orders/s), "
+          f"p50 {common.percentile(latencies, 50):.0f} ms, p99 {common.percentile(latencies, 99):.0f} ms")
+    print(f"  orders in database {orders}, units oversold {oversold}")
+    if statuses.get(500) or orders != placed or oversold:
+        raise SystemExit("FAILED")
+
+
+if __name__ == "__main__":
+    main()
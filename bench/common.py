@@ -0,0 +1,219 @@
+# Shared setup for the benchmark scripts: a throwaway database, the app served by uvicorn in a
+# subprocess, seeding helpers and measurement helpers. Every script takes --database-url (default:
+# a new SQLite file; postgresql+asyncpg://... for an empty PostgreSQL database, whose tables are
+# dropped first) and --workers. Run from the store dir, e.g.: python -m bench.checkout --help
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+PASSPHRASE = "Bench-pass-12345"
+_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def parser(description: str) -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument("--database-url", help="default: a new SQLite file in a temporary directory")
+    p.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (default 1)")
+    p.add_argument("--port", type=int, default=8765)
+    return p
+
+
+def configure(args: argparse.Namespace, **env: str) -> dict[str, str]:
+    """Point the app's settings at the benchmark database; call before anything imports app.
+
+    Extra STORE_* settings are passed as keyword arguments without the prefix (query_budgets="warn").
+    """
+    tmp = Path(tempfile.mkdtemp(prefix="darkstore-bench-"))
+    os.environ.update({
+        "STORE_DATABASE_URL": args.database_url or f"sqlite+aiosqlite:///{tmp}/store.db",
+        "STORE_SECRET_KEY": "bench-secret",
+        "STORE_SESSION_SECURE": "false",
+        "STORE_ADMISSION_ENABLED": "false",
+        "STORE_QUERY_BUDGETS": "off",
+        "STORE_BACKUP_INTERVAL_HOURS": "0",
+        "STORE_BACKUP_DIR": str(tmp / "backups"),
+        "STORE_UPLOAD_DIR": str(tmp / "uploads"),
+        "STORE_TEMPLATE_CACHE_DIR": str(tmp / "template-cache"),
+        "STORE_PAGE_CACHE_TTL_SECONDS": "0",
+        "STORE_LOG_LEVEL": "warning",
+    })
+    os.environ.update({f"STORE_{k.upper()}": str(v) for k, v in env.items()})
+    return dict(os.environ)
+
+
+async def reset_database() -> None:
+    """Empty schema: drop every table on PostgreSQL (SQLite starts from a new file), then create."""
+    from app.cache import ensure_versions
+    from app.database import Base, engine, init_db
+
+    if engine.dialect.name != "sqlite":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+    await init_db()
+    await ensure_versions()
+
+
+def backend() -> str:
+    from app.database import engine
+
+    return engine.dialect.name
+
+
+async def add_users(role: Any, n: int) -> list[int]:
+    """n users with the given role (passphrase PASSPHRASE); returns their ids."""
+    from sqlalchemy import insert, select
+
+    from app.auth import hash_passphrase
+    from app.database import async_session_factory
+    from app.models.user import User
+
+    tag = secrets.token_hex(3)
+    names = [f"{role.value}-{tag}-{i}" for i in range(n)]
+    passphrase_hash = hash_passphrase(PASSPHRASE)
+    async with async_session_factory() as db:
+        await db.execute(insert(User), [
+            {"username": u, "passphrase_hash": passphrase_hash, "role": role, "created_at": _EPOCH.isoformat()}
+            for u in names
+        ])
+        await db.commit()
+        return list((await db.execute(select(User.id).where(User.username.in_(names)).order_by(User.id))).scalars())
+
+
+async def add_products(seller_id: int, n: int, stock: int | None = None, text_bytes: int = 0,
+                       category: str = "general") -> list[int]:
+    """n listed products, one minute apart; text_bytes of description each. Returns their ids."""
+    from sqlalchemy import insert, select
+
+    from app.database import async_session_factory
+    from app.models.product import Product
+
+    tag = secrets.token_hex(3)
+    description = ("Lorem ipsum dolor sit amet. " * (text_bytes // 28 + 1))[:text_bytes] or None
+    async with async_session_factory() as db:
+        for start in range(0, n, 1000):
+            await db.execute(insert(Product), [
+                {"title": f"Bench product {tag} {i}", "description": description, "price_cents": 1000 + i,
+                 "category": category, "seller_id": seller_id, "stock": stock,
+                 "created_at": (_EPOCH + timedelta(minutes=i)).isoformat()}
+                for i in range(start, min(n, start + 1000))
+            ])
+        await db.commit()
+        rows = await db.execute(select(Product.id).where(Product.title.like(f"Bench product {tag} %")).order_by(Product.id))
+        return list(rows.scalars())
+
+
+async def add_orders(buyer_id: int, seller_id: int, product_id: int, n: int, text_bytes: int = 0) -> None:
+    """n one-line orders from buyer to seller, with text_bytes in each heavy text column of the order."""
+    from sqlalchemy import insert, select
+
+    from app.database import async_session_factory
+    from app.models.order import EscrowStatus, Order, OrderItem, SellerOrder
+
+    blob = "x" * text_bytes or None
+    async with async_session_factory() as db:
+        for start in range(0, n, 1000):
+            created = [(_EPOCH + timedelta(minutes=i)).isoformat() for i in range(start, min(n, start + 1000))]
+            refs = [secrets.token_hex(6) for _ in created]
+            await db.execute(insert(Order), [
+                {"ref": ref, "user_id": buyer_id, "primary_seller_id": seller_id, "status": "pending",
+                 "payment_method": "xmr", "created_at": at, "updated_at": at,
+                 "escrow_status": EscrowStatus.AWAITING_PAYMENT.value, "escrow_amount_cents": 1000,
+                 "total_cents": 1000, "item_count": 1, "first_item_title": "Bench product",
+                 "notes_encrypted": blob, "operator_notes": blob, "dispute_evidence_encrypted": blob}
+                for ref, at in zip(refs, created)
+            ])
+            ids = (await db.execute(select(Order.id, Order.created_at).where(Order.ref.in_(refs)))).all()
+            await db.execute(insert(OrderItem), [
+                {"order_id": oid, "product_id": product_id, "product_title": "Bench product", "quantity": 1,
+                 "price_cents": 1000} for oid, _ in ids
+            ])
+            await db.execute(insert(SellerOrder), [
+                {"seller_id": seller_id, "order_id": oid, "created_at": at, "subtotal_cents": 1000, "item_count": 1}
+                for oid, at in ids
+            ])
+        await db.commit()
+
+
+def session_cookies(user_id: int, role: Any) -> dict[str, str]:
+    """Cookies of a logged-in session for user_id, signed like /login does (no bcrypt per user)."""
+    from app.auth import encode_session
+    from app.config import get_settings
+
+    return {get_settings().session_cookie_name: encode_session(user_id, role.value)}
+
+
+@contextmanager
+def serve(args: argparse.Namespace, env: dict[str, str]) -> Iterator[subprocess.Popen]:
+    """The app under uvicorn on args.port until the block exits. With one worker, proc.pid is the server."""
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"]
+    if args.workers > 1:
+        cmd += ["--workers", str(args.workers)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{args.port}/login", timeout=1).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.2)
+        yield proc
+    finally:
+        proc.terminate()
+        proc.wait(30)
+
+
+def base_url(args: argparse.Namespace) -> str:
+    return f"http://127.0.0.1:{args.port}"
+
+
+def client(args: argparse.Namespace, cookies: dict[str, str] | None = None) -> httpx.AsyncClient:
+    # Idle connections are dropped before uvicorn's 5 s keep-alive timeout closes them under us.
+    return httpx.AsyncClient(base_url=base_url(args), cookies=cookies, timeout=120,
+                             limits=httpx.Limits(keepalive_expiry=2))
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else float("nan")
+
+
+def reset_peak_rss(pid: int) -> None:
+    """Restart the process's peak RSS (VmHWM) from its current RSS (Linux)."""
+    Path(f"/proc/{pid}/clear_refs").write_text("5")
+
+
+def rss_kb(pid: int) -> tuple[int, int]:
+    """(current, peak) resident set size of the process in KiB, from /proc (Linux)."""
+    fields = dict(line.split(":", 1) for line in Path(f"/proc/{pid}/status").read_text().splitlines())
+    return int(fields["VmRSS"].split()[0]), int(fields["VmHWM"].split()[0])
+
+
+def run(coro: Any) -> Any:
+    """asyncio.run(coro), then close the engine's connections (they belong to that event loop)."""
+    async def main() -> Any:
+        from app.database import engine
+
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
@@ -0,0 +1,154 @@
+# Cookie carts vs database carts under a browse-heavy profile, in-process through the ASGI app.
+# Each of --visitors views the catalog and product pages, adds to the cart, views and updates it;
+# one in --buyer-every logs in and checks out. "db" runs everyone logged in from the start (every
+# cart edit is a database write); "cookie" keeps visitors anonymous until they log in to check
+# out. Counts committed write transactions and INSERT/UPDATE/DELETE statements, and checks both
+# runs placed the same orders with the same totals. Also prints the size of a full cart cookie.
+#   python -m bench.cookie_cart --visitors 200
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+from collections import Counter
+
+import httpx
+
+from bench import common
+
+_ITEM_ID = re.compile(r'name="item_id" value="(\d+)"')
+
+
+async def seed(args) -> tuple[list[tuple[int, str]], list[tuple[int, str]]]:
+    """((product id, slug) ..., (buyer id, username) ...)"""
+    from sqlalchemy import select
+
+    from app.database import async_session_factory
+    from app.models.product import Product
+    from app.models.user import User, UserRole
+
+    await common.reset_database()
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    products = await common.add_products(seller, args.products)
+    ids = await common.add_users(UserRole.BUYER, 2 * args.visitors)
+    async with async_session_factory() as db:
+        names = dict((await db.execute(select(User.id, User.username).where(User.id.in_(ids)))).all())
+        slugs = dict((await db.execute(select(Product.id, Product.slug).where(Product.id.in_(products)))).all())
+    return [(i, slugs[i]) for i in products], [(i, names[i]) for i in ids]
+
+
+class Writes:
+    """Committed transactions that wrote, and write statements, on the app's engine."""
+
+    def __init__(self) -> None:
+        self.counts = Counter()
+
+    def statement(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            self.counts["statements"] += 1
+            conn.info["wrote"] = True
+
+    def commit(self, conn) -> None:
+        if conn.info.pop("wrote", False):
+            self.counts["transactions"] += 1
+
+    def rollback(self, conn) -> None:
+        conn.info.pop("wrote", None)
+
+
+async def visit(c: httpx.AsyncClient, products: list[tuple[int, str]], rng: random.Random) -> None:
+    """5 catalog and 5 product views, 2 adds, 2 cart views and a quantity update."""
+    async def ok(r: httpx.Response, status: int = 200) -> httpx.Response:
+        assert r.status_code == status, (r.request.method, r.request.url, r.status_code)
+        return r
+
+    picks = rng.sample(products, 5)
+    for _, slug in picks:
+        await ok(await c.get(f"/catalog?page={rng.randint(1, 5)}"))
+        await ok(await c.get(f"/p/{slug}"))
+    for product_id, _ in picks[:2]:
+        await ok(await c.post("/cart/add", data={"product_id": product_id, "quantity": 1}), 302)
+    await ok(await c.get("/cart"))
+    item_id = _ITEM_ID.search((await ok(await c.get("/cart"))).text).group(1)
+    await ok(await c.post("/cart/update", data={"item_id": item_id, "quantity": 3}), 302)
+
+
+async def shop(args, mode: str, products: list[tuple[int, str]],
+               users: list[tuple[int, str]]) -> tuple[Counter, int, int]:
+    """(write counts, orders placed, their total cents) for one run of --visitors."""
+    from sqlalchemy import event, func, select
+
+    from app.database import async_session_factory, engine
+    from app.main import app
+    from app.models.order import Order
+    from app.models.user import UserRole
+
+    async def orders() -> tuple[int, int]:
+        async with async_session_factory() as db:
+            totals = select(func.count(), func.coalesce(func.sum(Order.total_cents), 0))
+            return tuple((await db.execute(totals)).one())
+
+    before = await orders()
+    writes = Writes()
+    event.listen(engine.sync_engine, "before_cursor_execute", writes.statement)
+    event.listen(engine.sync_engine, "commit", writes.commit)
+    event.listen(engine.sync_engine, "rollback", writes.rollback)
+    transport = httpx.ASGITransport(app=app)
+
+    async def visitor(n: int) -> None:
+        user_id, username = users[n]
+        buys = n % args.buyer_every == 0
+        cookies = common.session_cookies(user_id, UserRole.BUYER) if mode == "db" else None
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies=cookies) as c:
+            await visit(c, products, random.Random(n))
+            if buys and mode == "cookie":
+                r = await c.post("/login", data={"username": username, "passphrase": common.PASSPHRASE})
+                assert r.status_code == 302, r.status_code
+            if buys:
+                r = await c.post("/checkout", data={"payment_method": "xmr"})
+                assert r.status_code == 302, r.status_code
+
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def limited(n: int) -> None:
+        async with gate:
+            await visitor(n)
+
+    try:
+        await asyncio.gather(*(limited(n) for n in range(args.visitors)))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", writes.statement)
+        event.remove(engine.sync_engine, "commit", writes.commit)
+        event.remove(engine.sync_engine, "rollback", writes.rollback)
+    after = await orders()
+    return writes.counts, after[0] - before[0], after[1] - before[1]
+
+
+def main() -> None:
+    p = common.parser("cookie carts vs database carts (in-process)")
+    p.add_argument("--visitors", type=int, default=200)
+    p.add_argument("--buyer-every", type=int, default=10, help="one visitor in this many logs in and checks out")
+    p.add_argument("--products", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=20)
+    args = p.parse_args()
+    common.configure(args)
+    products, users = common.run(seed(args))
+    print(f"{common.backend()}: {args.visitors} visitors, one in {args.buyer_every} checks out")
+    results = {}
+    for mode, offset in (("db", 0), ("cookie", args.visitors)):
+        counts, placed, total = common.run(shop(args, mode, products, users[offset:]))
+        results[mode] = (placed, total)
+        print(f"  {mode:<7} cart: {counts['transactions']:5} write transactions, {counts['statements']:5} write "
+              f"statements; {placed} orders, {total / 100:.2f} total")
+    from app.auth import encode_cart
+    from app.config import get_settings
+
+    settings = get_settings()
+    full = encode_cart({pid: settings.cart_max_quantity for pid, _ in products[:settings.cart_max_lines]})
+    print(f"  a full cookie cart ({settings.cart_max_lines} lines) is {len(full)} bytes")
+    if results["db"] != results["cookie"]:
+        raise SystemExit("FAILED: the two runs placed different orders")
+
+
+if __name__ == "__main__":
+    main()
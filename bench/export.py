@@ -0,0 +1,105 @@
+# Order exports under load: streams /admin/export/orders.{jsonl,csv} over --orders orders from one
+# uvicorn worker while another client polls /catalog, once per --pauses value of
+# STORE_EXPORT_PAUSE_MS. Reports export size and time, the worker's RSS before and its peak
+# (VmHWM) during the export, and /catalog latency idle and during each export. Fails if any
+# encrypted or operator-note text (seeded as runs of "x") reaches the output.
+#   python -m bench.export --orders 1000000 --pauses 0,5
+from __future__ import annotations
+
+import asyncio
+import time
+
+from bench import common
+
+_SECRET = "x" * 64  # the seeded text columns are runs of x; no exported field has one
+
+
+async def seed(args) -> int:
+    from app.models.user import UserRole
+
+    await common.reset_database()
+    (admin,) = await common.add_users(UserRole.ADMIN, 1)
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    (buyer,) = await common.add_users(UserRole.BUYER, 1)
+    (product,) = await common.add_products(seller, 1)
+    await common.add_orders(buyer, seller, product, args.orders, text_bytes=args.text_bytes)
+    return admin
+
+
+async def poll_catalog(args, stop: asyncio.Event) -> list[float]:
+    """ms per /catalog request, one after another every --poll-ms until stop is set."""
+    latencies = []
+    async with common.client(args) as c:
+        while not stop.is_set():
+            start = time.perf_counter()
+            r = await c.get("/catalog")
+            assert r.status_code == 200, r.status_code
+            latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(args.poll_ms / 1000)
+    return latencies
+
+
+async def idle(args) -> list[float]:
+    stop = asyncio.Event()
+    poller = asyncio.create_task(poll_catalog(args, stop))
+    await asyncio.sleep(args.idle_seconds)
+    stop.set()
+    return await poller
+
+
+async def export(args, pid: int, cookies: dict[str, str], fmt: str) -> tuple[int, float, int, list[float]]:
+    """(bytes, seconds, peak RSS KiB, /catalog ms during) for one export."""
+    stop = asyncio.Event()
+    poller = asyncio.create_task(poll_catalog(args, stop))
+    common.reset_peak_rss(pid)
+    size, tail = 0, ""
+    start = time.perf_counter()
+    try:
+        async with common.client(args, cookies) as c, c.stream("GET", f"/admin/export/orders.{fmt}") as r:
+            assert r.status_code == 200, r.status_code
+            async for text in r.aiter_text():
+                size += len(text.encode())
+                if _SECRET in tail + text:
+                    raise SystemExit("FAILED: encrypted or operator-note text in the export")
+                tail = text[-len(_SECRET):]
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        latencies = await poller
+    return size, elapsed, common.rss_kb(pid)[1], latencies
+
+
+def _latency(values: list[float]) -> str:
+    return f"/catalog p50 {common.percentile(values, 50):5.1f} ms, p99 {common.percentile(values, 99):5.1f} ms"
+
+
+def main() -> None:
+    p = common.parser("order exports: size, time, worker RSS and /catalog latency during")
+    p.add_argument("--orders", type=int, default=200000)
+    p.add_argument("--text-bytes", type=int, default=500, help="in each encrypted or note column (never exported)")
+    p.add_argument("--pauses", default="0,5", help="STORE_EXPORT_PAUSE_MS values to run, comma-separated")
+    p.add_argument("--formats", default="jsonl,csv")
+    p.add_argument("--poll-ms", type=float, default=20, help="gap between /catalog requests")
+    p.add_argument("--idle-seconds", type=float, default=5)
+    args = p.parse_args()
+    if args.workers != 1:
+        p.error("RSS is read from the single uvicorn process; run with --workers 1")
+    env = common.configure(args)
+    admin = common.run(seed(args))
+    from app.models.user import UserRole
+
+    cookies = common.session_cookies(admin, UserRole.ADMIN)
+    print(f"{common.backend()}: {args.orders} orders, one worker, /catalog polled every {args.poll_ms:.0f} ms")
+    for i, pause in enumerate(args.pauses.split(",")):
+        with common.serve(args, dict(env, STORE_EXPORT_PAUSE_MS=pause)) as proc:
+            if i == 0:
+                print(f"  idle                      {_latency(asyncio.run(idle(args)))}")
+            for fmt in args.formats.split(","):
+                before, _ = common.rss_kb(proc.pid)
+                size, elapsed, peak, during = asyncio.run(export(args, proc.pid, cookies, fmt))
+                print(f"  {fmt:<5} pause {pause:>2} ms  {size / 1e6:6.0f} MB in {elapsed:5.1f} s, "
+                      f"RSS {before / 1024:.0f} -> peak {peak / 1024:.0f} MiB, {_latency(during)}")
+
+
+if __name__ == "__main__":
+    main()
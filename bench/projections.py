@@ -0,0 +1,122 @@
+# Column projections vs ORM entities on the list pages, in-process and buffered (load + render, no
+# HTTP): admin orders, the seller's products, the catalog and the buyer's orders. "entities" loads
+# whole rows with every deferred text column undeferred, as the pages did before they selected
+# only what they render; "projection" runs the page's own column list. Reports the best of
+# --repeat runs and the tracemalloc peak of the first, each in a new session.
+#   python -m bench.projections --rows 10000 --text-bytes 2000
+from __future__ import annotations
+
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from sqlalchemy import Select
+
+from bench import common
+
+
+async def seed(args) -> SimpleNamespace:
+    from app.models.user import UserRole
+
+    await common.reset_database()
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    (buyer,) = await common.add_users(UserRole.BUYER, 1)
+    products = await common.add_products(seller, args.rows, text_bytes=args.text_bytes)
+    await common.add_orders(buyer, seller, products[0], args.rows, text_bytes=args.text_bytes)
+    return SimpleNamespace(seller=seller, buyer=buyer)
+
+
+def _whole(model):
+    """select(model) with every deferred column loaded, as before the projections."""
+    from sqlalchemy import inspect, select
+    from sqlalchemy.orm import undefer
+
+    deferred = [attr for attr in inspect(model).column_attrs if attr.deferred]
+    return select(model).options(*(undefer(getattr(model, attr.key)) for attr in deferred))
+
+
+def pages(ids: SimpleNamespace, catalog_size: int) -> list[tuple[str, str, str, Select, Select]]:
+    """(page, template, context key, entity query, projection query) per list page."""
+    from sqlalchemy import select
+
+    from app.models.order import Order
+    from app.models.product import Product
+    from app.routers.admin_router import _LIST_COLUMNS as ADMIN_COLUMNS
+    from app.routers.catalog_router import _LIST_COLUMNS as CATALOG_COLUMNS
+    from app.routers.orders_router import _LIST_COLUMNS as ORDER_COLUMNS
+    from app.routers.seller_router import _PRODUCT_COLUMNS
+
+    newest_orders = Order.created_at.desc()
+    return [
+        ("admin orders", "admin/orders.html", "orders",
+         _whole(Order).order_by(newest_orders),
+         select(*ADMIN_COLUMNS).order_by(newest_orders)),
+        ("seller products", "seller/dashboard.html", "products",
+         _whole(Product).where(Product.seller_id == ids.seller).order_by(Product.created_at.desc()),
+         select(*_PRODUCT_COLUMNS).where(Product.seller_id == ids.seller)
+         .order_by(Product.created_at.desc())),
+        (f"catalog ({catalog_size})", "catalog/list.html", "products",
+         _whole(Product).where(Product.is_listed).order_by(Product.created_at.desc()).limit(catalog_size),
+         select(*CATALOG_COLUMNS).where(Product.is_listed).order_by(Product.created_at.desc())
+         .limit(catalog_size)),
+        ("buyer orders", "orders/list.html", "orders",
+         _whole(Order).where(Order.user_id == ids.buyer).order_by(newest_orders),
+         select(*ORDER_COLUMNS).where(Order.user_id == ids.buyer).order_by(newest_orders)),
+    ]
+
+
+async def render(template: str, key: str, query, entities: bool, ids: SimpleNamespace) -> int:
+    """Load the rows in a new session and render the page; returns its length."""
+    from app.database import async_session_factory
+    from app.facets import category_counts
+    from app.rollups import admin_summary, seller_summary
+    from app.templating import templates
+
+    async with async_session_factory() as db:
+        result = await db.execute(query)
+        rows = result.scalars().all() if entities else result.all()
+        ctx = {
+            "request": SimpleNamespace(state=SimpleNamespace(unread_notifications=0), query_params={}),
+            "user": SimpleNamespace(role=SimpleNamespace(value="admin"), pgp_fingerprint=None),
+            key: rows,
+            "summary": await (admin_summary(db) if template.startswith("admin") else seller_summary(db, ids.seller)),
+            "seller_orders": [],
+            "categories": await category_counts(),
+            "category": None, "page": 1, "sort": "new",
+        }
+        return len(templates.get_template(template).render(ctx))
+
+
+async def measure(args, ids: SimpleNamespace) -> None:
+    for page, template, key, whole, projection in pages(ids, args.catalog_size):
+        results = []
+        for label, query in (("entities", whole), ("projection", projection)):
+            tracemalloc.start()
+            size = await render(template, key, query, label == "entities", ids)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                await render(template, key, query, label == "entities", ids)
+                best = min(best, time.perf_counter() - start)
+            results.append(f"{label} {best * 1000:5.0f} ms / {peak / 1e6:5.1f} MB")
+        print(f"  {page:<16} {results[0]}  ->  {results[1]}   ({size / 1e3:.0f} kB page)")
+
+
+def main() -> None:
+    p = common.parser("projections vs entities on the list pages (in-process)")
+    p.add_argument("--rows", type=int, default=10000, help="products of the seller, and orders of the buyer")
+    p.add_argument("--text-bytes", type=int, default=2000, help="in each deferred text column")
+    p.add_argument("--catalog-size", type=int, default=100, help="products on a catalog page (the maximum)")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+    common.configure(args)
+    ids = common.run(seed(args))
+    print(f"{common.backend()}: {args.rows} rows, {args.text_bytes} B text columns, "
+          f"best of {args.repeat} / traced peak of the first run")
+    common.run(measure(args, ids))
+
+
+if __name__ == "__main__":
+    main()
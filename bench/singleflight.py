@@ -0,0 +1,99 @@
+# Single-flight on the catalog: --burst identical requests at once, in-process through the ASGI
+# app, with the catalog's SingleFlight and with it bypassed (every request runs its own lookup).
+# Counts the statements that read products (listing, product page, reviews) and reports the
+# burst's wall time. The page cache stays off, so only single-flight coalesces.
+#   python -m bench.singleflight --burst 200
+from __future__ import annotations
+
+import asyncio
+import importlib
+import time
+from collections import Counter
+
+import httpx
+
+from bench import common
+
+
+async def seed(args) -> tuple[str, int]:
+    from sqlalchemy import select
+
+    from app.database import async_session_factory
+    from app.models.product import Product
+    from app.models.user import UserRole
+
+    await common.reset_database()
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    (buyer,) = await common.add_users(UserRole.BUYER, 1)
+    ids = await common.add_products(seller, args.products, text_bytes=500, category="books")
+    async with async_session_factory() as db:
+        slug = (await db.execute(select(Product.slug).where(Product.id == ids[0]))).scalar_one()
+    return slug, buyer
+
+
+class _Direct:
+    """Stands in for the catalog's SingleFlight: every caller runs its own lookup."""
+
+    async def do(self, key, fn, timeout=None):
+        return await fn()
+
+
+async def burst(args, slug: str, buyer: int) -> None:
+    from sqlalchemy import event
+
+    from app.database import engine
+    from app.main import app
+    from app.models.user import UserRole
+
+    # app.routers re-exports each router object under its module's name
+    catalog_router = importlib.import_module("app.routers.catalog_router")
+    reads = Counter()
+
+    def count(conn, cursor, statement, parameters, context, executemany) -> None:
+        if "FROM products" in statement:
+            reads["products"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    transport = httpx.ASGITransport(app=app)
+    anon = httpx.AsyncClient(transport=transport, base_url="http://bench")
+    member = httpx.AsyncClient(transport=transport, base_url="http://bench",
+                               cookies=common.session_cookies(buyer, UserRole.BUYER))
+    cases = [
+        ("anon /catalog?category=books", anon, "/catalog?category=books", 200),
+        (f"anon /p/{slug}", anon, f"/p/{slug}", 200),
+        ("anon /p/missing", anon, "/p/missing", 404),
+        ("logged-in /catalog", member, "/catalog", 200),
+    ]
+    flights = catalog_router.flights
+    try:
+        for label, c, path, status in cases:
+            line = []
+            for mode, flight in (("off", _Direct()), ("single-flight", flights)):
+                catalog_router.flights = flight
+                reads.clear()
+                start = time.perf_counter()
+                responses = await asyncio.gather(*(c.get(path) for _ in range(args.burst)))
+                elapsed = time.perf_counter() - start
+                assert {r.status_code for r in responses} == {status}, (path, mode)
+                line.append(f"{mode} {reads['products']:4} reads {elapsed * 1000:6.0f} ms")
+            print(f"  {label:<30} {line[0]}  ->  {line[1]}")
+    finally:
+        catalog_router.flights = flights
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+        await anon.aclose()
+        await member.aclose()
+
+
+def main() -> None:
+    p = common.parser("single-flight on catalog bursts (in-process)")
+    p.add_argument("--burst", type=int, default=200, help="identical concurrent requests")
+    p.add_argument("--products", type=int, default=1000)
+    args = p.parse_args()
+    common.configure(args)
+    slug, buyer = common.run(seed(args))
+    print(f"{common.backend()}: bursts of {args.burst}, {args.products} products; product reads per burst")
+    common.run(burst(args, slug, buyer))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Streamed list pages (StreamingTemplateResponse): time to first byte, full response time and the
+# server's peak RSS growth while sending /admin/orders, /seller and /orders over --orders orders
+# and --products products. Each page gets a fresh uvicorn process; peak RSS growth is its VmHWM
+# over the first request minus its RSS before, so it counts everything the request allocated
+# (rows, template code and output, socket buffers), not only what tracemalloc sees. One worker,
+# so the measured process is the one answering.
+#   python -m bench.streaming --orders 10000 --products 1000
+#   python -m bench.streaming --database-url postgresql+asyncpg://store@localhost/store_bench
+from __future__ import annotations
+
+import asyncio
+import time
+
+from bench import common
+
+PAGES = (("admin", "/admin/orders"), ("seller", "/seller"), ("buyer", "/orders"))
+
+
+async def seed(args) -> dict[str, int]:
+    from app.models.user import UserRole
+
+    await common.reset_database()
+    (admin,) = await common.add_users(UserRole.ADMIN, 1)
+    (seller,) = await common.add_users(UserRole.SELLER, 1)
+    (buyer,) = await common.add_users(UserRole.BUYER, 1)
+    products = await common.add_products(seller, args.products, text_bytes=500)
+    await common.add_orders(buyer, seller, products[0], args.orders, text_bytes=args.order_text_bytes)
+    return {"admin": admin, "seller": seller, "buyer": buyer}
+
+
+async def fetch(args, cookies: dict[str, str], path: str) -> tuple[float, float, int]:
+    """(ms to the first body byte, ms to the last, body bytes) for one GET."""
+    async with common.client(args, cookies) as c:
+        start = time.perf_counter()
+        first, size = None, 0
+        async with c.stream("GET", path) as r:
+            assert r.status_code == 200, (path, r.status_code)
+            async for chunk in r.aiter_raw():
+                first = first or time.perf_counter()
+                size += len(chunk)
+        return (first - start) * 1000, (time.perf_counter() - start) * 1000, size
+
+
+def measure(args, pid: int, cookies: dict[str, str], path: str) -> tuple[float, float, int, int]:
+    """Peak RSS growth (KiB) of a fresh server over the first request, then median TTFB and total."""
+    base, _ = common.rss_kb(pid)
+    common.reset_peak_rss(pid)
+    _, _, size = asyncio.run(fetch(args, cookies, path))
+    grown = common.rss_kb(pid)[1] - base
+    timings = [asyncio.run(fetch(args, cookies, path)) for _ in range(args.repeat)]
+    return (common.percentile([t[0] for t in timings], 50), common.percentile([t[1] for t in timings], 50),
+            size, grown)
+
+
+def main() -> None:
+    p = common.parser("streamed list pages: TTFB and peak RSS")
+    p.add_argument("--orders", type=int, default=10000)
+    p.add_argument("--products", type=int, default=1000, help="the seller's products, all on /seller")
+    p.add_argument("--order-text-bytes", type=int, default=2000, help="in each heavy text column of an order")
+    p.add_argument("--repeat", type=int, default=5, help="timed requests per page after the first")
+    args = p.parse_args()
+    if args.workers != 1:
+        p.error("peak RSS is read from the single uvicorn process; run with --workers 1")
+    env = common.configure(args)
+    users = common.run(seed(args))
+    from app.models.user import UserRole
+
+    roles = {"admin": UserRole.ADMIN, "seller": UserRole.SELLER, "buyer": UserRole.BUYER}
+    print(f"{common.backend()}: {args.orders} orders, {args.products} products, median of {args.repeat}")
+    for role, path in PAGES:
+        cookies = common.session_cookies(users[role], roles[role])
+        with common.serve(args, env) as proc:  # a fresh process per page: its RSS growth is this page's
+            ttfb, total, size, grown = measure(args, proc.pid, cookies, path)
+        print(f"  {path:<14} first byte {ttfb:6.0f} ms, total {total:6.0f} ms, {size / 1e6:5.1f} MB, "
+              f"peak RSS +{grown / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
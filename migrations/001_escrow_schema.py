@@ -10,22 +10,11 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import text
-from sqlalchemy.exc import OperationalError
-from app.database import engine
-
-
-async def add_column(conn, table: str, col: str, spec: str) -> None:
-    try:
-        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {spec}"))
-    except OperationalError as e:
-        if "duplicate column name" in str(e).lower():
-            return
-        raise
+from migrations import add_column, ddl
 
 
 async def run() -> None:
-    async with engine.begin() as conn:
+    async with ddl() as conn:
         await add_column(conn, "users", "pgp_public_key", "TEXT")
         await add_column(conn, "orders", "escrow_status", "VARCHAR(32) DEFAULT 'none'")
         await add_column(conn, "orders", "escrow_address", "VARCHAR(512)")
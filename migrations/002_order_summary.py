@@ -0,0 +1,42 @@
+# Migration: denormalized order summary columns and list indexes.
+# Run once on existing DB: cd store && python -m migrations.002_order_summary
+# New installs: init_db() create_all creates the columns; the backfill only touches rows not yet summarised,
+# in resumable id batches, so checkouts keep committing while it runs on a large orders table.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import add_column, backfill, create_index, ddl
+
+
+async def run() -> None:
+    async with ddl() as conn:
+        await add_column(conn, "orders", "item_count", "INTEGER NOT NULL DEFAULT 0")
+        await add_column(conn, "orders", "total_cents", "INTEGER NOT NULL DEFAULT 0")
+        await add_column(conn, "orders", "first_item_title", "VARCHAR(256)")
+    await create_index("ix_orders_user_created", "orders", "user_id, created_at")
+    await create_index("ix_orders_seller_created", "orders", "primary_seller_id, created_at")
+    await create_index("ix_orders_created", "orders", "created_at")
+    # The backfill looks up each order's items; without this index (009) every batch scans order_items.
+    await create_index("ix_order_items_order_id", "order_items", "order_id")
+    await backfill(
+        "002_order_summary",
+        "orders",
+        """
+        UPDATE orders SET
+            item_count = (SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE order_id = orders.id),
+            total_cents = (SELECT COALESCE(SUM(quantity * price_cents), 0) FROM order_items WHERE order_id = orders.id),
+            first_item_title = (SELECT product_title FROM order_items WHERE order_id = orders.id ORDER BY id LIMIT 1)
+        WHERE id BETWEEN :lo AND :hi AND first_item_title IS NULL
+        """,
+    )
+    print("002_order_summary: done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,41 @@
+# Migration: seller_orders fan-out table for multi-seller orders.
+# Run once on existing DB: cd store && python -m migrations.003_seller_orders
+# New installs: init_db() create_all creates the table; the backfill skips (seller, order) pairs already present
+# and runs in resumable batches of order ids.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base
+from app.models.order import SellerOrder
+from migrations import backfill, ddl
+
+
+async def run() -> None:
+    async with ddl() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[SellerOrder.__table__])
+    await backfill(
+        "003_seller_orders",
+        "orders",
+        """
+        INSERT INTO seller_orders (seller_id, order_id, created_at, subtotal_cents, item_count)
+        SELECT p.seller_id, oi.order_id, o.created_at, SUM(oi.quantity * oi.price_cents), SUM(oi.quantity)
+        FROM order_items oi
+        JOIN products p ON p.id = oi.product_id
+        JOIN orders o ON o.id = oi.order_id
+        WHERE oi.order_id BETWEEN :lo AND :hi AND NOT EXISTS (
+            SELECT 1 FROM seller_orders so WHERE so.seller_id = p.seller_id AND so.order_id = oi.order_id
+        )
+        GROUP BY p.seller_id, oi.order_id, o.created_at
+        """,
+    )
+    print("003_seller_orders: done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
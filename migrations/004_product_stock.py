@@ -0,0 +1,28 @@
+# Migration: product stock levels and the per-order stock release flag.
+# Run once on existing DB: cd store && python -m migrations.004_product_stock
+# Existing products get stock NULL (unlimited) until a seller sets a level.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+from migrations import add_column, ddl
+
+
+async def run() -> None:
+    async with ddl() as conn:
+        tables = await conn.run_sync(lambda sync: inspect(sync).get_table_names())
+        await add_column(conn, "products", "stock", "INTEGER")
+        await add_column(conn, "orders", "stock_released", "BOOLEAN NOT NULL DEFAULT FALSE")
+        if "archived_orders" in tables:
+            await add_column(conn, "archived_orders", "stock_released", "BOOLEAN NOT NULL DEFAULT FALSE")
+    print("004_product_stock: done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,38 @@
+# Migration: one cart line per (cart, product), so cart adds can be upserts.
+# Run once on existing DB: cd store && python -m migrations.005_cart_item_unique
+# Duplicate lines are folded into the oldest one (quantities summed) before the unique index is built.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from migrations import ddl
+
+
+async def run() -> None:
+    async with ddl() as conn:
+        await conn.execute(text(
+            """
+            UPDATE cart_items SET quantity = (
+                SELECT SUM(d.quantity) FROM cart_items d
+                WHERE d.cart_id = cart_items.cart_id AND d.product_id = cart_items.product_id
+            )
+            WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id HAVING COUNT(*) > 1)
+            """
+        ))
+        await conn.execute(text(
+            "DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id)"
+        ))
+        await conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_cart_product ON cart_items (cart_id, product_id)"
+        ))
+    print("005_cart_item_unique: done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,21 @@
+# Migration: index for the newest-first product listing and its keyset cursor (/api/v1/products).
+# Run once on existing DB: cd store && python -m migrations.006_product_listing_index
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import create_index
+
+
+async def run() -> None:
+    await create_index("ix_products_listed_created", "products", "is_listed, created_at, id")
+    print("006_product_listing_index: done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
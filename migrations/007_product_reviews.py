@@ -0,0 +1,26 @@
+# Migration: product review aggregates and the best-rated listing index.
+# Run once on existing DB: cd store && python -m migrations.007_product_reviews
+# The reviews table itself is created by init_db() on startup; existing products start with no reviews.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import add_column, create_index, ddl
+
+
+async def run() -> None:
+    async with ddl() as conn:
+        await add_column(conn, "products", "review_count", "INTEGER NOT NULL DEFAULT 0")
+        await add_column(conn, "products", "rating_sum", "INTEGER NOT NULL DEFAULT 0")
+        await add_column(conn, "products", "rating_avg_x100", "INTEGER NOT NULL DEFAULT 0")
+    await create_index("ix_products_listed_rating", "products", "is_listed, rating_avg_x100, review_count, id")
+    print("007_product_reviews: done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+# Migration: users.pgp_fingerprint, and re-validation of keys saved before app/pgp.py existed.
+# Run once on existing DB: cd store && python -m migrations.008_pgp_fingerprint
+# Each stored key is parsed with gpg and replaced by its minimal export; keys gpg cannot use keep their
+# text but get no fingerprint, so those users must save a valid key again before opening a dispute.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import engine
+from app.pgp import PGPError, parse_public_key
+from migrations import add_column, ddl
+
+
+async def run() -> None:
+    async with ddl() as conn:
+        await add_column(conn, "users", "pgp_fingerprint", "VARCHAR(64)")
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT id, pgp_public_key FROM users WHERE pgp_public_key IS NOT NULL AND pgp_fingerprint IS NULL"
+        ))).all()
+    parsed = rejected = 0
+    for user_id, armored in rows:
+        try:
+            key = await parse_public_key(armored)
+        except PGPError:
+            rejected += 1
+            continue
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("UPDATE users SET pgp_public_key = :k, pgp_fingerprint = :f WHERE id = :id"),
+                {"k": key.armored, "f": key.fingerprint, "id": user_id},
+            )
+        parsed += 1
+    print(f"008_pgp_fingerprint: {parsed} keys parsed, {rejected} rejected (no fingerprint set).")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,22 @@
+# Migration: index order_items by order, for order pages, archival and the summary backfill.
+# Run with the other migrations: cd store && python -m migrations up
+# Built with create_index(): CONCURRENTLY on PostgreSQL, so checkouts keep writing order_items meanwhile.
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import create_index
+
+
+async def run() -> None:
+    await create_index("ix_order_items_order_id", "order_items", "order_id")
+    print("009_order_items_order_index: done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,27 @@
+# Migration: category_counts, the catalog's listed-products-per-category facet.
+# Run with the other migrations: cd store && python -m migrations up
+# The table is created by init_db() on startup; this fills it from products (one GROUP BY scan).
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base
+from app.facets import reconcile
+from app.models.rollup import CategoryCount
+from migrations import ddl
+
+
+async def run() -> None:
+    async with ddl() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[CategoryCount.__table__])
+    fixed = await reconcile()
+    print(f"010_category_counts: {fixed} categories counted.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
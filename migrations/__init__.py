@@ -1 +1,199 @@
-# Migrations package (run scripts from store dir: python -m migrations.001_escrow_schema).
+# Migrations package. Run them with the versioned runner from the store dir:
+#   python -m migrations status | up [--dry-run] [--to N] | baseline
+# Each NNN_name.py module defines `async def run()`; the runner applies pending ones in order and
+# records them in schema_migrations. Modules must stay idempotent (a failed run is simply re-run).
+# Scripts run on SQLite and PostgreSQL; use add_column() rather than a bare ALTER TABLE, create_index()
+# for indexes on big tables and backfill() for data changes, so the store can stay up meanwhile.
+from __future__ import annotations
+
+import asyncio
+import importlib
+import re
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from types import ModuleType
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.config import get_settings
+from app.database import engine
+
+settings = get_settings()
+
+_MODULE = re.compile(r"^(\d{3})_(\w+)\.py$")
+
+
+async def add_column(conn, table: str, col: str, spec: str) -> None:
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists."""
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {col} {spec}"))
+        return
+    try:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {spec}"))
+    except OperationalError as e:
+        if "duplicate column name" in str(e).lower():  # SQLite has no IF NOT EXISTS here
+            return
+        raise
+
+
+@asynccontextmanager
+async def ddl() -> AsyncIterator:
+    """Transaction for schema changes. On PostgreSQL, ALTER TABLE waits for an exclusive lock and every
+    query queues behind it, so give up after STORE_MIGRATION_LOCK_TIMEOUT_MS (re-run later) instead."""
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text(f"SET LOCAL lock_timeout = {int(settings.migration_lock_timeout_ms)}"))
+        yield conn
+
+
+async def create_index(name: str, table: str, columns: str, *, unique: bool = False) -> None:
+    """CREATE INDEX IF NOT EXISTS; CONCURRENTLY on PostgreSQL, so writes to the table continue.
+
+    A concurrent build that was interrupted leaves an invalid index behind; it is dropped and rebuilt.
+    On SQLite the build holds the write lock until done (readers continue under WAL).
+    """
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if engine.dialect.name != "postgresql":
+        async with engine.begin() as conn:
+            await conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns})"))
+        return
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        valid = (await conn.execute(
+            text("SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :n"),
+            {"n": name},
+        )).scalar_one_or_none()
+        if valid is False:
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        await conn.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+async def backfill(
+    name: str,
+    table: str,
+    statement: str,
+    *,
+    batch_size: int | None = None,
+    pause_ms: int | None = None,
+) -> int:
+    """Run statement over table in keyset batches of ids, one short transaction each; returns rows changed.
+
+    statement is an UPDATE/INSERT with :lo and :hi bind parameters (an inclusive id range). The last id
+    done is saved in schema_backfills in the same transaction, so an interrupted backfill resumes where
+    it stopped, and a later run only visits rows added since. Pauses between batches let requests write.
+    """
+    batch_size = batch_size or settings.migration_batch_rows
+    pause = (settings.migration_pause_ms if pause_ms is None else pause_ms) / 1000
+    await _ensure_tables()
+    async with engine.connect() as conn:
+        last_id = (await conn.execute(
+            text("SELECT last_id FROM schema_backfills WHERE name = :n"), {"n": name}
+        )).scalar_one_or_none() or 0
+    changed = 0
+    started = time.monotonic()
+    while True:
+        async with engine.begin() as conn:
+            hi = (await conn.execute(
+                text(f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > :last ORDER BY id LIMIT :n) batch"),
+                {"last": last_id, "n": batch_size},
+            )).scalar()
+            if hi is None:
+                break
+            result = await conn.execute(text(statement), {"lo": last_id + 1, "hi": hi})
+            changed += max(result.rowcount, 0)
+            await conn.execute(
+                text(
+                    "INSERT INTO schema_backfills (name, last_id, rows_changed, updated_at) VALUES (:n, :id, :r, :t)"
+                    " ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id,"
+                    " rows_changed = schema_backfills.rows_changed + excluded.rows_changed, updated_at = excluded.updated_at"
+                ),
+                {"n": name, "id": hi, "r": max(result.rowcount, 0), "t": _now()},
+            )
+        last_id = hi
+        await asyncio.sleep(pause)
+    print(f"  backfill {name}: {changed} rows changed in {time.monotonic() - started:.1f}s")
+    return changed
+
+
+# Runner state: applied versions and backfill positions.
+_TABLES = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+    " version INTEGER PRIMARY KEY, name VARCHAR(128) NOT NULL, applied_at VARCHAR(50) NOT NULL,"
+    " duration_ms INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS schema_backfills ("
+    " name VARCHAR(128) PRIMARY KEY, last_id BIGINT NOT NULL DEFAULT 0, rows_changed BIGINT NOT NULL DEFAULT 0,"
+    " updated_at VARCHAR(50) NOT NULL)",
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: str
+
+    @property
+    def description(self) -> str:
+        """First header comment line of the module, without the "# Migration: " prefix."""
+        first = Path(__file__).with_name(f"{self.module.rsplit('.', 1)[-1]}.py").read_text().splitlines()[0]
+        return first.lstrip("# ").removeprefix("Migration: ")
+
+    def load(self) -> ModuleType:
+        return importlib.import_module(self.module)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def discover() -> list[Migration]:
+    """Migration modules in this package, ordered by version; versions must be unique."""
+    found: dict[int, Migration] = {}
+    for path in sorted(Path(__file__).parent.glob("[0-9][0-9][0-9]_*.py")):
+        m = _MODULE.match(path.name)
+        if not m:
+            continue
+        version = int(m.group(1))
+        if version in found:
+            raise RuntimeError(f"two migrations with version {version:03d}: {found[version].name}, {m.group(2)}")
+        found[version] = Migration(version, m.group(2), f"migrations.{path.stem}")
+    return [found[v] for v in sorted(found)]
+
+
+async def _ensure_tables() -> None:
+    async with engine.begin() as conn:
+        for statement in _TABLES:
+            await conn.execute(text(statement))
+
+
+async def applied_versions() -> dict[int, str]:
+    """version -> applied_at for migrations recorded in schema_migrations."""
+    await _ensure_tables()
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text("SELECT version, applied_at FROM schema_migrations"))).all()
+    return {version: applied_at for version, applied_at in rows}
+
+
+async def record(migration: Migration, duration_ms: int = 0) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "INSERT INTO schema_migrations (version, name, applied_at, duration_ms) VALUES (:v, :n, :t, :d)"
+                " ON CONFLICT (version) DO NOTHING"
+            ),
+            {"v": migration.version, "n": migration.name, "t": _now(), "d": duration_ms},
+        )
+
+
+async def backfill_progress() -> list[tuple[str, int, int, str]]:
+    """(name, last_id, rows_changed, updated_at) for every backfill that has started."""
+    await _ensure_tables()
+    async with engine.connect() as conn:
+        return [tuple(r) for r in (await conn.execute(
+            text("SELECT name, last_id, rows_changed, updated_at FROM schema_backfills ORDER BY name")
+        )).all()]
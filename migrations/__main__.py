@@ -0,0 +1,77 @@
+# Versioned migration runner: cd store && python -m migrations status | up [--dry-run] [--to N] | baseline
+# Applies pending migrations in version order, one at a time, and records each in schema_migrations
+# after it finishes; it stops at the first failure (fix and re-run; migrations are idempotent).
+# Run one runner at a time. The store can keep serving: DDL gives up on long lock waits and data
+# changes go through backfill() in short batches.
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+
+from migrations import applied_versions, backfill_progress, discover, record
+
+
+async def status() -> int:
+    applied = await applied_versions()
+    for m in discover():
+        state = f"applied {applied[m.version][:19]}" if m.version in applied else "pending"
+        print(f"{m.version:03d} {m.name:<28} {state:<28} {m.description}")
+    for name, last_id, rows, updated_at in await backfill_progress():
+        print(f"backfill {name}: through id {last_id}, {rows} rows changed, last batch {updated_at[:19]}")
+    return 0
+
+
+async def up(to: int | None, dry_run: bool) -> int:
+    applied = await applied_versions()
+    pending = [m for m in discover() if m.version not in applied and (to is None or m.version <= to)]
+    if not pending:
+        print("Database is up to date.")
+        return 0
+    for m in pending:
+        if dry_run:
+            print(f"would apply {m.version:03d} {m.name}: {m.description}")
+            continue
+        print(f"applying {m.version:03d} {m.name} ...")
+        started = time.monotonic()
+        try:
+            await m.load().run()
+        except Exception as e:
+            print(f"{m.version:03d} {m.name} failed: {e}", file=sys.stderr)
+            return 1
+        duration_ms = int((time.monotonic() - started) * 1000)
+        await record(m, duration_ms)
+        print(f"applied {m.version:03d} {m.name} in {duration_ms / 1000:.1f}s")
+    return 0
+
+
+async def baseline(to: int | None) -> int:
+    """Mark migrations as applied without running them (a database created by init_db() at this version)."""
+    applied = await applied_versions()
+    for m in discover():
+        if m.version not in applied and (to is None or m.version <= to):
+            await record(m)
+            print(f"marked {m.version:03d} {m.name} as applied")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Versioned schema migrations.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="list migrations, whether each is applied, and backfill progress")
+    p_up = sub.add_parser("up", help="apply pending migrations in order")
+    p_up.add_argument("--to", type=int, help="stop after this version")
+    p_up.add_argument("--dry-run", action="store_true", help="list what would be applied and exit")
+    p_base = sub.add_parser("baseline", help="record migrations as applied without running them")
+    p_base.add_argument("--to", type=int, help="only up to this version")
+    args = parser.parse_args()
+    if args.command == "status":
+        return asyncio.run(status())
+    if args.command == "up":
+        return asyncio.run(up(args.to, args.dry_run))
+    return asyncio.run(baseline(args.to))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
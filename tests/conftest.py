@@ -0,0 +1,115 @@
+# Test setup: the app against a throwaway database, with strict query budgets and no job workers.
+# SQLite by default; STORE_TEST_DATABASE_URL=postgresql+asyncpg://... runs the same tests on an
+# empty PostgreSQL database (its tables are dropped first). Run from the store dir: python -m pytest
+from __future__ import annotations
+
+import os
+import secrets
+import tempfile
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+_tmp = Path(tempfile.mkdtemp(prefix="darkstore-test-"))
+os.environ["STORE_DATABASE_URL"] = os.environ.get("STORE_TEST_DATABASE_URL") or f"sqlite+aiosqlite:///{_tmp}/store.db"
+os.environ.update({
+    "STORE_SECRET_KEY": "test-secret",
+    "STORE_SESSION_SECURE": "false",
+    "STORE_QUERY_BUDGETS": "strict",
+    "STORE_ADMISSION_ENABLED": "false",
+    "STORE_JOB_WORKERS": "0",
+    "STORE_BACKUP_INTERVAL_HOURS": "0",
+    "STORE_BACKUP_DIR": str(_tmp / "backups"),
+    "STORE_UPLOAD_DIR": str(_tmp / "uploads"),
+    "STORE_TEMPLATE_CACHE_DIR": str(_tmp / "template-cache"),
+    "STORE_PAGE_CACHE_TTL_SECONDS": "0",
+})
+
+import pytest  # noqa: E402
+from starlette.testclient import TestClient  # noqa: E402
+
+from app.auth import hash_passphrase  # noqa: E402
+from app.database import Base, async_session_factory, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.product import Product  # noqa: E402
+from app.models.user import User, UserRole  # noqa: E402
+
+PASSPHRASE = "Test-pass-12345"
+_hash: str | None = None  # bcrypt once; every test user shares the passphrase
+
+
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    """Anonymous client; its portal runs the app's lifespan and every request in one event loop."""
+    if engine.dialect.name != "sqlite":
+        async def _drop() -> None:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+        import anyio
+        anyio.run(_drop)
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def run(client: TestClient) -> Callable[..., Any]:
+    """Run an async function in the app's event loop: run(fn, *args)."""
+    return client.portal.call
+
+
+@pytest.fixture
+def browser(client: TestClient) -> Callable[[], TestClient]:
+    """browser() -> another anonymous client (own cookie jar) against the same running app."""
+    def _browser() -> TestClient:
+        c = TestClient(app)
+        c.portal = client.portal
+        return c
+    return _browser
+
+
+async def _create_user(role: UserRole) -> str:
+    global _hash
+    _hash = _hash or hash_passphrase(PASSPHRASE)
+    username = f"{role.value}-{secrets.token_hex(4)}"
+    async with async_session_factory() as db:
+        db.add(User(username=username, passphrase_hash=_hash, role=role, created_at="2026-01-01T00:00:00+00:00"))
+        await db.commit()
+    return username
+
+
+@pytest.fixture
+def login(browser: Callable[[], TestClient], run: Callable[..., Any]) -> Callable[..., TestClient]:
+    """login(role) -> a client logged in as a new user with that role (.username is set)."""
+    def _login(role: UserRole = UserRole.BUYER) -> TestClient:
+        username = run(_create_user, role)
+        c = browser()
+        r = c.post("/login", data={"username": username, "passphrase": PASSPHRASE}, follow_redirects=False)
+        assert r.status_code == 302, r.text
+        c.username = username
+        return c
+    return _login
+
+
+async def _create_product(seller_username: str, stock: int | None, price_cents: int, category: str) -> Product:
+    from sqlalchemy import select
+
+    async with async_session_factory() as db:
+        seller_id = (await db.execute(select(User.id).where(User.username == seller_username))).scalar_one()
+        p = Product(
+            seller_id=seller_id, slug=f"p-{secrets.token_hex(5)}", title=f"Product {secrets.token_hex(3)}",
+            description="", price_cents=price_cents, stock=stock, category=category, is_listed=True,
+            created_at="2026-01-01T00:00:00+00:00",
+        )
+        db.add(p)
+        await db.commit()
+        return p
+
+
+@pytest.fixture
+def product(run: Callable[..., Any], login: Callable[..., TestClient]) -> Callable[..., Product]:
+    """product(stock=None, price_cents=1000, seller=None) -> a listed product (detached)."""
+    def _product(stock: int | None = None, price_cents: int = 1000, seller: TestClient | None = None,
+                 category: str = "other") -> Product:
+        seller = seller or login(UserRole.SELLER)
+        return run(_create_product, seller.username, stock, price_cents, category)
+    return _product
@@ -0,0 +1,45 @@
+# Admission control: cookieless clients get their own bucket; every response keeps the safe headers.
+from __future__ import annotations
+
+import pytest
+
+from app import main
+from app.admission import controller, minter
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setattr(main.settings, "admission_enabled", True)
+    monkeypatch.setattr(controller, "capacity", 3)
+    monkeypatch.setattr(controller, "refill_per_second", 0)
+    monkeypatch.setattr(minter, "capacity", 1000)
+    controller._buckets.clear()
+    minter._buckets.clear()
+    yield
+    controller._buckets.clear()
+    minter._buckets.clear()
+
+
+def test_a_throttled_client_does_not_lock_out_new_visitors(browser, admission):
+    greedy = browser()
+    codes = [greedy.get("/catalog").status_code for _ in range(5)]
+    assert codes[:3] == [200, 200, 200] and codes[3:] == [429, 429]
+    visitor = browser()
+    assert visitor.get("/catalog").status_code == 200
+
+
+def test_rejections_carry_the_anon_cookie_and_safe_headers(browser, admission, monkeypatch):
+    monkeypatch.setattr(controller, "capacity", 0)
+    r = browser().get("/catalog")
+    assert r.status_code == 429
+    assert "anon" in r.cookies  # the retry is keyed by this client's own bucket
+    assert r.headers["x-content-type-options"] == "nosniff"
+    assert "server" not in r.headers
+
+
+def test_minting_is_rate_limited(browser, admission, monkeypatch):
+    monkeypatch.setattr(minter, "capacity", 2)
+    monkeypatch.setattr(minter, "refill_per_second", 0)
+    assert [browser().get("/catalog").status_code for _ in range(3)] == [200, 200, 429]
+    r = browser().get("/catalog")
+    assert r.status_code == 429 and "anon" not in r.cookies and "retry-after" in r.headers
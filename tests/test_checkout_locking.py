@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+
+import pytest
+
+from app import database
+from app.database import engine
+from app.models.user import UserRole
+from test_stock import _stock
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="SQLite write lock")
+
+
+@pytest.fixture
+def writer(run):
+    """A second connection to the database (BEGIN IMMEDIATE takes the write lock), with the app's busy timeout cut to 200 ms."""
+    timeout = database.settings.sqlite_busy_timeout_ms
+    database.settings.sqlite_busy_timeout_ms = 200
+    run(engine.dispose)  # new connections pick up the shorter timeout
+    conn = sqlite3.connect(engine.url.database, isolation_level=None, check_same_thread=False)
+    yield conn
+    if conn.in_transaction:
+        conn.rollback()
+    conn.close()
+    database.settings.sqlite_busy_timeout_ms = timeout
+    run(engine.dispose)
+
+
+def test_checkout_answers_503_while_the_write_lock_is_held(writer, login, product, run):
+    p = product(stock=5)
+    buyer = login(UserRole.BUYER)
+    buyer.post("/cart/add", data={"product_id": p.id, "quantity": 1})
+    writer.execute("BEGIN IMMEDIATE")
+    r = buyer.post("/checkout", data={"payment_method": "xmr"}, follow_redirects=False)
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+    writer.rollback()
+    assert run(_stock, p.id) == 5
+    assert p.title in buyer.get("/cart").text
+
+
+def test_checkout_retries_once_the_lock_is_released(writer, login, product, run):
+    p = product(stock=5)
+    buyer = login(UserRole.BUYER)
+    buyer.post("/cart/add", data={"product_id": p.id, "quantity": 1})
+    writer.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.3, writer.rollback)
+    release.start()
+    r = buyer.post("/checkout", data={"payment_method": "xmr"}, follow_redirects=False)
+    release.join()
+    assert r.status_code == 302
+    assert run(_stock, p.id) == 4
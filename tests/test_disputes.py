@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import time
+
+from sqlalchemy import select, update
+
+from app import pgp
+from app.cache import USERS, clear_local
+from app.database import async_session_factory
+from app.models.order import EscrowStatus, Order
+from app.models.user import User, UserRole
+
+
+async def _set_fingerprint(username: str) -> None:
+    async with async_session_factory() as db:
+        await db.execute(update(User).where(User.username == username).values(pgp_fingerprint="F" * 40))
+        await db.commit()
+    clear_local(USERS)
+
+
+async def _escrow_status(ref: str) -> str | None:
+    async with async_session_factory() as db:
+        return (await db.execute(select(Order.escrow_status).where(Order.ref == ref))).scalar_one()
+
+
+def _order(login, product, run):
+    buyer = login(UserRole.BUYER)
+    run(_set_fingerprint, buyer.username)
+    buyer.post("/cart/add", data={"product_id": product().id, "quantity": 1})
+    r = buyer.post("/checkout", data={"payment_method": "xmr"}, follow_redirects=False)
+    assert r.status_code == 302
+    return buyer, r.headers["location"].rsplit("/", 1)[-1]
+
+
+def test_busy_queue_keeps_the_evidence_and_the_order_undisputed(monkeypatch, login, product, run):
+    buyer, ref = _order(login, product, run)
+    before = run(_escrow_status, ref)
+    monkeypatch.setattr(pgp, "submit", lambda *args: "busy")
+    r = buyer.post(f"/orders/{ref}/dispute", data={"evidence": "Tracking <RR123> never moved"}, follow_redirects=False)
+    assert r.status_code == 503
+    assert "Tracking &lt;RR123&gt; never moved</textarea>" in r.text
+    assert run(_escrow_status, ref) == before
+
+    queued = []
+    monkeypatch.setattr(pgp, "submit", lambda *args: queued.append(args))
+    r = buyer.post(f"/orders/{ref}/dispute", data={"evidence": "Tracking <RR123> never moved"}, follow_redirects=False)
+    assert r.headers["location"] == f"/orders/{ref}?evidence=queued"
+    assert run(_escrow_status, ref) == EscrowStatus.DISPUTED.value
+    assert [column for _, column, _, _ in queued] == [pgp.EVIDENCE]
+
+    monkeypatch.setattr(pgp, "submit", lambda *args: "busy")
+    r = buyer.post(f"/orders/{ref}/evidence", data={"evidence": "Photo of the empty parcel"}, follow_redirects=False)
+    assert r.status_code == 503
+    assert f'action="/orders/{ref}/evidence"' in r.text and "Photo of the empty parcel</textarea>" in r.text
+
+
+def test_evidence_too_long_is_refused_before_the_dispute_opens(monkeypatch, login, product, run):
+    buyer, ref = _order(login, product, run)
+    before = run(_escrow_status, ref)
+    monkeypatch.setattr(pgp, "submit", lambda *args: None)
+    r = buyer.post(f"/orders/{ref}/dispute", data={"evidence": "x" * (pgp.MESSAGE_MAX_CHARS + 1)},
+                   follow_redirects=False)
+    assert r.status_code == 400
+    assert run(_escrow_status, ref) == before
+
+
+def test_no_gpg_refuses_the_evidence_and_keeps_it(monkeypatch, login, product, run):
+    buyer, ref = _order(login, product, run)
+    before = run(_escrow_status, ref)
+    monkeypatch.setattr(pgp, "available", lambda: False)
+    r = buyer.post(f"/orders/{ref}/dispute", data={"evidence": "Never arrived"}, follow_redirects=False)
+    assert r.status_code == 503 and "Retry-After" not in r.headers
+    assert "Encryption is unavailable" in r.text and "Never arrived</textarea>" in r.text
+    assert run(_escrow_status, ref) == before
+
+
+def test_failed_encryption_is_reported_to_the_sender_and_admins(monkeypatch, login, product, run):
+    buyer, ref = _order(login, product, run)
+    failed = pgp.failed_count()
+
+    async def _fail(*args):
+        raise pgp.PGPError("gpg could not process the key or message.")
+
+    monkeypatch.setattr(pgp, "available", lambda: True)
+    monkeypatch.setattr(pgp, "encrypt", _fail)
+    r = buyer.post(f"/orders/{ref}/dispute", data={"evidence": "Never arrived"}, follow_redirects=False)
+    assert r.headers["location"] == f"/orders/{ref}?evidence=queued"
+    deadline = time.monotonic() + 5
+    while pgp.failed_count() == failed and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pgp.failed_count() == failed + 1
+    assert "your dispute evidence could not be encrypted" in buyer.get("/notifications").text
+    assert f"{failed + 1} failed" in login(UserRole.ADMIN).get("/admin/jobs").text
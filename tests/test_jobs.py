@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import Counter
+
+from sqlalchemy import select, update
+
+from app import jobs
+from app.database import async_session_factory, engine
+from app.models.job import Job, JobState
+
+runs: Counter[int] = Counter()
+
+
+@jobs.handler("test.slow")
+async def _slow(payload: dict) -> None:
+    runs[payload["n"]] += 1
+    await asyncio.sleep(0.7)
+    await jobs.recover_expired()  # the leader's sweep, while this batch is still running
+
+
+async def _enqueue(kind: str, count: int) -> list[int]:
+    async with async_session_factory() as db:
+        queued = [jobs.enqueue(db, kind, {"n": n}, priority=100) for n in range(count)]
+        await db.commit()
+        return [j.id for j in queued]
+
+
+async def _states(ids: list[int]) -> list[tuple[str, str | None]]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(select(Job.state, Job.locked_by).where(Job.id.in_(ids)).order_by(Job.id))
+        return [tuple(r) for r in rows]
+
+
+async def _drain(ids: list[int]) -> None:
+    async def second_worker() -> None:
+        await asyncio.sleep(1.5)
+        await jobs.run_batch(len(ids))
+
+    await asyncio.gather(jobs.run_batch(len(ids)), second_worker())
+    for _ in range(10):
+        if all(state == JobState.DONE.value for state, _ in await _states(ids)):
+            return
+        await jobs.run_batch(len(ids))
+
+
+def test_batch_longer_than_its_lease_runs_each_job_once(monkeypatch, run):
+    # Three 0.7 s jobs on a 1 s lease: the third job's claim lease lapses while the second runs,
+    # and a second worker claims what the sweep requeued.
+    monkeypatch.setenv("STORE_JOB_LEASE_SECONDS", "1")
+    runs.clear()
+    ids = run(_enqueue, "test.slow", 3)
+    run(_drain, ids)
+    assert runs == {0: 1, 1: 1, 2: 1}
+    assert [state for state, _ in run(_states, ids)] == [JobState.DONE.value] * 3
+
+
+async def _claim_and_expire(ids: list[int]) -> None:
+    await jobs.claim(len(ids), "gone:1")
+    async with engine.begin() as conn:
+        await conn.execute(update(Job).where(Job.id.in_(ids)).values(lease_until=time.time() - 1))
+
+
+def test_recover_expired_releases_the_lease_holder(run):
+    ids = run(_enqueue, "test.unclaimed", 2)
+    run(_claim_and_expire, ids)
+    run(jobs.recover_expired)
+    assert run(_states, ids) == [(JobState.QUEUED.value, None)] * 2
+
+
+def test_job_owner_fits_locked_by_with_a_long_hostname(monkeypatch):
+    from app import leader
+
+    monkeypatch.setattr(leader.socket, "gethostname", lambda: "build-runner-" + "x" * 60 + ".internal.example")
+    monkeypatch.setattr(leader.os, "getpid", lambda: 4194304)  # Linux pid_max
+    owner = f"{leader._worker_id()}:{'f' * 8}"  # as run_batch builds it
+    assert len(owner) <= Job.__table__.c.locked_by.type.length
+
+
+def test_leader_lease_holder_fits_with_a_long_hostname(monkeypatch):
+    from app import leader
+    from app.models.system import WorkerLease
+
+    monkeypatch.setattr(leader.socket, "gethostname", lambda: "h" * 255)
+    monkeypatch.setattr(leader.os, "getpid", lambda: 4194304)
+    holder = WorkerLease.__table__.c.holder.type.length
+    assert len(leader._worker_id()) <= holder == Job.__table__.c.locked_by.type.length
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from app.models.user import UserRole
+
+
+def _unread(c) -> int:
+    return c.get("/api/v1/notifications/unread").json()["unread"]
+
+
+def _order(buyer, seller, product) -> str:
+    buyer.post("/cart/add", data={"product_id": product(seller=seller).id, "quantity": 1})
+    r = buyer.post("/checkout", data={"payment_method": "xmr"}, follow_redirects=False)
+    assert r.status_code == 302
+    return r.headers["location"].rsplit("/", 1)[-1]
+
+
+def test_viewing_an_order_leaves_its_notifications_unread(login, product):
+    buyer, seller, support = login(UserRole.BUYER), login(UserRole.SELLER), login(UserRole.SUPPORT)
+    ref = _order(buyer, seller, product)
+    support.post(f"/admin/orders/{ref}/status", data={"status": "processing"})
+    assert _unread(buyer) == 1
+
+    assert buyer.get(f"/orders/{ref}").status_code == 200
+    assert buyer.head(f"/orders/{ref}").status_code in (200, 405)
+    buyer.get(f"/orders/{ref}", headers={"Sec-Purpose": "prefetch"})
+    assert _unread(buyer) == 1
+
+    r = buyer.post("/notifications/read", data={"order_ref": ref}, follow_redirects=False)
+    assert r.headers["location"] == f"/orders/{ref}"
+    assert _unread(buyer) == 0
+
+
+def test_admin_is_not_notified_of_own_change(login, product):
+    admin, seller = login(UserRole.ADMIN), login(UserRole.SELLER)
+    ref = _order(admin, seller, product)  # the admin is this order's buyer
+    admin.post(f"/admin/orders/{ref}/status", data={"status": "processing"})
+    assert _unread(seller) == 1
+    assert _unread(admin) == 0
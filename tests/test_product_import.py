@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import re
+
+from app.models.user import UserRole
+
+
+def _import(c, body: bytes, name: str = "products.csv"):
+    r = c.post("/seller/import", files={"file": (name, body, "text/csv")})
+    assert r.status_code == 200, r.text
+    counts = re.search(r"Created (\d+), updated (\d+), (\d+) row\(s\) with errors", r.text)
+    return tuple(map(int, counts.groups())), r.text
+
+
+def test_import_reports_bad_rows_and_stops_at_undecodable_line(login, product):
+    seller, other = login(UserRole.SELLER), login(UserRole.SELLER)
+    mine, theirs = product(seller=seller), product(seller=other)
+    body = (
+        "slug,title,price,stock\n"
+        "imp-a,Alpha,1.50,3\n"
+        "imp-b,Beta,2,unlimited\n"
+        f"{mine.slug},,9.99,\n"
+        "imp-c,Gamma,abc,\n"
+        "imp-d,Delta,1,²\n"
+        f"{theirs.slug},Taken,1,\n"
+    ).encode() + b"imp-e,\xff\xfe,1,\nimp-f,Never read,1,\n"
+    (created, updated, failed), page = _import(seller, body)
+    assert (created, updated, failed) == (2, 1, 4)
+    for message in ("price is not a number", "stock must be a whole number", "slug is already in use",
+                    "file is not UTF-8"):
+        assert message in page
+    assert seller.get("/p/imp-a").status_code == 200
+    assert seller.get("/p/imp-f").status_code == 404
+
+
+def test_malformed_csv_keeps_rows_before_it(login):
+    seller = login(UserRole.SELLER)
+    body = b"slug,title,price\nimp-g,Gamma,1\nimp-h,\"" + b"x" * 200_000 + b"\",1\n"
+    (created, updated, failed), page = _import(seller, body)
+    assert (created, updated, failed) == (1, 0, 1)
+    assert "malformed CSV" in page
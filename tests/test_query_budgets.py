@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from app.cache import USERS, clear_local
+from app.models.user import UserRole
+
+# STORE_QUERY_BUDGETS=strict (conftest): a request over its route's budget, or repeating a
+# statement shape (N+1), raises QueryBudgetExceeded out of the client call.
+
+
+def _ok(c, method: str, path: str, status: int = 200, **kwargs) -> str:
+    clear_local(USERS)  # worst case: the session's user is loaded from the database again
+    r = c.request(method, path, follow_redirects=False, **kwargs)
+    assert r.status_code == status, (method, path, r.status_code)
+    return r.headers.get("location", "")
+
+
+def test_main_routes_within_budget(browser, login, product):
+    seller = login(UserRole.SELLER)
+    p = product(stock=10, seller=seller)
+    other = product(seller=seller, category="books")
+
+    anon = browser()
+    for path in ("/", "/catalog", "/catalog?category=books", f"/p/{p.slug}", f"/p/{p.slug}/reviews",
+                 "/login", "/register", "/policy/escrow", "/api/v1/products", f"/api/v1/products/{p.slug}"):
+        _ok(anon, "GET", path)
+    _ok(anon, "POST", "/cart/add", 302, data={"product_id": p.id, "quantity": 1})
+    _ok(anon, "GET", "/cart")
+
+    buyer = login(UserRole.BUYER)
+    for product_id in (p.id, other.id):
+        _ok(buyer, "POST", "/cart/add", 302, data={"product_id": product_id, "quantity": 2})
+    for path in ("/cart", "/checkout", "/api/v1/cart"):
+        _ok(buyer, "GET", path)
+    ref = _ok(buyer, "POST", "/checkout", 302, data={"payment_method": "xmr"}).rsplit("/", 1)[-1]
+    for path in ("/orders", f"/orders/{ref}", "/orders/archived", f"/orders/{ref}/dispute", "/notifications",
+                 "/profile", "/api/v1/orders", f"/api/v1/orders/{ref}", "/api/v1/notifications/unread"):
+        _ok(buyer, "GET", path)
+
+    for path in ("/seller", "/seller/new", f"/seller/edit/{p.slug}", f"/orders/{ref}"):
+        _ok(seller, "GET", path)
+
+    admin = login(UserRole.ADMIN)
+    for path in ("/admin/orders", f"/admin/orders/{ref}", "/admin/jobs", "/admin/admission"):
+        _ok(admin, "GET", path)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import re
+import time
+from types import SimpleNamespace as NS
+
+from sqlalchemy import select
+
+from app import auth, sessions
+from app.database import async_session_factory
+from app.models.user import User, UserRole
+
+_CSRF = re.compile(r'name="csrf" value="([0-9a-f]+)"')
+
+
+def _csrf(c) -> str:
+    return _CSRF.search(c.get("/profile").text).group(1)
+
+
+async def _revoke_all(username: str) -> None:
+    async with async_session_factory() as db:
+        user_id = (await db.execute(select(User.id).where(User.username == username))).scalar_one()
+        await sessions.revoke(db, user_id)
+        await db.commit()
+    await sessions.refresh()
+
+
+def test_logout_needs_the_session_form_token(login):
+    buyer = login(UserRole.BUYER)
+    assert buyer.get("/logout", follow_redirects=False).status_code == 405
+    assert buyer.post("/logout", data={"csrf": "0" * 64}, follow_redirects=False).status_code == 403
+    assert buyer.post("/logout/everywhere", follow_redirects=False).status_code == 403
+    assert buyer.get("/orders").status_code == 200
+
+    cookies = dict(buyer.cookies)
+    assert buyer.post("/logout", data={"csrf": _csrf(buyer)}, follow_redirects=False).status_code == 302
+    buyer.cookies.update(cookies)  # a copy of the cookie
+    assert buyer.get("/orders", follow_redirects=False).status_code == 401
+
+
+def test_login_in_the_second_of_a_revocation_survives_it(monkeypatch, login, browser, run):
+    # Revocation and new session within one second: the revocation at .25 s, the login at .75 s.
+    second = int(time.time()) + 5
+    monkeypatch.setattr(sessions, "time", NS(time=lambda: second + 0.25, monotonic=time.monotonic))
+    buyer = login(UserRole.BUYER)  # before the revocation: signed with the real clock
+    run(_revoke_all, buyer.username)
+    assert buyer.get("/orders", follow_redirects=False).status_code == 401
+
+    monkeypatch.setattr(auth, "time", NS(time=lambda: second + 0.75, monotonic=time.monotonic))
+    again = browser()
+    r = again.post("/login", data={"username": buyer.username, "passphrase": "Test-pass-12345"},
+                   follow_redirects=False)
+    assert r.status_code == 302
+    assert again.get("/orders", follow_redirects=False).status_code == 200
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+from sqlalchemy import select
+
+from app.database import async_session_factory
+from app.main import app
+from app.models.product import Product
+from app.models.user import UserRole
+
+
+async def _stock(product_id: int) -> int | None:
+    async with async_session_factory() as db:
+        return (await db.execute(select(Product.stock).where(Product.id == product_id))).scalar_one()
+
+
+async def _checkout_all(buyers) -> list[int]:
+    async def one(cookies) -> int:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver",
+                                     cookies=cookies) as c:
+            return (await c.post("/checkout", data={"payment_method": "xmr"})).status_code
+    return await asyncio.gather(*(one(b.cookies) for b in buyers))
+
+
+def test_buyers_racing_for_last_units_never_oversell(login, product, run):
+    p = product(stock=3)
+    buyers = [login(UserRole.BUYER) for _ in range(12)]
+    for b in buyers:
+        assert b.post("/cart/add", data={"product_id": p.id, "quantity": 1}, follow_redirects=False).status_code == 302
+    statuses = run(_checkout_all, buyers)
+    assert sorted(statuses) == [302] * 3 + [409] * 9
+    assert run(_stock, p.id) == 0
+
+
+def test_edit_without_stock_change_keeps_sales(login, product, run):
+    seller = login(UserRole.SELLER)
+    p = product(stock=2, seller=seller)
+    form = seller.get(f"/seller/edit/{p.slug}").text
+    assert 'name="stock_original" value="2"' in form
+    buyer = login(UserRole.BUYER)
+    buyer.post("/cart/add", data={"product_id": p.id, "quantity": 1})
+    assert buyer.post("/checkout", data={"payment_method": "xmr"}, follow_redirects=False).status_code == 302
+    # The seller saves the form loaded before the sale, changing only the title.
+    data = {"title": "Renamed", "price": "10.00", "stock": "2", "stock_original": "2", "category": "other", "listed": "1"}
+    assert seller.post(f"/seller/edit/{p.slug}", data=data, follow_redirects=False).status_code == 302
+    assert run(_stock, p.id) == 1
+    # Changing the level from that stale form is refused rather than overwriting the sale.
+    r = seller.post(f"/seller/edit/{p.slug}", data=dict(data, stock="5"), follow_redirects=False)
+    assert "Stock changed while you were editing" in r.text
+    assert run(_stock, p.id) == 1
+    r = seller.post(f"/seller/edit/{p.slug}", data=dict(data, stock="5", stock_original="1"), follow_redirects=False)
+    assert r.status_code == 302
+    assert run(_stock, p.id) == 5
+
+
+def test_edit_rejects_invalid_stock(login, product, run):
+    seller = login(UserRole.SELLER)
+    p = product(stock=4, seller=seller)
+    data = {"title": "Other title", "price": "10.00", "stock": "-1", "stock_original": "4", "category": "other"}
+    r = seller.post(f"/seller/edit/{p.slug}", data=data, follow_redirects=False)
+    assert "Stock must be a whole number" in r.text
+    assert run(_stock, p.id) == 4
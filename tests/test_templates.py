@@ -0,0 +1,43 @@
+# {% cache %} fragments: keys must cover what the fragment shows, and nothing per-user may leak.
+from __future__ import annotations
+
+from types import SimpleNamespace as NS
+
+from app.templating import fragments, templates
+
+
+def _cart(user, line_id: int, product_id: int, title: str, price_cents: int, quantity: int = 1) -> dict:
+    product = NS(id=product_id, title=title, price_cents=price_cents, stock=None)
+    request = NS(state=NS(unread_notifications=0), query_params={})
+    items = [NS(id=line_id, product=product, quantity=quantity)]
+    return {"request": request, "user": user, "items": items, "total_cents": price_cents * quantity}
+
+
+def test_cart_rows_are_not_shared_between_carts_with_equal_line_ids():
+    fragments.clear()
+    tpl = templates.env.get_template("cart/view.html")
+    buyer = NS(role=NS(value="buyer"))
+    # Cookie cart lines use the product id as id; 7 is also a cart_items.id in someone's db cart.
+    anon = tpl.render(_cart(None, line_id=7, product_id=7, title="Anon thing", price_cents=500))
+    db = tpl.render(_cart(buyer, line_id=7, product_id=9, title="Buyer thing", price_cents=900))
+    assert "Anon thing" in anon and "Buyer thing" not in anon
+    assert "Buyer thing" in db and "Anon thing" not in db
+
+
+def test_cart_row_shows_new_price_and_own_item_id():
+    fragments.clear()
+    tpl = templates.env.get_template("cart/view.html")
+    buyer = NS(role=NS(value="buyer"))
+    first = tpl.render(_cart(buyer, line_id=1, product_id=3, title="Same", price_cents=1000))
+    second = tpl.render(_cart(buyer, line_id=2, product_id=3, title="Same", price_cents=1200))
+    assert "10.00" in first and "12.00" in second
+    assert 'name="item_id" value="2"' in second and 'name="item_id" value="1"' not in second
+
+
+def test_order_list_shows_money_with_two_decimals():
+    tpl = templates.env.get_template("orders/list.html")
+    order = NS(ref="R1", first_item_title="Thing", item_count=1, total_cents=1050, status="pending",
+               created_at="2026-10-01T00:00:00")
+    html = tpl.render({"request": NS(state=NS(unread_notifications=0, csrf=None)), "user": NS(role=NS(value="buyer")),
+                       "orders": [order, NS(**{**vars(order), "ref": "R2", "total_cents": 1000})]})
+    assert "10.50" in html and "10.00" in html and "10.5 " not in html
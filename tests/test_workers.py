@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from app.database import async_session_factory
+from app.models.user import User, UserRole
+from app.users import set_active, set_role
+
+ROOT = Path(__file__).resolve().parent.parent
+POLL_MS = 200
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def workers(client) -> Iterator[list[str]]:
+    """Two more uvicorn processes on the test database; the in-process app is a third worker."""
+    env = dict(os.environ, STORE_CACHE_POLL_MS=str(POLL_MS), STORE_LOG_LEVEL="warning")
+    ports = [_free_port(), _free_port()]
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(p), "--log-level", "warning"],
+                         cwd=ROOT, env=env)
+        for p in ports
+    ]
+    urls = [f"http://127.0.0.1:{p}" for p in ports]
+    try:
+        deadline = time.monotonic() + 60
+        for url in urls:
+            while True:
+                try:
+                    if httpx.get(f"{url}/login").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                assert time.monotonic() < deadline, "uvicorn did not start"
+                time.sleep(0.2)
+        yield urls
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(30)
+
+
+async def _update(username: str, change: Callable) -> None:
+    async with async_session_factory() as db:
+        user_id = (await db.execute(select(User.id).where(User.username == username))).scalar_one()
+        await change(db, user_id)
+        await db.commit()
+
+
+def _eventually(url: str, cookies: dict[str, str], path: str, status: int) -> None:
+    """Wait until GET path answers status (the worker dropped its cached user), at most 10 polls."""
+    start = time.monotonic()
+    while True:
+        r = httpx.get(url + path, cookies=cookies, follow_redirects=False)
+        if r.status_code == status:
+            return
+        assert time.monotonic() - start < 10 * POLL_MS / 1000, f"{url}{path}: still {r.status_code}"
+        time.sleep(0.05)
+
+
+def test_role_change_reaches_every_worker(workers, login, run):
+    seller = login(UserRole.SELLER)
+    for url in workers:  # each worker caches the seller
+        assert httpx.get(url + "/seller", cookies=dict(seller.cookies)).status_code == 200
+    run(_update, seller.username, lambda db, uid: set_role(db, uid, UserRole.BUYER))
+    for url in workers:
+        _eventually(url, dict(seller.cookies), "/seller", 403)
+
+
+def test_deactivation_reaches_every_worker(workers, login, run):
+    buyer = login(UserRole.BUYER)
+    for url in workers:
+        assert httpx.get(url + "/orders", cookies=dict(buyer.cookies), follow_redirects=False).status_code == 200
+    run(_update, buyer.username, lambda db, uid: set_active(db, uid, False))
+    for url in workers:
+        _eventually(url, dict(buyer.cookies), "/orders", 401)